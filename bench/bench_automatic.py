@@ -0,0 +1,210 @@
+"""
+Cycle-time benchmark for AutomaticMode.
+
+Builds full towers in the simulated cell (see sim/) for every ordering of the cubes in the main bin and reports how
+long each phase of the routine takes, in virtual (brick) time. The results are compared against bench/baseline.json,
+and the script exits with status 1 if a phase got slower than the baseline allows.
+
+Usage:
+    python bench/bench_automatic.py                     # run and compare against the baseline
+    python bench/bench_automatic.py --update-baseline   # run and store the results as the new baseline
+    python bench/bench_automatic.py --seeds 3 --output bench_output.txt
+    python bench/bench_automatic.py --profile motion_profile.csv   # also write per-joint motion histograms
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "sim"))
+
+from cell import default_cell  # noqa: E402
+from run_automatic import create_devices, create_automatic_mode  # noqa: E402
+from world import world  # noqa: E402
+
+from modes.AutomaticMode import CUBE_SEQUENCE  # noqa: E402
+from utils.profiling import MotionProfiler  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+# Phases reported, in routine order. "tower" is everything after calibration.
+PHASES = ["calibration", "pickup", "scan", "delivery", "retrieval", "cycle_delay", "retry_delay"]
+
+# Statistics compared against the baseline
+COMPARED_STATS = ["mean", "p95"]
+
+
+class PhaseRecorder:
+    """Turns the phase marks of AutomaticMode into phase durations (virtual milliseconds)."""
+
+    def __init__(self):
+        self.durations = {}  # phase -> list of durations, one per occurrence
+        self.phase = None
+        self.phase_start = 0.0
+        self.tower_start = None
+        self.tower_time = None
+
+    def __call__(self, phase):
+        now = world.time
+        if self.phase is not None:
+            self.durations.setdefault(self.phase, []).append(now - self.phase_start)
+        if self.phase == "calibration":
+            self.tower_start = now
+        if phase == "done" and self.tower_start is not None:
+            self.tower_time = now - self.tower_start
+
+        self.phase = phase
+        self.phase_start = now
+
+
+def run_tower(order, seed, profiler=None):
+    """
+    Build one tower with the main bin ordered top to bottom as given. Returns the PhaseRecorder. Moves are added to
+    the profiler if one is given.
+    """
+    cell = default_cell(list(reversed(order)), seed=seed)
+    world.reset(cell)
+    recorder = PhaseRecorder()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        automatic_mode = create_automatic_mode(create_devices())
+        automatic_mode.phase_listener = recorder
+        automatic_mode.profiler = profiler
+        automatic_mode.profile_path = None
+        result = automatic_mode.run()
+
+    if not result or recorder.tower_time is None:
+        raise RuntimeError("Tower for order " + str(order) + " (seed " + str(seed) + ") was not completed")
+    if cell.misplaced():
+        raise RuntimeError("Tower for order " + str(order) + " (seed " + str(seed) + ") misplaced cubes: " +
+                           ", ".join(cell.misplaced()))
+    return recorder
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "max": max(values),
+    }
+
+
+def run_benchmark(seeds, profiler=None):
+    per_occurrence = {}  # phase -> durations of every occurrence
+    per_tower = {}  # phase -> time spent in the phase per tower
+    tower_times = []
+
+    for order in itertools.permutations(CUBE_SEQUENCE):
+        for seed in range(seeds):
+            recorder = run_tower(list(order), seed, profiler)
+            tower_times.append(recorder.tower_time)
+            for phase, durations in recorder.durations.items():
+                per_occurrence.setdefault(phase, []).extend(durations)
+                per_tower.setdefault(phase, []).append(sum(durations))
+
+    results = {"tower": summarize(tower_times), "phases": {}, "phases_per_tower": {}}
+    for phase in PHASES:
+        if phase in per_occurrence:
+            results["phases"][phase] = summarize(per_occurrence[phase])
+            results["phases_per_tower"][phase] = summarize(per_tower[phase])
+    return results
+
+
+def format_report(results):
+    lines = ["{:<14}{:>7}{:>10}{:>10}{:>10}{:>10}".format("phase (s)", "count", "mean", "p50", "p95", "max")]
+
+    def add_row(name, stats):
+        lines.append("{:<14}{:>7}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.3f}".format(
+            name, stats["count"], stats["mean"] / 1000, stats["p50"] / 1000, stats["p95"] / 1000,
+            stats["max"] / 1000))
+
+    lines.append("-- per occurrence")
+    for phase, stats in results["phases"].items():
+        add_row(phase, stats)
+    lines.append("-- per tower")
+    for phase, stats in results["phases_per_tower"].items():
+        add_row(phase, stats)
+    add_row("tower", results["tower"])
+    return "\n".join(lines)
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of regressions (one line each) compared to the baseline."""
+    regressions = []
+
+    def check(name, stats, baseline_stats):
+        for stat in COMPARED_STATS:
+            allowed = baseline_stats[stat] * (1 + tolerance) + 1
+            if stats[stat] > allowed:
+                regressions.append("{} {}: {:.3f} s (baseline {:.3f} s)".format(
+                    name, stat, stats[stat] / 1000, baseline_stats[stat] / 1000))
+
+    check("tower", results["tower"], baseline["tower"])
+    for phase, stats in results["phases_per_tower"].items():
+        if phase in baseline["phases_per_tower"]:
+            check(phase, stats, baseline["phases_per_tower"][phase])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AutomaticMode cycle times in the simulated cell.")
+    parser.add_argument("--seeds", type=int, default=1, help="Runs per cube ordering (different sensor noise)")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Allowed slowdown against the baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", help="Also write the report to this file")
+    parser.add_argument("--profile", help="Write the motion profile of all runs (CSV) to this file")
+    args = parser.parse_args()
+
+    profiler = MotionProfiler() if args.profile else None
+    results = run_benchmark(args.seeds, profiler)
+    report = format_report(results)
+    print(report)
+
+    if profiler is not None:
+        profiler.export_csv(args.profile)
+        print("\n".join(profiler.summary()))
+        print("Motion profile written to", args.profile)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report + "\n")
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print("Baseline updated:", os.path.normpath(BASELINE_PATH))
+        return 0
+
+    try:
+        with open(BASELINE_PATH) as file:
+            baseline = json.load(file)
+    except OSError:
+        print("No baseline found, run with --update-baseline to create one")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("Cycle-time regressions against the baseline:")
+        for regression in regressions:
+            print("  " + regression)
+        return 1
+
+    print("No regressions against the baseline (tolerance {:.0%})".format(args.tolerance))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Homing-time benchmark for AutomaticMode's warm start.
+
+Homes the arm in the simulated cell (see sim/) three ways and reports how long AutomaticMode.start takes, in virtual
+(brick) time:
+    - cold: no calibration file, every joint homes from scratch
+    - warm, parked: after a full run that parked the arm, restarted where it was parked
+    - warm, moved: the same calibration file, but the arm was moved after it was parked (the park angles are wrong)
+The sim doesn't model the shoulder and elbow sagging once their motors float, so the parked case is the best one.
+Exits with status 1 if the warm start from the parked pose isn't faster than the cold start.
+
+Usage:
+    python bench/bench_homing.py
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "sim"))
+
+from cell import default_cell  # noqa: E402
+from run_automatic import create_devices, create_automatic_mode  # noqa: E402
+from world import world  # noqa: E402
+
+from modes.AutomaticMode import CUBE_SEQUENCE  # noqa: E402
+
+
+def create_mode(calibration_path):
+    automatic_mode = create_automatic_mode(create_devices())
+    automatic_mode.calibration_path = calibration_path
+    return automatic_mode
+
+
+def time_homing(calibration_path, start=None) -> float:
+    """Virtual milliseconds AutomaticMode.start takes (route compilation takes no virtual time, the rest is homing)."""
+    world.reset(default_cell(list(reversed(CUBE_SEQUENCE)), start=start))
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not create_mode(calibration_path).start():
+            raise RuntimeError("Homing failed")
+    return world.time
+
+
+def park(calibration_path) -> dict:
+    """Build a tower with the calibration file, which parks the arm. Returns the physical angle of every motor."""
+    cell = default_cell(list(reversed(CUBE_SEQUENCE)))
+    world.reset(cell)
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not create_mode(calibration_path).run():
+            raise RuntimeError("Tower was not completed")
+    return {port: motor._position for port, motor in cell.motors.items()}
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        calibration_path = os.path.join(directory, "calibration.txt")
+        cold = time_homing(None)
+        parked_pose = park(calibration_path)
+        warm_parked = time_homing(calibration_path, start=parked_pose)
+        park(calibration_path)
+        warm_moved = time_homing(calibration_path)
+
+    print("Cold start:           {:.2f} s".format(cold / 1000))
+    print("Warm start, parked:   {:.2f} s".format(warm_parked / 1000))
+    print("Warm start, moved:    {:.2f} s".format(warm_moved / 1000))
+    sys.exit(0 if warm_parked < cold else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Simulated work cell for the cube sorting arm.
+
+Ports, end-stops and home switches match main.py and the calibration routines in src/parts:
+    - Base (D) and shoulder (A) home on their touch sensors (S4, S1), which are pressed at physical angle 0.
+    - The elbow (C) stalls against its end-stop at physical angle 0, ElbowPart.calibrate zeroes it 400° before that.
+    - The gripper (B) stalls fully closed at physical angle 0, or earlier when a cube is between the jaws.
+
+Cubes sit on places (the main bin, the stack and the storage bins) identified by their base angle. Closing the gripper
+while the arm is lowered over a place picks up the top cube, opening it drops the held cube on the place below. The
+color sensor (S3) sees the held cube while the arm is at the scan position.
+
+The stack and the storage bins know the height (arm tip y) of each cube level. A cube picked or dropped more than
+LEVEL_TOLERANCE away from the level of the top of the place is still moved, but recorded as "misplaced".
+"""
+import random
+
+from constants import RATIOS, OFFSETS, LENGTHS
+from utils.kinematics import get_coordinates
+
+# Physical elbow angle (motor degrees) that ElbowPart.calibrate resets to 0
+ELBOW_ZERO = -400
+
+# Gripper angle where the jaws close on a cube, and where a cube is taken or let go
+CUBE_JAW_ANGLE = -40
+GRAB_THRESHOLD = -60
+
+# The arm tip has to be below this height (y) to reach a cube
+LOWERED_HEIGHT = 14
+
+# How far (arm coordinates) from the level of a cube the arm tip may be when it picks or drops it, well below the
+# smallest gap between the levels
+LEVEL_TOLERANCE = 1
+
+# How close (joint degrees) the arm has to be to a place or the scan position
+PLACE_TOLERANCE = 3
+SCAN_TOLERANCE = 5
+
+# Color sensor reading without a cube in front of it
+BACKGROUND_RGB = (1, 1, 2)
+
+CUBE_RGB = {
+    "yellow": (14, 9, 0),
+    "red": (18, 0, 0),
+    "blue": (0, 0, 30),
+    "green": (2, 8, 3),
+}
+
+MOTORS = {
+    # Base: large motor, homes on the touch sensor at 0 and can't go much further
+    "D": {"max_speed": 1000, "acceleration": 8000, "limits": (-800, 20), "start": -300},
+    # Shoulder: large motor, homes on the touch sensor at 0
+    "A": {"max_speed": 1000, "acceleration": 8000, "limits": (-900, 30), "start": -250},
+    # Elbow: large motor with a hard end-stop at 0
+    "C": {"max_speed": 1000, "acceleration": 8000, "limits": (-1100, 0), "start": -700},
+    # Gripper: medium motor, jaws fully closed at 0
+    "B": {"max_speed": 1400, "acceleration": 12000, "limits": (-150, 0), "start": -60},
+}
+
+# Touch sensor port -> motor port it detects
+TOUCH_SENSORS = {
+    "S4": "D",
+    "S1": "A",
+}
+
+
+class Place:
+    def __init__(self, name, base_angle, cubes=None, levels=None):
+        self.name = name
+        self.base_angle = base_angle
+        self.cubes = list(cubes or [])  # Bottom to top
+        self.levels = levels  # Arm tip y where cube i (bottom first) is picked or dropped, None if not checked
+
+
+class Cell:
+    def __init__(self, places, scan_angles, seed=0, grab_miss_rate=0.0, color_noise=1.0, start=None):
+        """
+        Parameters:
+            places (list): Place objects.
+            scan_angles (tuple): (shoulder, elbow, base) joint angles of the scan position.
+            seed (int): Seed for the color noise and missed grabs.
+            grab_miss_rate (float): Probability that closing the gripper on a cube misses it.
+            color_noise (float): Standard deviation of the color sensor noise per channel.
+            start (dict): Optional physical start angle per motor port.
+        """
+        self.places = places
+        self.scan_angles = scan_angles
+        self.random = random.Random(seed)
+        self.grab_miss_rate = grab_miss_rate
+        self.color_noise = color_noise
+        self.start = start or {}
+
+        self.motors = {}
+        self.held_cube = None
+        self.lost_cubes = []
+        self.events = []  # (time, event, detail)
+        self._last_gripper_angle = None
+
+    # Configuration
+
+    def motor_config(self, port):
+        config = dict(MOTORS[port])
+        if port in self.start:
+            config["start"] = self.start[port]
+        return config
+
+    def attach_motor(self, motor):
+        self.motors[motor.port] = motor
+
+    def motor_limits(self, motor):
+        low, high = MOTORS[motor.port]["limits"]
+        if motor.port == "B" and self.held_cube is not None:
+            high = CUBE_JAW_ANGLE
+        return low, high
+
+    def place(self, name):
+        for place in self.places:
+            if place.name == name:
+                return place
+        return None
+
+    # Joint state
+
+    def joint_angles(self):
+        """Calibrated (shoulder, elbow, base) joint angles of the physical arm."""
+        shoulder = self.motors["A"]._position / RATIOS["shoulder"]
+        elbow = (self.motors["C"]._position - ELBOW_ZERO) / RATIOS["elbow"]
+        base = self.motors["D"]._position / RATIOS["base"]
+        return shoulder, elbow, base
+
+    def tip_height(self):
+        shoulder, elbow, base = self.joint_angles()
+        return get_tip_height(shoulder, elbow)
+
+    def is_lowered(self):
+        return self.tip_height() < LOWERED_HEIGHT
+
+    def place_below(self):
+        base = self.motors["D"]._position / RATIOS["base"]
+        for place in self.places:
+            if abs(place.base_angle - base) <= PLACE_TOLERANCE:
+                return place
+        return None
+
+    # Sensors
+
+    def touch_pressed(self, port):
+        return self.motors[TOUCH_SENSORS[port]]._position >= 0
+
+    def color_rgb(self, port):
+        if self.held_cube is None or not self.is_at_scan_position():
+            return BACKGROUND_RGB
+
+        rgb = CUBE_RGB[self.held_cube]
+        return tuple(max(0, min(100, int(round(value + self.random.gauss(0, self.color_noise))))) for value in rgb)
+
+    def is_at_scan_position(self):
+        angles = self.joint_angles()
+        for angle, scan_angle in zip(angles, self.scan_angles):
+            if abs(angle - scan_angle) > SCAN_TOLERANCE:
+                return False
+        return True
+
+    # Cubes
+
+    def update(self):
+        gripper = self.motors.get("B")
+        if gripper is None:
+            return
+
+        angle = gripper._position
+        last_angle = self._last_gripper_angle
+        self._last_gripper_angle = angle
+        if last_angle is None:
+            return
+
+        if last_angle < GRAB_THRESHOLD <= angle and self.held_cube is None:
+            self.close_on_cube()
+        elif angle < GRAB_THRESHOLD <= last_angle and self.held_cube is not None:
+            self.drop_cube()
+
+    def close_on_cube(self):
+        place = self.place_below()
+        if place is None or not place.cubes or not self.is_lowered():
+            return
+        if self.random.random() < self.grab_miss_rate:
+            self.log("missed", place.name)
+            return
+
+        self.check_level(place, len(place.cubes) - 1)
+        self.held_cube = place.cubes.pop()
+        self.log("picked", place.name + ":" + self.held_cube)
+
+    def drop_cube(self):
+        place = self.place_below()
+        if place is None:
+            self.lost_cubes.append(self.held_cube)
+            self.log("lost", self.held_cube)
+        else:
+            self.check_level(place, len(place.cubes))
+            place.cubes.append(self.held_cube)
+            self.log("dropped", place.name + ":" + self.held_cube)
+        self.held_cube = None
+
+    def check_level(self, place, level):
+        # Cube level of the place the gripper picks from or drops onto, compared against the arm tip
+        if place.levels is None:
+            return
+        height = self.tip_height()
+        if level >= len(place.levels) or abs(height - place.levels[level]) > LEVEL_TOLERANCE:
+            self.log("misplaced", place.name + "/" + str(level) + " at height " + str(round(height, 2)))
+
+    def misplaced(self):
+        return [detail for time, event, detail in self.events if event == "misplaced"]
+
+    def log(self, event, detail):
+        from world import world
+        self.events.append((world.time, event, detail))
+
+
+def get_tip_height(shoulder, elbow):
+    # Same convention as MoveSystem: joint angles are the inverse kinematics angles with offsets applied
+    x, y = get_coordinates(OFFSETS["shoulder"] - shoulder, LENGTHS["shoulder"], elbow + OFFSETS["elbow"],
+                           LENGTHS["elbow"])
+    return y
+
+
+def get_location_height(location):
+    if location.is_cartesian():
+        return location.y
+    return get_tip_height(location.shoulder_angle, location.elbow_angle)
+
+
+def default_cell(main_bin, seed=0, grab_miss_rate=0.0, color_noise=1.0, start=None):
+    """
+    The cell AutomaticMode is written for.
+
+    Parameters:
+        main_bin (list): Cube colors in the main bin, bottom to top (the last one is picked first).
+    """
+    from modes import AutomaticMode as automatic
+
+    # The stack positions are the main bin pickup positions, the first one is the top of a full bin
+    stack_levels = [get_location_height(location) for location in reversed(automatic.PICKUP_POSITIONS)]
+    bin_levels = [get_location_height(location) for location in automatic.STORAGE_BIN_POSITIONS]
+
+    places = [
+        Place("main", automatic.PRE_PICKUP_POSITION.base_angle, main_bin),
+        Place("stack", automatic.STACK_BASE_ANGLE, levels=stack_levels),
+    ]
+    for key, bin_data in automatic.STORAGE_BINS.items():
+        places.append(Place(key, bin_data["base_angle"], levels=bin_levels))
+
+    return Cell(places, automatic.SCAN_POSITION.get_angles(), seed=seed, grab_miss_rate=grab_miss_rate,
+                color_noise=color_noise, start=start)
@@ -0,0 +1,110 @@
+"""
+Check that AutomaticMode puts every cube at the right height in the simulated cell.
+
+Builds a tower for every ordering of the cubes in the main bin. Most of them store cubes and retrieve them later, so
+both ways onto the stack are covered. Then the job queue mode builds the towers of JOB_LISTS back to back, where the
+later towers start with cubes the earlier ones left in the storage bins. A run fails if a tower is wrong, or if a cube
+was picked or dropped away from the level of the stack or bin it belongs to (see cell.Place.levels). Exits with status
+1 if any run failed.
+
+Usage:
+    python sim/check_stacking.py
+"""
+import contextlib
+import io
+import itertools
+import os
+import sys
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SIM_DIR, "..", "src"))
+sys.path.insert(0, SIM_DIR)
+
+from cell import default_cell  # noqa: E402
+from run_automatic import create_devices, create_automatic_mode, create_job_queue_mode  # noqa: E402
+from world import world  # noqa: E402
+
+from modes.AutomaticMode import CUBE_SEQUENCE  # noqa: E402
+
+# Orders (bottom first) built back to back by the job queue mode, with repeated colors so cubes stay in storage
+JOB_LISTS = [
+    [["red", "red", "blue", "blue"], ["green", "red", "green", "red"], ["yellow", "blue", "green", "red"]],
+    [["blue", "green", "yellow", "red"], ["red", "red", "red", "red"], ["blue", "blue", "green", "green"],
+     ["yellow", "green", "blue", "red"]],
+    [["green", "green"], ["yellow", "red", "blue"], ["green", "yellow", "green", "yellow"]],
+]
+
+
+def get_stacked_sources(cell):
+    """Place every cube on the stack was picked from, bottom first."""
+    sources = []
+    picked_from = None
+    for time, event, detail in cell.events:
+        if event == "picked":
+            picked_from = detail.split(":")[0]
+        elif event == "dropped" and detail.startswith("stack:"):
+            sources.append(picked_from)
+    return sources
+
+
+def check_tower(order):
+    """Build one tower with the main bin ordered top to bottom as given. Returns the problems found."""
+    cell = default_cell(list(reversed(order)))
+    world.reset(cell)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = create_automatic_mode(create_devices()).run()
+
+    problems = ["misplaced " + detail for detail in cell.misplaced()]
+    if not result:
+        problems.append("run failed")
+    if cell.place("stack").cubes != CUBE_SEQUENCE:
+        problems.append("stack is " + str(cell.place("stack").cubes))
+    return problems, get_stacked_sources(cell)
+
+
+def check_jobs(orders, seed):
+    """Build the orders (bottom first) with the job queue mode. Returns the problems found."""
+    cell = default_cell([])
+    world.reset(cell)
+    with contextlib.redirect_stdout(io.StringIO()):
+        job_queue_mode = create_job_queue_mode(create_devices(), orders, cell, seed)
+        result = job_queue_mode.run()
+
+    problems = ["misplaced " + detail for detail in cell.misplaced()]
+    if not result:
+        problems.append("run failed")
+    elif job_queue_mode.towers != orders:
+        problems.append("towers are " + str(job_queue_mode.towers))
+    return problems, get_stacked_sources(cell)
+
+
+def main():
+    failures = 0
+    from_storage = 0
+    orders = list(itertools.permutations(CUBE_SEQUENCE))
+    for order in orders:
+        problems, sources = check_tower(list(order))
+        from_storage += len([source for source in sources if source not in ("main", None)])
+        if problems:
+            failures += 1
+            print("FAIL", ",".join(order) + ":", "; ".join(problems))
+
+    print("Towers:", len(orders) - failures, "of", len(orders), "correct,", from_storage, "cubes stacked from storage")
+
+    job_failures = 0
+    from_storage = 0
+    for seed, job_list in enumerate(JOB_LISTS):
+        problems, sources = check_jobs(job_list, seed)
+        from_storage += len([source for source in sources if source not in ("main", None)])
+        if problems:
+            job_failures += 1
+            print("FAIL", ";".join(",".join(order) for order in job_list) + ":", "; ".join(problems))
+
+    print("Job lists:", len(JOB_LISTS) - job_failures, "of", len(JOB_LISTS), "correct,", from_storage,
+          "cubes stacked from storage")
+    failures += job_failures
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
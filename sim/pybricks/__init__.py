@@ -0,0 +1,6 @@
+"""
+Simulated pybricks package.
+
+Put the sim directory in front of the import path (PYTHONPATH=sim:src) and the code in src/ runs unchanged against the
+simulated devices in sim/world.py instead of the EV3.
+"""
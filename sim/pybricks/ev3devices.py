@@ -0,0 +1,278 @@
+"""
+Simulated pybricks.ev3devices.
+
+Motors follow a trapezoidal speed profile with the speed and acceleration limits of their configuration and stall when
+they push against an end-stop. Sensors read their value from the world (touch sensors from the angle of the motor they
+are mounted on, the color sensor from the cube under it).
+"""
+import math
+
+import world as world_config
+from pybricks.parameters import Stop
+from world import world
+
+STOP_MODES = (Stop.COAST, Stop.BRAKE, Stop.HOLD)
+
+# Position tolerance (motor degrees) for a target to count as reached
+TARGET_TOLERANCE = 1
+
+
+class Control:
+    def __init__(self, motor):
+        self._motor = motor
+        self.stall_speed = 20  # deg/s
+        self.stall_time = 200  # ms
+
+    def done(self):
+        return self._motor._is_done()
+
+    def stalled(self):
+        return self._motor._stall_ms >= self.stall_time
+
+    def stall_tolerances(self, speed=None, time=None):
+        if speed is None and time is None:
+            return self.stall_speed, self.stall_time
+        if speed is not None:
+            self.stall_speed = speed
+        if time is not None:
+            self.stall_time = time
+
+    def limits(self, speed=None, acceleration=None, actuation=None):
+        if speed is None and acceleration is None and actuation is None:
+            return self._motor.max_speed, self._motor.acceleration, 100
+        if speed is not None:
+            self._motor.max_speed = speed
+        if acceleration is not None:
+            self._motor.acceleration = acceleration
+
+
+class Motor:
+    def __init__(self, port, positive_direction=None, gears=None):
+        config = world.motor_config(port)
+        self.port = port
+        self.max_speed = config["max_speed"]
+        self.acceleration = config["acceleration"]
+        self.control = Control(self)
+
+        # Physical position and speed (motor degrees), the reported angle is relative to the last reset
+        self._position = float(config["start"])
+        self._velocity = 0.0
+        self._offset = self._position
+
+        self._mode = Stop.HOLD  # "run", "target", "time" or one of the Stop values
+        self._speed = 0.0
+        self._target = 0.0
+        self._end_time = 0.0
+        self._then = Stop.HOLD
+        self._stall_ms = 0.0
+
+        world.add_motor(self)
+
+    # Commands
+
+    def angle(self):
+        world.advance(world_config.MOTOR_READ_MS)
+        return int(round(self._position - self._offset))
+
+    def speed(self):
+        world.advance(world_config.MOTOR_READ_MS)
+        return int(round(self._velocity))
+
+    def reset_angle(self, angle=0):
+        if angle is None:
+            angle = 0
+        self._offset = self._position - angle
+
+    def stop(self):
+        self._command()
+        self._halt(Stop.COAST)
+
+    def brake(self):
+        self._command()
+        self._halt(Stop.BRAKE)
+
+    def hold(self):
+        self._command()
+        self._halt(Stop.HOLD)
+
+    def stalled(self):
+        return self.control.stalled()
+
+    def run(self, speed):
+        self._start("run", speed)
+
+    def dc(self, duty):
+        self._start("run", self.max_speed * duty / 100)
+
+    def run_time(self, speed, time, then=Stop.HOLD, wait=True):
+        self._start("time", speed, then=then)
+        self._end_time = world.time + time
+        if wait:
+            world.run_until(self._is_done)
+
+    def run_angle(self, speed, rotation_angle, then=Stop.HOLD, wait=True):
+        direction = 1 if speed * rotation_angle >= 0 else -1
+        angle = self._position - self._offset
+        self.run_target(abs(speed), angle + direction * abs(rotation_angle), then=then, wait=wait)
+
+    def run_target(self, speed, target_angle, then=Stop.HOLD, wait=True):
+        self._start("target", abs(speed), then=then)
+        self._target = target_angle + self._offset
+        if wait:
+            world.run_until(self._is_done)
+
+    def track_target(self, target_angle):
+        self.run_target(self.max_speed, target_angle, wait=False)
+
+    def run_until_stalled(self, speed, then=Stop.COAST, duty_limit=None):
+        self._start("run", speed, then=then)
+        world.run_until(self.control.stalled)
+        self._halt(then)
+        return self.angle()
+
+    # Simulation
+
+    def _command(self):
+        world.advance(world_config.MOTOR_COMMAND_MS)
+
+    def _start(self, mode, speed, then=Stop.HOLD):
+        self._command()
+        self._mode = mode
+        self._speed = max(-self.max_speed, min(self.max_speed, speed))
+        self._then = then
+        self._stall_ms = 0.0
+
+    def _halt(self, then):
+        self._mode = then
+        self._velocity = 0.0
+        self._stall_ms = 0.0
+
+    def _is_idle(self):
+        return self._velocity == 0 and self._mode in STOP_MODES
+
+    def _is_done(self):
+        if self._mode == "run":
+            return False
+        if self._mode == "time":
+            return world.time >= self._end_time
+        if self._mode == "target":
+            return self.control.stalled() or (abs(self._target - self._position) <= TARGET_TOLERANCE
+                                              and abs(self._velocity) < self.control.stall_speed)
+        return True
+
+    def _desired_velocity(self):
+        if self._mode in ("run", "time"):
+            return self._speed
+        if self._mode == "target":
+            remaining = self._target - self._position
+            if abs(remaining) <= TARGET_TOLERANCE / 2:
+                return 0.0
+            # Slow down in time to stop on the target
+            braking_speed = math.sqrt(2 * self.acceleration * abs(remaining))
+            return math.copysign(min(self._speed, braking_speed), remaining)
+        return 0.0
+
+    def _max_step(self, step):
+        """Longest step (ms) the motor can take in one go, the regular step while braking or stalling."""
+        if self._is_idle():
+            return float("inf")
+
+        desired = self._desired_velocity()
+        if desired == 0 or self._stall_ms > 0 or self._velocity * desired < 0:
+            return step
+        if self._mode == "target" and abs(desired) < self._speed:
+            # Braking towards the target
+            return step
+
+        # Constant acceleration until the desired speed is reached, then constant speed until it has to brake, hits an
+        # end-stop or the run time is over. The distances use the desired speed as an upper bound.
+        speed = abs(desired)
+        longest = float("inf")
+        if desired != self._velocity:
+            longest = abs(desired - self._velocity) / self.acceleration * 1000
+
+        low, high = world.motor_limits(self)
+        limit = high if desired > 0 else low
+        longest = min(longest, abs(limit - self._position) / speed * 1000)
+        if self._mode == "target":
+            braking_distance = speed * speed / (2 * self.acceleration)
+            longest = min(longest, (abs(self._target - self._position) - braking_distance) / speed * 1000)
+        elif self._mode == "time":
+            longest = min(longest, self._end_time - world.time)
+        return max(step, longest)
+
+    def _step(self, dt):
+        if self._is_idle():
+            return
+        if self._mode == "time" and world.time >= self._end_time:
+            self._halt(self._then)
+        if self._mode == "target" and self._is_done():
+            # The target was reached (or the motor stalled), keep holding it
+            if not self.control.stalled():
+                self._position = self._target
+            self._halt(self._then)
+            return
+
+        desired = self._desired_velocity()
+        max_change = self.acceleration * dt / 1000
+        last_velocity = self._velocity
+        self._velocity += max(-max_change, min(max_change, desired - self._velocity))
+        self._position += (last_velocity + self._velocity) / 2 * dt / 1000
+
+        # End-stops
+        low, high = world.motor_limits(self)
+        blocked = False
+        if self._position > high:
+            self._position = high
+            blocked = desired > 0
+            self._velocity = 0.0
+        elif self._position < low:
+            self._position = low
+            blocked = desired < 0
+            self._velocity = 0.0
+
+        if blocked:
+            self._stall_ms += dt
+        elif desired == 0 or abs(self._velocity) >= self.control.stall_speed:
+            self._stall_ms = 0.0
+
+
+class TouchSensor:
+    def __init__(self, port):
+        self.port = port
+        world.add_sensor(self)
+
+    def pressed(self):
+        world.advance(world_config.SENSOR_READ_MS)
+        return world.touch_pressed(self.port)
+
+
+class ColorSensor:
+    def __init__(self, port):
+        self.port = port
+        world.add_sensor(self)
+
+    def rgb(self):
+        world.advance(world_config.SENSOR_READ_MS)
+        return world.color_rgb(self.port)
+
+    def reflection(self):
+        return sum(self.rgb()) // 3
+
+    def ambient(self):
+        return 5
+
+    def color(self):
+        return None
+
+
+class UltrasonicSensor:
+    def __init__(self, port):
+        self.port = port
+        world.add_sensor(self)
+
+    def distance(self, silent=False):
+        return 2550
+
+    def presence(self):
+        return False
@@ -0,0 +1,63 @@
+"""Simulated pybricks.hubs. The screen and speaker only record what was shown, buttons are scripted by the world."""
+from world import world
+
+
+class _Screen:
+    def __init__(self):
+        self.lines = []
+
+    def clear(self):
+        self.lines = []
+
+    def print(self, *args, sep=" ", end="\n"):
+        self.lines.append(sep.join(str(arg) for arg in args))
+
+    def draw_text(self, x, y, text, text_color=None, background_color=None):
+        self.lines.append(str(text))
+
+
+class _Speaker:
+    def __init__(self):
+        self.beeps = 0
+
+    def beep(self, frequency=500, duration=100):
+        self.beeps += 1
+
+    def say(self, text):
+        pass
+
+    def play_notes(self, notes, tempo=120):
+        pass
+
+    def set_volume(self, volume, which="_all_"):
+        pass
+
+
+class _Buttons:
+    def pressed(self):
+        return world.pressed_buttons()
+
+
+class _Light:
+    def on(self, color):
+        pass
+
+    def off(self):
+        pass
+
+
+class _Battery:
+    def voltage(self):
+        return 8000
+
+    def current(self):
+        return 200
+
+
+class EV3Brick:
+    def __init__(self):
+        self.screen = _Screen()
+        self.speaker = _Speaker()
+        self.buttons = _Buttons()
+        self.light = _Light()
+        self.battery = _Battery()
@@ -0,0 +1,48 @@
+"""Simulated pybricks.parameters: plain constants with the same names as the real module."""
+
+
+class Port:
+    A = "A"
+    B = "B"
+    C = "C"
+    D = "D"
+    S1 = "S1"
+    S2 = "S2"
+    S3 = "S3"
+    S4 = "S4"
+
+
+class Button:
+    LEFT = "LEFT"
+    RIGHT = "RIGHT"
+    UP = "UP"
+    DOWN = "DOWN"
+    CENTER = "CENTER"
+    LEFT_UP = "LEFT_UP"
+    LEFT_DOWN = "LEFT_DOWN"
+    RIGHT_UP = "RIGHT_UP"
+    RIGHT_DOWN = "RIGHT_DOWN"
+    BEACON = "BEACON"
+
+
+class Stop:
+    COAST = "COAST"
+    BRAKE = "BRAKE"
+    HOLD = "HOLD"
+
+
+class Direction:
+    CLOCKWISE = "CLOCKWISE"
+    COUNTERCLOCKWISE = "COUNTERCLOCKWISE"
+
+
+class Color:
+    BLACK = "BLACK"
+    BLUE = "BLUE"
+    GREEN = "GREEN"
+    YELLOW = "YELLOW"
+    RED = "RED"
+    WHITE = "WHITE"
+    BROWN = "BROWN"
+    ORANGE = "ORANGE"
+    PURPLE = "PURPLE"
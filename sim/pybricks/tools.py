@@ -0,0 +1,31 @@
+"""Simulated pybricks.tools. Time is virtual, so waiting costs no real time."""
+from world import world
+
+
+def wait(time):
+    world.advance(time)
+
+
+class StopWatch:
+    def __init__(self):
+        self._start = world.time
+        self._paused_at = None
+
+    def time(self):
+        if self._paused_at is not None:
+            return int(self._paused_at - self._start)
+        return int(world.time - self._start)
+
+    def pause(self):
+        if self._paused_at is None:
+            self._paused_at = world.time
+
+    def resume(self):
+        if self._paused_at is not None:
+            self._start += world.time - self._paused_at
+            self._paused_at = None
+
+    def reset(self):
+        self._start = world.time
+        if self._paused_at is not None:
+            self._paused_at = world.time
@@ -0,0 +1,202 @@
+"""
+Run AutomaticMode against the simulated cell.
+
+Usage:
+    python sim/run_automatic.py --order green,yellow,blue,red
+    python sim/run_automatic.py --calibrate-only
+    python sim/run_automatic.py --jobs "red,blue,green,yellow;yellow,green,blue,red"
+
+The order lists the cubes in the main bin from top to bottom (the first one is picked first). With --jobs the job
+queue mode builds every tower of the list, before each one the stack is cleared and the main bin filled with the
+cubes the storage bins can't provide, in a random order.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SIM_DIR, "..", "src"))
+sys.path.insert(0, SIM_DIR)
+
+from pybricks.ev3devices import Motor, TouchSensor, ColorSensor  # noqa: E402
+from pybricks.hubs import EV3Brick  # noqa: E402
+from pybricks.parameters import Port  # noqa: E402
+
+from cell import default_cell  # noqa: E402
+from world import world  # noqa: E402
+
+from utils.profiling import MotionProfiler  # noqa: E402
+from utils.sensor_sampler import (SensorSampler, SampledMotor, SampledTouchSensor,  # noqa: E402
+                                  SampledColorSensor)
+
+
+def create_devices():
+    """Create the brick and devices on the same ports as main.py."""
+    return {
+        "ev3": EV3Brick(),
+        "base_motor": Motor(Port.D),
+        "shoulder_motor": Motor(Port.A),
+        "elbow_motor": Motor(Port.C),
+        "gripper_motor": Motor(Port.B),
+        "base_touch_sensor": TouchSensor(Port.S4),
+        "color_sensor": ColorSensor(Port.S3),
+        "shoulder_touch_sensor": TouchSensor(Port.S1),
+    }
+
+
+def add_sampler(devices):
+    """Wrap the devices like main.py does, the sampler is polled by the virtual clock instead of a thread."""
+    sampler = SensorSampler()
+    for name in ("base_motor", "shoulder_motor"):
+        devices[name] = SampledMotor(devices[name], sampler)
+    for name in ("elbow_motor", "gripper_motor"):
+        devices[name] = SampledMotor(devices[name], sampler, sample_speed=True)
+    for name in ("base_touch_sensor", "shoulder_touch_sensor"):
+        devices[name] = SampledTouchSensor(devices[name], sampler)
+    devices["color_sensor"] = SampledColorSensor(devices["color_sensor"], sampler)
+    sampler.running = True
+    world.add_background_task(sampler.poll, sampler.interval)
+    return sampler
+
+
+def create_automatic_mode(devices):
+    from constants import RATIOS
+    from modes.AutomaticMode import AutomaticMode
+
+    automatic_mode = AutomaticMode(devices["ev3"], devices["base_motor"], devices["shoulder_motor"],
+                                   devices["elbow_motor"], devices["gripper_motor"], devices["base_touch_sensor"],
+                                   devices["shoulder_touch_sensor"], devices["color_sensor"], RATIOS)
+    # Compile the route and home from scratch on every run instead of caching files in the working directory
+    automatic_mode.route_path = None
+    automatic_mode.ik_table_path = None
+    automatic_mode.reachability_path = None
+    automatic_mode.calibration_path = None
+    automatic_mode.color_model_path = None
+    automatic_mode.journal_path = None
+    return automatic_mode
+
+
+class ListJobSource:
+    def __init__(self, orders):
+        self.orders = list(orders)
+
+    def next_order(self):
+        return self.orders.pop(0) if self.orders else None
+
+    def close(self):
+        pass
+
+
+def create_job_queue_mode(devices, orders, cell, seed):
+    from constants import RATIOS
+    from modes.JobQueueMode import JobQueueMode
+
+    job_queue_mode = JobQueueMode(devices["ev3"], devices["base_motor"], devices["shoulder_motor"],
+                                  devices["elbow_motor"], devices["gripper_motor"], devices["base_touch_sensor"],
+                                  devices["shoulder_touch_sensor"], devices["color_sensor"], RATIOS,
+                                  ListJobSource(orders))
+    job_queue_mode.route_path = None
+    job_queue_mode.ik_table_path = None
+    job_queue_mode.reachability_path = None
+    job_queue_mode.calibration_path = None
+    job_queue_mode.color_model_path = None
+
+    rng = random.Random(seed)
+
+    def refill(order):
+        # The operator takes the tower away and fills the main bin with what the storage bins can't provide
+        cell.place("stack").cubes = []
+        needed = list(order)
+        for place in cell.places:
+            if place.name not in ("main", "stack"):
+                for color in place.cubes:
+                    if color in needed:
+                        needed.remove(color)
+        rng.shuffle(needed)
+        cell.place("main").cubes = needed
+
+    job_queue_mode.before_job = refill
+    refill(orders[0])
+    return job_queue_mode
+
+
+def calibrate_all(devices):
+    from constants import RATIOS, LENGTHS
+    from parts.BasePart import BasePart
+    from parts.ElbowPart import ElbowPart
+    from parts.GripperPart import GripperPart
+    from parts.ShoulderPart import ShoulderPart
+
+    parts = [
+        BasePart(devices["base_motor"], devices["base_touch_sensor"], RATIOS["base"]),
+        ElbowPart(devices["elbow_motor"], RATIOS["elbow"], length=LENGTHS["elbow"]),
+        ShoulderPart(devices["shoulder_motor"], devices["shoulder_touch_sensor"], RATIOS["shoulder"],
+                     length=LENGTHS["shoulder"]),
+        GripperPart(devices["gripper_motor"]),
+    ]
+    for part in parts:
+        start = world.time
+        part.calibrate()
+        print("[Sim]", part.name, "calibrated in", int(world.time - start), "ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run AutomaticMode in the simulated cell.")
+    parser.add_argument("--order", default="green,yellow,blue,red", help="Main bin cubes, top first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--grab-miss-rate", type=float, default=0.0)
+    parser.add_argument("--calibrate-only", action="store_true")
+    parser.add_argument("--jobs", help="Run the job queue mode with these orders (bottom first, separated by ;)")
+    parser.add_argument("--profile", help="Write a motion profile (CSV) to this file and print a summary")
+    parser.add_argument("--sampler", action="store_true", help="Read the sensors through the background sampler")
+    parser.add_argument("--quiet", action="store_true", help="Hide the output of the program itself")
+    args = parser.parse_args()
+
+    main_bin = list(reversed(args.order.split(",")))
+    cell = default_cell(main_bin, seed=args.seed, grab_miss_rate=args.grab_miss_rate)
+    world.reset(cell)
+
+    started = time.perf_counter()
+    output = io.StringIO() if args.quiet else sys.stdout
+    with contextlib.redirect_stdout(output):
+        devices = create_devices()
+        if args.sampler:
+            add_sampler(devices)
+        if args.calibrate_only:
+            calibrate_all(devices)
+            result = True
+        elif args.jobs:
+            job_queue_mode = create_job_queue_mode(devices, [order.split(",") for order in args.jobs.split(";")],
+                                                   cell, args.seed)
+            result = job_queue_mode.run()
+        else:
+            automatic_mode = create_automatic_mode(devices)
+            if args.profile:
+                automatic_mode.profiler = MotionProfiler()
+                automatic_mode.profile_path = args.profile
+            result = automatic_mode.run()
+    elapsed = time.perf_counter() - started
+
+    # A cube picked or dropped at the wrong level of the stack or a bin fails the run
+    for detail in cell.misplaced():
+        print("[Sim] Misplaced:", detail)
+    if cell.misplaced():
+        result = False
+
+    print("[Sim] Result:", result)
+    print("[Sim] Stack:", cell.place("stack").cubes)
+    if args.jobs and result:
+        print("[Sim] Towers:", job_queue_mode.towers)
+    print("[Sim] Virtual time:", round(world.time / 1000, 2), "s, real time:", round(elapsed, 2), "s, speedup:",
+          round(world.time / 1000 / elapsed, 1), "x")
+    if args.profile and result and not args.calibrate_only:
+        for line in automatic_mode.profiler.summary():
+            print("[Sim]", line)
+
+
+if __name__ == "__main__":
+    main()
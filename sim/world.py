@@ -0,0 +1,144 @@
+"""
+Virtual clock and device registry shared by the simulated pybricks modules.
+
+Time only advances when the program waits (pybricks.tools.wait or a blocking motor command), so a run takes as much
+real time as the physics steps need to compute. Everything specific to the robot (ports, end-stops, where the cubes
+are) lives in the cell, see sim/cell.py.
+"""
+
+# Physics step in milliseconds
+STEP_MS = 1
+
+# Time a device access costs on the brick (ev3dev sysfs reads and writes), in virtual milliseconds. With these a
+# "run, wait(10), read angle" loop takes about as long per tick as on the real brick, which the tick-counting stall
+# detection in the calibration routines was tuned on.
+MOTOR_COMMAND_MS = 3
+MOTOR_READ_MS = 3
+SENSOR_READ_MS = 2
+
+# Longest a single blocking call may wait before the simulation gives up (virtual milliseconds)
+BLOCKING_TIMEOUT_MS = 120000
+
+
+class SimulationTimeout(Exception):
+    pass
+
+
+class World:
+    def __init__(self):
+        self.time = 0.0
+        self.motors = []
+        self.sensors = []
+        self.cell = None
+        self.buttons = []
+        self.steps = 0
+        self.background_tasks = []
+        self.in_background = False
+
+    def reset(self, cell):
+        """Start a fresh simulation. Devices have to be created again after a reset."""
+        self.time = 0.0
+        self.motors = []
+        self.sensors = []
+        self.cell = cell
+        self.buttons = []
+        self.steps = 0
+        self.background_tasks = []
+        self.in_background = False
+
+    # Background tasks
+
+    def add_background_task(self, task, interval):
+        """
+        Call task every interval virtual milliseconds, like a thread on the brick would. Device accesses from the task
+        cost the program no time.
+        """
+        self.background_tasks.append([task, interval, self.time])
+
+    def run_background_tasks(self):
+        if self.in_background:
+            return
+        self.in_background = True
+        try:
+            for entry in self.background_tasks:
+                task, interval, due = entry
+                if self.time >= due:
+                    entry[2] = self.time + interval
+                    task()
+        finally:
+            self.in_background = False
+
+    # Device registry
+
+    def add_motor(self, motor):
+        self.motors.append(motor)
+        self.cell.attach_motor(motor)
+
+    def add_sensor(self, sensor):
+        self.sensors.append(sensor)
+
+    def motor_config(self, port):
+        return self.cell.motor_config(port)
+
+    def motor_limits(self, motor):
+        return self.cell.motor_limits(motor)
+
+    def touch_pressed(self, port):
+        return self.cell.touch_pressed(port)
+
+    def color_rgb(self, port):
+        return self.cell.color_rgb(port)
+
+    def pressed_buttons(self):
+        return list(self.buttons)
+
+    # Clock
+
+    def advance(self, time):
+        """Advance the virtual clock by the given number of milliseconds."""
+        if self.in_background:
+            return
+        end = self.time + time
+        while self.time < end:
+            if self.is_idle():
+                # Nothing moves, so there is nothing to simulate. Background tasks still run on their schedule
+                step = end - self.time
+                for task, interval, due in self.background_tasks:
+                    step = min(step, max(due - self.time, 0) or interval)
+                self.time += step
+                self.run_background_tasks()
+                continue
+            self.step(min(self.max_step(), end - self.time))
+
+    def max_step(self):
+        """Largest step that doesn't skip over a change in any motor's motion."""
+        step = float("inf")
+        for motor in self.motors:
+            step = min(step, motor._max_step(STEP_MS))
+        return step
+
+    def is_idle(self):
+        for motor in self.motors:
+            if not motor._is_idle():
+                return False
+        return True
+
+    def run_until(self, condition, timeout=BLOCKING_TIMEOUT_MS):
+        """Advance the virtual clock until condition() is true."""
+        end = self.time + timeout
+        while not condition():
+            if self.time >= end:
+                raise SimulationTimeout("Condition not met after " + str(timeout) + " ms of virtual time")
+            self.step(min(self.max_step(), end - self.time))
+
+    def step(self, dt):
+        for motor in self.motors:
+            motor._step(dt)
+        self.time += dt
+        self.steps += 1
+        self.cell.update()
+        if self.background_tasks:
+            self.run_background_tasks()
+
+
+world = World()
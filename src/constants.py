@@ -8,3 +8,26 @@ OFFSETS = {
     "shoulder": -20,
     "elbow": 185
 }
+
+# Link lengths of the arm as used by the automatic mode
+LENGTHS = {
+    "shoulder": 9.6,
+    "elbow": 13.5
+}
+
+# Joint travel (joint degrees) below the home reference of each joint. Base and shoulder home on their touch sensors
+# and only travel away from them, the elbow homes on the end-stop it stalls against in ElbowPart.calibrate. The limits
+# themselves come from where homing finds those references, see JointLimits.from_homes
+JOINT_TRAVEL = {
+    "base": 190,
+    "shoulder": 135,
+    "elbow": 200
+}
+
+# Where homing is expected to find the references (joint degrees after calibration): the touch sensors at the zero,
+# the elbow end-stop 80° (the 400° motor tension backoff) past it. Only used until the joints are homed
+NOMINAL_HOMES = {
+    "base": 0,
+    "shoulder": 0,
+    "elbow": 80
+}
@@ -12,10 +12,18 @@ from pybricks.hubs import EV3Brick
 from pybricks.parameters import Port, Button
 
 from constants import RATIOS
-from modes.AutomaticMode import AutomaticMode
+from modes.AutomaticMode import AutomaticMode, MAX_TOWER_HEIGHT
 from modes.ColorCalibrationMode import ColorCalibrationMethod
+from modes.JobQueueMode import JobQueueMode, JOBS_PATH
 from modes.ManualMode import ManualMode
+from systems.ColorDetectionSystem import ColorDetectionSystem
 from utils.input import get_input
+from utils.job_queue import FileJobSource, SocketJobSource
+from utils.log import log
+from utils.sensor_sampler import SensorSampler, SampledMotor, SampledTouchSensor, SampledColorSensor
+
+# File the log buffer is written to when a mode crashes
+FAULT_LOG_PATH = "fault.log"
 
 # Execution
 
@@ -23,23 +31,32 @@ ev3 = EV3Brick()
 
 # Main entry point
 
-# Initialize the motors
-base_motor = Motor(Port.D)
-shoulder_motor = Motor(Port.A)
-elbow_motor = Motor(Port.C)
-gripper_motor = Motor(Port.B)
+# Motor positions and sensors are read on a background thread, the modes get the latest values without waiting
+sampler = SensorSampler()
+
+# Initialize the motors, the elbow and gripper speeds are read every tick by their stall detectors
+base_motor = SampledMotor(Motor(Port.D), sampler)
+shoulder_motor = SampledMotor(Motor(Port.A), sampler)
+elbow_motor = SampledMotor(Motor(Port.C), sampler, sample_speed=True)
+gripper_motor = SampledMotor(Motor(Port.B), sampler, sample_speed=True)
 
 # Initialize the sensors
-base_touch_sensor = TouchSensor(Port.S4)
-color_sensor = ColorSensor(Port.S3)
-shoulder_touch_sensor = TouchSensor(Port.S1)
+base_touch_sensor = SampledTouchSensor(TouchSensor(Port.S4), sampler)
+color_sensor = SampledColorSensor(ColorSensor(Port.S3), sampler)
+shoulder_touch_sensor = SampledTouchSensor(TouchSensor(Port.S1), sampler)
+
+sampler.start()
 
 # Now we decide what mode we want the robot to run in
 # 1. Manual mode – control each joint individually for testing
 # 2. Color calibration mode – the robot will help us calibrate the color sensor
 # 3. Automatic mode – the robot will perform the given routine for sorting cubes and building the ordered stack
-ev3.screen.print("Select mode:\n\nLEFT: Manual\nRIGHT: Color Calibration\nCENTER: Automatic")
-print("[Main] Select mode:\n\nLEFT: Manual\nRIGHT: Color Calibration\nCENTER: Automatic\n")
+# 4. Job queue mode – like the automatic mode, but builds one tower after another from orders in a file or sent over
+#    the network
+ev3.screen.print("Select mode:\n\nLEFT: Manual\nRIGHT: Color Calibration\nCENTER: Automatic\nUP: Job file\n"
+                 "DOWN: Job socket")
+print("[Main] Select mode:\n\nLEFT: Manual\nRIGHT: Color Calibration\nCENTER: Automatic\nUP: Job file\n"
+      "DOWN: Job socket\n")
 given_input = get_input(ev3)
 
 # Manual mode
@@ -61,7 +78,31 @@ elif given_input == Button.CENTER:
     print("[Main] Automatic mode engaged")
     automatic_mode = AutomaticMode(ev3, base_motor, shoulder_motor, elbow_motor, gripper_motor, base_touch_sensor,
                                    shoulder_touch_sensor, color_sensor, RATIOS)
-    automatic_mode.run()
+    try:
+        automatic_mode.run()
+    except Exception as e:
+        log.error("Main", "Automatic mode failed: {}", e)
+        log.dump(FAULT_LOG_PATH)
+        sampler.stop()
+        raise
+
+# Job queue mode
+elif given_input in (Button.UP, Button.DOWN):
+    print("[Main] Job queue mode engaged")
+    colors = list(ColorDetectionSystem.COLORS)
+    if given_input == Button.UP:
+        job_source = FileJobSource(JOBS_PATH, colors, MAX_TOWER_HEIGHT)
+    else:
+        job_source = SocketJobSource(colors, MAX_TOWER_HEIGHT)
+    job_queue_mode = JobQueueMode(ev3, base_motor, shoulder_motor, elbow_motor, gripper_motor, base_touch_sensor,
+                                  shoulder_touch_sensor, color_sensor, RATIOS, job_source)
+    try:
+        job_queue_mode.run()
+    except Exception as e:
+        log.error("Main", "Job queue mode failed: {}", e)
+        log.dump(FAULT_LOG_PATH)
+        sampler.stop()
+        raise
 
 # Invalid input
 else:
@@ -70,6 +111,7 @@ else:
     print("[Main] Invalid input. Exiting...")
     ev3.speaker.beep(100, 500)
 
+sampler.stop()
 ev3.screen.clear()
 ev3.screen.print("Program complete!")
 print("[Main] Program complete!")
@@ -0,0 +1,27 @@
+class JointLimits:
+    def __init__(self, limits: dict):
+        # limits maps a joint name ("base", "shoulder", "elbow") to its (min, max) angle in joint degrees
+        self.limits = limits
+
+    @staticmethod
+    def from_homes(travel: dict, homes: dict):
+        """
+        Limits of joints that travel the given distance (joint degrees) below their home reference, found by homing at
+        the given angles (joint degrees after calibration).
+        """
+        return JointLimits({joint: (homes[joint] - travel[joint], homes[joint]) for joint in travel})
+
+    def margin(self, joint: str, angle: float) -> float:
+        """Distance in joint degrees to the nearest travel limit. Negative if the angle is outside the limits."""
+        low, high = self.limits[joint]
+        return min(angle - low, high - angle)
+
+    def margins(self, shoulder_angle: float, elbow_angle: float, base_angle: float):
+        return (self.margin("shoulder", shoulder_angle), self.margin("elbow", elbow_angle),
+                self.margin("base", base_angle))
+
+    def is_within(self, shoulder_angle: float, elbow_angle: float, base_angle: float) -> bool:
+        return min(self.margins(shoulder_angle, elbow_angle, base_angle)) >= 0
+
+    def __str__(self):
+        return "JointLimits(" + str(self.limits) + ")"
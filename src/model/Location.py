@@ -1,28 +1,85 @@
 class Location:
+    """
+    Immutable arm position, either cartesian (x, y) or in joint angles (shoulder, elbow), plus a base angle.
+
+    The joint solution of a cartesian location is solved once per arm geometry and memoized (see get_joint_angles).
+    Variants with another base angle (with_base_angle) are cached and share that solution, since the base doesn't
+    change it.
+    """
+    __slots__ = ("_x", "_y", "_base_angle", "_elbow_angle", "_shoulder_angle", "_solution", "_variants")
+
     def __init__(self, x: float = None, y: float = None, base_angle: float = None, elbow_angle: float = None, shoulder_angle: float = None):
-        self.x = x
-        self.y = y
-        self.base_angle = base_angle
-        self.elbow_angle = elbow_angle
-        self.shoulder_angle = shoulder_angle
+        self._x = x
+        self._y = y
+        self._base_angle = base_angle
+        self._elbow_angle = elbow_angle
+        self._shoulder_angle = shoulder_angle
+        self._solution = [None, None]  # [geometry, (shoulder, elbow) or None], shared with the variants
+        self._variants = {base_angle: self}  # base_angle -> Location, shared with the variants
+
+    @property
+    def x(self):
+        return self._x
+
+    @property
+    def y(self):
+        return self._y
+
+    @property
+    def base_angle(self):
+        return self._base_angle
+
+    @property
+    def elbow_angle(self):
+        return self._elbow_angle
+
+    @property
+    def shoulder_angle(self):
+        return self._shoulder_angle
 
     def is_cartesian(self):
-        return self.x is not None and self.y is not None
+        return self._x is not None and self._y is not None
 
     def get_angles(self):
-        return self.shoulder_angle, self.elbow_angle, self.base_angle
+        return self._shoulder_angle, self._elbow_angle, self._base_angle
 
     def get_cartesian(self):
-        return self.x, self.y, self.base_angle
+        return self._x, self._y, self._base_angle
+
+    def get_joint_angles(self, geometry, solver):
+        """
+        Joint angles (shoulder, elbow) of the location, or None if it is unreachable.
+
+        Parameters:
+            geometry (tuple): Arm geometry the solution is valid for, compared against the memoized one.
+            solver (callable): Called with (x, y) to solve a cartesian location when nothing is memoized for the
+                geometry, returns (shoulder, elbow) or None.
+        """
+        if not self.is_cartesian():
+            return self._shoulder_angle, self._elbow_angle
+
+        solution = self._solution
+        if solution[0] is not geometry and solution[0] != geometry:
+            solution[1] = solver(self._x, self._y)
+            solution[0] = geometry
+        return solution[1]
+
+    def with_base_angle(self, base_angle: float):
+        """The same location with another base angle. Variants are cached, so this only allocates once per angle."""
+        variant = self._variants.get(base_angle)
+        if variant is None:
+            variant = Location(self._x, self._y, base_angle, self._elbow_angle, self._shoulder_angle)
+            variant._solution = self._solution
+            variant._variants = self._variants
+            self._variants[base_angle] = variant
+        return variant
 
     def set_base_angle(self, base_angle: float):
-        if self.is_cartesian():
-            return Location(self.x, self.y, base_angle)
-        else:
-            return Location(elbow_angle=self.elbow_angle, shoulder_angle=self.shoulder_angle, base_angle=base_angle)
+        # Kept for existing callers, locations are immutable so this returns a variant like with_base_angle
+        return self.with_base_angle(base_angle)
 
     def __str__(self):
         if self.is_cartesian():
-            return "Location(x=" + str(self.x) + ", y=" + str(self.y) + ", base_angle=" + str(self.base_angle) + ")"
+            return "Location(x=" + str(self._x) + ", y=" + str(self._y) + ", base_angle=" + str(self._base_angle) + ")"
         else:
-            return "Location(shoulder_angle=" + str(self.shoulder_angle) + ", elbow_angle=" + str(self.elbow_angle) + ", base_angle=" + str(self.base_angle) + ")"
\ No newline at end of file
+            return "Location(shoulder_angle=" + str(self._shoulder_angle) + ", elbow_angle=" + str(self._elbow_angle) + ", base_angle=" + str(self._base_angle) + ")"
@@ -0,0 +1,57 @@
+class Storage:
+    def __init__(self, base_angles: dict, capacity: int):
+        # base_angles maps a bin key to the base angle (joint degrees) of that bin, every bin holds up to capacity cubes
+        self.base_angles = dict(base_angles)
+        self.capacity = capacity
+        self.stacks = {key: [] for key in base_angles}  # bin key -> colors, bottom to top
+        self.index = {}  # color -> number of cubes of it per bin key
+
+    def keys(self) -> list:
+        return sorted(self.stacks)
+
+    def height(self, key: str) -> int:
+        return len(self.stacks[key])
+
+    def is_full(self, key: str) -> bool:
+        return len(self.stacks[key]) >= self.capacity
+
+    def top(self, key: str):
+        stack = self.stacks[key]
+        return stack[-1] if stack else None
+
+    def push(self, key: str, color: str):
+        if self.is_full(key):
+            raise ValueError("Storage bin " + key + " is full")
+        self.stacks[key].append(color)
+        counts = self.index.setdefault(color, {})
+        counts[key] = counts.get(key, 0) + 1
+
+    def pop(self, key: str) -> str:
+        color = self.stacks[key].pop()
+        counts = self.index[color]
+        counts[key] -= 1
+        if counts[key] == 0:
+            del counts[key]
+        return color
+
+    def has(self, color: str) -> bool:
+        return bool(self.index.get(color))
+
+    def find(self, color: str):
+        """Bin holding a cube of the color with the fewest cubes on top of it, None if no bin holds one."""
+        best_key = None
+        best_depth = None
+        for key in self.index.get(color, ()):
+            stack = self.stacks[key]
+            depth = len(stack) - 1 - max(i for i in range(len(stack)) if stack[i] == color)
+            if best_depth is None or depth < best_depth:
+                best_key = key
+                best_depth = depth
+        return best_key
+
+    def get_state(self) -> dict:
+        """bin key -> tuple of colors (bottom to top), a snapshot for planning."""
+        return {key: tuple(stack) for key, stack in self.stacks.items()}
+
+    def __str__(self):
+        return "Storage(" + str(self.stacks) + ")"
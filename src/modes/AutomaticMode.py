@@ -1,19 +1,56 @@
 from pybricks.ev3devices import Motor, TouchSensor, ColorSensor
 from pybricks.hubs import EV3Brick
-from pybricks.tools import wait
+from pybricks.tools import StopWatch
 
+from constants import LENGTHS, JOINT_TRAVEL, NOMINAL_HOMES
+from model.JointLimits import JointLimits
 from model.Location import Location
+from model.Storage import Storage
 from modes.Mode import Mode
 from parts.BasePart import BasePart
 from parts.ElbowPart import ElbowPart
 from parts.GripperPart import GripperPart
 from parts.ShoulderPart import ShoulderPart
-from systems.ColorDetectionSystem import ColorDetectionSystem
+from systems.ColorDetectionSystem import ColorDetectionSystem, COLOR_MODEL_PATH
+from systems.HomingSystem import HomingSystem
 from systems.MoveSystem import MoveSystem
+from systems.SchedulerSystem import SchedulerSystem, Operation, MoveOperation
+from utils.calibration_store import CalibrationStore, CALIBRATION_PATH
+from utils.ik_table import IKTable
+from utils.journal import Journal
+from utils.motion_program import MotionProgram
+from utils.reachability import ReachabilityIndex
+from utils.tower_planner import TowerPlanner, TravelModel
+
+# Precomputed IK table, built with tools/build_ik_table.py (optional)
+IK_TABLE_PATH = "ik_table.bin"
+
+# Workspace reachability index, built with tools/build_reachability.py (optional)
+REACHABILITY_PATH = "reachability.bin"
+
+# Compiled route (raw motor targets of every position), rebuilt whenever a position or the arm geometry changes
+ROUTE_PATH = "automatic_route.txt"
+
+# Progress of an unfinished run, resumed by the next one (utils.journal)
+JOURNAL_PATH = "journal.txt"
+
+# Motion profile written at the end of a run when a profiler is attached
+PROFILE_PATH = "motion_profile.csv"
 
 # Cube handling parameters
 CUBE_SEQUENCE = ["red", "blue", "green", "yellow"]  # Target stacking order
 
+# Grab attempts at the same position before a pickup is given up. A main bin position whose grabs all closed on nothing
+# counts as empty, the next pickup is one cube further down
+MAX_GRAB_ATTEMPTS = 3
+
+# Failed cycles in a row (unreachable positions, missed grabs in the storage bins) before a tower is given up
+MAX_FAILED_CYCLES = 3
+
+# Leaving a place, the arm only passes near the pre-pickup waypoint above it: the next move starts once every joint is
+# this close (motor degrees). Approaching one, the arm stops there before it descends
+WAYPOINT_TOLERANCE = 20
+
 # Pickup parameters (main cube bin)
 PRE_PICKUP_POSITION = Location(x=-3.9, y=17.2,
                                base_angle=-185.25)  # Base position above the cube stack (x, y, base_angle)
@@ -26,21 +63,36 @@ PICKUP_POSITIONS = [
     Location(shoulder_angle=-124.32, elbow_angle=-43.2, base_angle=-185.25)
 ]
 
-# Two-phase color detection parameters
-PRE_SCAN_POSITION = Location(x= -3.9, y= 17.2, base_angle= -110.75) 
+# The stack positions are the pickup positions turned to the stack, so a tower has at most this many cubes
+MAX_TOWER_HEIGHT = len(PICKUP_POSITIONS)
+
+# Color detection parameters
+SCAN_TIMEOUT = 500  # ms of sampling at the scan position before the best guess is taken
 SCAN_POSITION = Location(shoulder_angle= -50.08, elbow_angle= -47.8, base_angle= -110.75)
 
 # Stacking parameters
 STACK_BASE_ANGLE = -31.5  # Base angle for stacking
 
-# Storage bins (three bins) now keep a list of cubes (colors) that are stored.
+# Storage bins (three bins), each a stack of up to BIN_CAPACITY cubes.
 STORAGE_BIN_PRE_POSITION = Location(shoulder_angle=-116.6, elbow_angle=-32.6, base_angle=0)
 STORAGE_BIN_BASE_POS = Location(shoulder_angle=-128.96, elbow_angle=-43, base_angle=0) # Base position of the storage bins – this isn't meant to be used directly
+BIN_CAPACITY = 4
+CUBE_HEIGHT = 5.2  # Height of a cube in arm coordinates (the main bin pickup positions are about that far apart)
+
+# Leaving a place, the base already turns towards the next one once the gripper is this far (arm units) above the
+# position it left: the cube it carries or just released is then above whatever is stacked below it
+LIFT_CLEARANCE = CUBE_HEIGHT
+
+# Position to pick the top cube of a bin holding height + 1 cubes, or to put a cube on a bin holding height cubes. Above
+# the bottom one they are STORAGE_BIN_BASE_POS (x=-7.52, y=-3.68) raised by whole cubes.
+STORAGE_BIN_POSITIONS = [STORAGE_BIN_BASE_POS] + [
+    Location(x=-7.52, y=-3.68 + height * CUBE_HEIGHT, base_angle=0) for height in range(1, BIN_CAPACITY)
+]
 
 STORAGE_BINS = {
-    "A": {"base_angle": -50, "cube": ""},
-    "B": {"base_angle": -70, "cube": ""},
-    "C": {"base_angle": -90, "cube": ""}
+    "A": {"base_angle": -50},
+    "B": {"base_angle": -70},
+    "C": {"base_angle": -90}
 }
 
 
@@ -63,74 +115,245 @@ class AutomaticMode(Mode):
         self.cube_sequence = CUBE_SEQUENCE
         self.current_tower = []  # Cubes correctly stacked (by color)
 
-        # Storage bins
-        self.storage_bins = STORAGE_BINS
+        # Storage bins, every run starts with empty bins
+        self.storage_bins = {key: dict(bin_data) for key, bin_data in STORAGE_BINS.items()}
+        self.storage = Storage({key: bin_data["base_angle"] for key, bin_data in STORAGE_BINS.items()}, BIN_CAPACITY)
 
         # Main bin pickup tracking: count of cubes picked so far (to lower the pickup position)
         self.pre_pickup_position = PRE_PICKUP_POSITION
         self.cube_pickup_count = 0
 
+        # Optional callback, called with the name of every phase the routine enters (used by the benchmarks)
+        self.phase_listener = None
+
+        # Optional utils.profiling.MotionProfiler attached to the move system, written to profile_path when the tower
+        # is complete (set profile_path to None to export it yourself)
+        self.profiler = None
+        self.profile_path = PROFILE_PATH
+
+        # Compiled route (utils.motion_program.MotionProgram), set up by load_route. It is cached at route_path
+        # (None compiles it on every run)
+        self.route = None
+        self.route_path = ROUTE_PATH
+
+        # IK table the cartesian positions of the route are solved with (None solves them analytically)
+        self.ik_table_path = IK_TABLE_PATH
+
+        # Reachability index MoveSystem.can_reach answers from (None always checks exactly)
+        self.reachability_path = REACHABILITY_PATH
+
+        # Picks the storage bins (utils.tower_planner.TowerPlanner), set up for every tower. The travel model it
+        # estimates with is set up by start and learns from every move of the run
+        self.planner = None
+        self.travel_model = None
+
+        # Progress journaled at journal_path after every step and resumed from there (None always starts over)
+        self.journal_path = JOURNAL_PATH
+        self.journal = None
+
+        # Set up by start
+        self.parts = None
+        self.gripper_part = None
+        self.move_system = None
+        self.color_detection_system = None
+        self.calibration_store = None
+
+        # Calibration kept between runs at calibration_path (None always homes from scratch)
+        self.calibration_path = CALIBRATION_PATH
+
+        # Color model written by the color calibration mode (None uses the default centroids)
+        self.color_model_path = COLOR_MODEL_PATH
+
+    def mark_phase(self, phase: str):
+        if self.phase_listener is not None:
+            self.phase_listener(phase)
+
+    def get_state(self) -> dict:
+        return {"sequence": self.cube_sequence, "tower": self.current_tower, "pickups": self.cube_pickup_count,
+                "storage": self.storage.get_state()}
+
+    def checkpoint(self):
+        """Journal the state, right after a cube was released where it belongs."""
+        if self.journal is not None:
+            self.journal.append(self.get_state())
+
+    def resume(self) -> list:
+        """
+        Restore the storage bins and the main bin pickups from the journal if it holds an unfinished run of the same
+        sequence. Returns the tower built so far ([] when starting over).
+        """
+        if self.journal_path is None:
+            return []
+        self.journal = Journal(self.journal_path)
+        state = self.journal.load()
+        if state is None:
+            return []
+        if state["sequence"] != list(self.cube_sequence) or len(state["tower"]) >= len(state["sequence"]):
+            self.journal.clear()
+            return []
+
+        for key, colors in state["storage"].items():
+            for color in colors:
+                self.storage.push(key, color)
+        self.cube_pickup_count = state["pickups"]
+        if self.cube_pickup_count >= len(PICKUP_POSITIONS):
+            print("AutomaticMode: The main bin ran empty in the interrupted run, it has to be refilled.")
+            self.cube_pickup_count = 0
+        print("AutomaticMode: Resuming an interrupted run with tower", state["tower"], "and", self.storage, "after",
+              self.cube_pickup_count, "cubes taken from the main bin.")
+        print("AutomaticMode: A cube that was in the gripper goes back where it was picked up: on top of the main bin,"
+              " or on top of the storage bin the journal still lists it in.")
+        return state["tower"]
+
     def has_cube_in_storage(self, target_color: str) -> bool:
         """Check if any storage bin contains a cube of the target color."""
-        for bin_data in self.storage_bins.values():
-            if target_color == bin_data["cube"]:
-                return True
-        return False
+        return self.storage.has(target_color)
+
+    def get_storage_target(self, bin_key: str, height: int) -> str:
+        return "storage@" + bin_key + "/" + str(height)
+
+    def move_cube_between_bins(self, source: str, destination: str, move_system, gripper_part) -> bool:
+        """Move the top cube of one storage bin onto another."""
+        print("AutomaticMode: Moving the top cube of bin", source, "to bin", destination)
+        if not self.travel(move_system, gripper_part, "pre_pickup@" + source,
+                           self.get_storage_target(source, self.storage.height(source) - 1), open_gripper=True):
+            return False
+        if not self.grab_cube(gripper_part):
+            print("AutomaticMode: Error - Could not grab the top cube of bin", source)
+            return False
+        color = self.storage.pop(source)
+
+        if not (self.pass_waypoint(move_system, "pre_pickup@" + source)
+                and self.travel(move_system, gripper_part, "pre_pickup@" + destination,
+                                self.get_storage_target(destination, self.storage.height(destination)))):
+            self.storage.push(source, color)
+            return False
+        gripper_part.release()
+        self.storage.push(destination, color)
+        self.checkpoint()
+        return self.pass_waypoint(move_system, "pre_pickup@" + destination)
 
     def retrieve_cube_from_storage(self, target_color: str, move_system, gripper_part) -> bool:
         """
         Retrieve a cube of the target_color from one of the storage bins.
         The cube is then delivered to the stacking area.
         """
-        bin_key = None
-        for key, bin_data in self.storage_bins.items():
-            if target_color == bin_data["cube"]:
-                bin_key = key
-                # Remove one occurrence of the target cube from the bin.
-                bin_data["cube"] = ""
-                break
+        self.mark_phase("retrieval")
 
+        bin_key = self.storage.find(target_color)
         if bin_key is None:
             print("AutomaticMode: No cube of", target_color, "found in storage.")
             return False
 
-        storage_angle = self.storage_bins[bin_key]["base_angle"]
-        move_system.move_to_location(PRE_PICKUP_POSITION.set_base_angle(storage_angle))
-        print("AutomaticMode: Moving to storage bin pickup position:", storage_angle)
-
-        gripper_part.open()
+        # Cubes stored on top of it go to the other bins first.
+        while self.storage.top(bin_key) != target_color:
+            stored = self.storage.get_state()
+            stored[bin_key] = stored[bin_key][:-1]
+            destination = self.planner.choose_bin(self.current_tower, stored, self.storage.top(bin_key),
+                                                  position="pre_pickup@" + bin_key, exclude=(bin_key,))
+            if destination is None:
+                print("AutomaticMode: Error - No room to uncover the", target_color, "cube in bin", bin_key)
+                return False
+            if not self.move_cube_between_bins(bin_key, destination, move_system, gripper_part):
+                return False
 
-        # Move to the storage bin pickup position.
-        move_system.move_to_location(STORAGE_BIN_BASE_POS.set_base_angle(storage_angle))
+        # Move to the storage bin pickup position, opening the gripper on the way.
+        print("AutomaticMode: Moving to storage bin pickup position:", bin_key)
+        if not self.travel(move_system, gripper_part, "pre_pickup@" + bin_key,
+                           self.get_storage_target(bin_key, self.storage.height(bin_key) - 1), open_gripper=True):
+            print("AutomaticMode: Error - Cannot reach storage bin", bin_key)
+            return False
 
         # Grab the cube from storage.
-        gripper_part.grab()
+        if not self.grab_cube(gripper_part):
+            print("AutomaticMode: Error - Could not grab the cube from storage bin", bin_key)
+            return False
+        self.storage.pop(bin_key)
         print("AutomaticMode: Cube retrieved from storage.")
 
-        destination = self.get_dynamic_stack_position()
-        move_system.move_to_location(PRE_PICKUP_POSITION.set_base_angle(destination.base_angle))
-
-        # Deliver to stack.
-        if not move_system.move_to_location(destination):
+        # Lift out of the bin and deliver to stack.
+        destination = self.get_stack_target()
+        if not (self.pass_waypoint(move_system, "pre_pickup@" + bin_key)
+                and self.travel(move_system, gripper_part, "pre_pickup@stack", destination)):
             print("AutomaticMode: Error - Cannot reach safe delivery position for stacking.")
+            self.storage.push(bin_key, target_color)
             return False
 
         gripper_part.release()
         self.current_tower.append(target_color)
+        self.checkpoint()
         print("AutomaticMode: Retrieved cube delivered to stack.")
-        return True
+        return self.pass_waypoint(move_system, "pre_pickup@stack")
 
-    def get_pickup_position(self) -> Location:
-        return PICKUP_POSITIONS[self.cube_pickup_count % len(PICKUP_POSITIONS)]
+    def travel(self, move_system, gripper_part, waypoint: str, destination: str, open_gripper: bool = False) -> bool:
+        """
+        Move through the waypoint above a destination down to it (route target names), opening the gripper on the way
+        if asked. The arm stops at the waypoint so it descends straight down, clear of the tower and the bin walls,
+        only the gripper opens while the arm moves.
+        """
+        scheduler = SchedulerSystem()
+        waypoint_move = scheduler.add(MoveOperation(waypoint, move_system, self.route.get(waypoint)))
+        after = [waypoint_move]
+        if open_gripper:
+            after.append(scheduler.add(Operation("open", gripper_part.start_release, gripper_part.step_release)))
+        scheduler.add(MoveOperation(destination, move_system, self.route.get(destination)), after=after)
+        return scheduler.run()
+
+    def pass_waypoint(self, move_system, waypoint: str) -> bool:
+        """
+        Lift to the waypoint above the place the arm is at, until it is near it or LIFT_CLEARANCE above where it
+        started, the next move takes over from there.
+        """
+        scheduler = SchedulerSystem()
+        scheduler.add(MoveOperation(waypoint, move_system, self.route.get(waypoint), tolerance=WAYPOINT_TOLERANCE,
+                                    clearance=LIFT_CLEARANCE))
+        return scheduler.run()
+
+    def grab_cube(self, gripper_part) -> bool:
+        """Grab at the current position, opening and grabbing again right away if the gripper caught nothing."""
+        for attempt in range(MAX_GRAB_ATTEMPTS):
+            if gripper_part.grab():
+                return True
+            print("AutomaticMode: Grab missed (attempt", attempt + 1, "of", str(MAX_GRAB_ATTEMPTS) + ")")
+            gripper_part.open()
+        return False
 
-    def get_dynamic_stack_position(self) -> Location:
+    def scan_cube(self, move_system, color_detection_system):
         """
-        Compute the stacking position based on the current tower height.
+        Move to the scan position and sample the color on the way. Returns (color, confidence) as soon as the color is
+        certain, which can be before the arm gets there. The arm may still be moving when this returns, the next move
+        redirects it. If the samples aren't certain after SCAN_TIMEOUT ms at the position, the color is read again in
+        bursts there (see ColorDetectionSystem.classify_burst). If those aren't certain either the color is None, the
+        cube is never sent to a guessed place.
         """
+        move_system.start_move_to_target(self.route.get("scan"))
+        color_detection_system.start_sampling()
+
+        stopwatch = StopWatch()
+        arrived_at = None
+        while not color_detection_system.is_confident():
+            color_detection_system.sample()
+            if arrived_at is None:
+                if move_system.is_move_done():
+                    arrived_at = stopwatch.time()
+            elif stopwatch.time() - arrived_at > SCAN_TIMEOUT:
+                break
 
-        pos = PICKUP_POSITIONS[-(len(self.current_tower))]
+        if color_detection_system.is_confident():
+            return color_detection_system.get_result()
 
-        return pos.set_base_angle(STACK_BASE_ANGLE)
+        move_system.finish_move()
+        return color_detection_system.classify_burst()
+
+    def get_pickup_target(self) -> str:
+        return "pickup/" + str(self.cube_pickup_count % len(PICKUP_POSITIONS))
+
+    def get_stack_target(self) -> str:
+        """
+        Name of the stacking position of the next cube, on top of the current tower. The stack positions are the main
+        bin pickup positions, the first one being the top of a full bin.
+        """
+        return "stack/" + str(MAX_TOWER_HEIGHT - 1 - len(self.current_tower))
 
     def handle_cube_from_main_bin(self, move_system, gripper_part, color_detection_system) -> bool:
         """
@@ -139,77 +362,69 @@ class AutomaticMode(Mode):
         or deposit it in a storage bin.
         """
         # === Pickup Phase ===
+        self.mark_phase("pickup")
 
-        # Moves the arm above to the main bin pickup position.
-        print("AutomaticMode: Moving to main bin pickup position:")
-        move_system.move_to_location(PRE_PICKUP_POSITION)
-
-        # Prepares to grab the cube.
-        gripper_part.open()
-
-        pickup_location = self.get_pickup_position()
-        print("AutomaticMode: Moving to effective pickup position:", pickup_location)
-        if not move_system.move_to_location(pickup_location):
+        # Moves the arm through the position above the main bin down to the pickup position, opening the gripper on
+        # the way.
+        pickup_target = self.get_pickup_target()
+        print("AutomaticMode: Moving to effective pickup position:", pickup_target)
+        if not self.travel(move_system, gripper_part, "pre_pickup@main", pickup_target, open_gripper=True):
             print("AutomaticMode: Error - Cannot reach pickup position.")
             return False
 
-        gripper_part.grab()
+        if not self.grab_cube(gripper_part):
+            print("AutomaticMode: Error - Could not grab a cube from the main bin at", pickup_target,
+                  "- taking the position as empty.")
+            self.cube_pickup_count += 1
+            self.checkpoint()
+            return False
         print("AutomaticMode: Cube grabbed from main bin.")
 
-        # Move upward to safe height.
-        if not move_system.move_to_location(PRE_PICKUP_POSITION):
+        # Move upward to safe height, the move to the scan position takes over near it.
+        if not self.pass_waypoint(move_system, "pre_pickup@main"):
             print("AutomaticMode: Error - Cannot reach safe height position.")
             return False
 
-        # === Two-Phase Color Detection ===
-        # Phase 1: Adjust base rotation while keeping (x, y) fixed.
-        print("AutomaticMode: Phase 1 - Adjusting base rotation for color check")
-        if not move_system.move_to_location(PRE_SCAN_POSITION):
-            print("AutomaticMode: Error - Cannot adjust base for color detection.")
-            return False
-
-        wait(250)  # Stabilization delay
+        # === Color Detection ===
+        # Sample the color while the cube moves over the sensor, the arm leaves as soon as the color is certain.
+        self.mark_phase("scan")
+        print("AutomaticMode: Moving to color check position while sampling")
+        detected_color, confidence = self.scan_cube(move_system, color_detection_system)
+        print("AutomaticMode: Detected cube color:", detected_color, "confidence:", confidence)
 
-        # Phase 2: Move to final color check position.
-        print("AutomaticMode: Phase 2 - Moving to final color check position")
-        if not move_system.move_to_location(SCAN_POSITION):
-            print("AutomaticMode: Error - Cannot reach final color check position.")
+        # === Decision & Delivery Phase ===
+        self.mark_phase("delivery")
+        if detected_color is None:
+            # Not certain what it is: back on top of the main bin, the next cycle picks it up and scans it again
+            print("AutomaticMode: Error - Color not certain. Putting the cube back at", pickup_target)
+            if self.travel(move_system, gripper_part, "pre_pickup@main", pickup_target):
+                gripper_part.release()
+                self.pass_waypoint(move_system, "pre_pickup@main")
             return False
 
-        detected_color = color_detection_system.detect_color()
-        print("AutomaticMode: Detected cube color:", detected_color)
-
-        # === Decision & Delivery Phase ===
         expected_color = (self.cube_sequence[len(self.current_tower)]
                           if len(self.current_tower) < len(self.cube_sequence) else None)
         if detected_color == expected_color:
-            # Correct cube: deliver to stacking area.
-            self.current_tower.append(detected_color)
-            destination = self.get_dynamic_stack_position()
+            # Correct cube: deliver to stacking area, it joins the tower once it is released.
+            bin_key = None
+            destination = self.get_stack_target()
+            pre_destination = "pre_pickup@stack"
             print("AutomaticMode: Cube matches expected color. Stacking at:", destination)
         else:
-            # Incorrect cube: deposit it into a storage bin.
-            # Select the storage bin with the fewest cubes.
-            bin_key = None
-            for key, bin_data in self.storage_bins.items():
-                if bin_data["cube"] == "":
-                    bin_key = key
-                    break
+            # Incorrect cube: deposit it into the storage bin the planner expects to finish the tower fastest with.
+            bin_key = self.planner.choose_bin(self.current_tower, self.storage.get_state(), detected_color)
 
             if bin_key is None:
                 print("AutomaticMode: No storage bin available for incorrect cube.")
                 return False
 
-            bin_angle = self.storage_bins[bin_key]["base_angle"]
-            destination = STORAGE_BIN_BASE_POS.set_base_angle(bin_angle)
-
-            self.storage_bins[bin_key]["cube"] = detected_color
+            destination = self.get_storage_target(bin_key, self.storage.height(bin_key))
+            pre_destination = "pre_pickup@" + bin_key
             print("AutomaticMode: Cube does not match expected color. Storing in bin", bin_key)
 
         # Two-phase delivery: move upward first, then to destination.
-        move_system.move_to_location(PRE_PICKUP_POSITION.set_base_angle(destination.base_angle))
         print("AutomaticMode: Moving upward to safe delivery position")
-        if not move_system.move_to_location(destination):
+        if not self.travel(move_system, gripper_part, pre_destination, destination):
             print("AutomaticMode: Error - Cannot reach safe delivery position.")
             return False
 
@@ -217,47 +432,220 @@ class AutomaticMode(Mode):
         gripper_part.release()
         print("AutomaticMode: Cube released at destination.")
 
-        # Increment pickup counter for next main-bin cube.
+        # The cube is where it belongs, journal that before the arm leaves. The next main-bin cube is one further down.
+        if bin_key is None:
+            self.current_tower.append(detected_color)
+        else:
+            self.storage.push(bin_key, detected_color)
         self.cube_pickup_count += 1
+        self.checkpoint()
+
+        if not self.pass_waypoint(move_system, pre_destination):
+            print("AutomaticMode: Error - Cannot leave the destination.")
+            return False
         return True
 
-    def run(self):
-        print("Running Automatic Mode with full tower completion logic...")
+    def get_route_locations(self) -> dict:
+        """Every location the automatic routine can move to, by target name."""
+        locations = {
+            "scan": SCAN_POSITION,
+            "pre_pickup@main": PRE_PICKUP_POSITION,
+            "pre_pickup@stack": PRE_PICKUP_POSITION.with_base_angle(STACK_BASE_ANGLE),
+        }
+        for key, bin_data in self.storage_bins.items():
+            locations["pre_pickup@" + key] = PRE_PICKUP_POSITION.with_base_angle(bin_data["base_angle"])
+            for height, position in enumerate(STORAGE_BIN_POSITIONS):
+                locations[self.get_storage_target(key, height)] = position.with_base_angle(bin_data["base_angle"])
+        for i, position in enumerate(PICKUP_POSITIONS):
+            locations["pickup/" + str(i)] = position
+            locations["stack/" + str(i)] = position.with_base_angle(STACK_BASE_ANGLE)
+        return locations
+
+    def get_route_key(self, move_system) -> str:
+        """Describes everything the compiled route depends on, a cached route is only used if its key matches."""
+        locations = self.get_route_locations()
+        parts = [name + "=" + str(locations[name]) for name in sorted(locations)]
+        parts.append(repr(move_system.get_geometry()))
+        parts.append(str(move_system.joint_limits))
+        return ";".join(parts).replace(" ", "")
+
+    def load_route(self, move_system) -> bool:
+        """
+        Load the compiled route from route_path, or compile and cache it if it is missing or out of date.
+        Returns False if a position of the route is unreachable.
+        """
+        key = self.get_route_key(move_system)
+        route = None
+        if self.route_path is not None:
+            route = MotionProgram.load(self.route_path, key)
+
+        if route is None or route.names() != sorted(self.get_route_locations()):
+            route = MotionProgram.compile(key, self.get_route_locations(), move_system)
+            if route is None:
+                return False
+            if self.route_path is not None:
+                try:
+                    route.save(self.route_path)
+                except OSError:
+                    print("AutomaticMode: Could not cache the compiled route at", self.route_path)
+
+        self.route = route
+        return True
+
+    def start(self) -> bool:
+        """
+        Set up the parts and systems, compile the route and home every joint. Returns False if that failed, see
+        build_tower and finish for the rest of a run.
+        """
         # Initialize parts with typical Python naming.
         base_part = BasePart(self.base_motor, self.base_touch_sensor, self.ratios["base"])
         shoulder_part = ShoulderPart(self.shoulder_motor, self.shoulder_touch_sensor, self.ratios["shoulder"],
-                                     length=9.6)
-        elbow_part = ElbowPart(self.elbow_motor, self.ratios["elbow"], length=13.5)
+                                     length=LENGTHS["shoulder"])
+        elbow_part = ElbowPart(self.elbow_motor, self.ratios["elbow"], length=LENGTHS["elbow"])
         gripper_part = GripperPart(self.gripper_motor)
+        self.parts = (base_part, shoulder_part, elbow_part, gripper_part)
+        self.gripper_part = gripper_part
+
+        # The cartesian positions are solved through the IK table when the route is compiled, and checked against the
+        # joint limits where homing is expected to find the references until it has found them
+        ik_table = IKTable.load(self.ik_table_path) if self.ik_table_path is not None else None
+        reachability = None
+        if self.reachability_path is not None:
+            reachability = ReachabilityIndex.load(self.reachability_path)
+        move_system = MoveSystem(base_part, shoulder_part, elbow_part, coordinated=True, ik_table=ik_table,
+                                 joint_limits=JointLimits.from_homes(JOINT_TRAVEL, NOMINAL_HOMES),
+                                 reachability=reachability)
+        move_system.set_profiler(self.profiler)
+        self.move_system = move_system
+
+        # Compile the route, rejecting it before any motor moves if a position is out of reach.
+        if not self.load_route(move_system):
+            print("AutomaticMode: Error - Route contains unreachable positions. Aborting.")
+            return False
+        self.travel_model = TravelModel(self.route)
+        move_system.move_listener = self.travel_model.observe
+
+        # Calibrate parts, all at once. The shoulder only sweeps up once the elbow is folded against its end-stop.
+        self.mark_phase("calibration")
+        homing_system = HomingSystem()
+        homing_system.add(base_part)
+        homing_system.add(elbow_part)
+        homing_system.add(shoulder_part, after=(elbow_part,))
+        homing_system.add(gripper_part)
+        self.calibration_store = None
+        if self.calibration_path is not None:
+            self.calibration_store = CalibrationStore.load(self.calibration_path)
+        if not homing_system.run(self.calibration_store):
+            print("AutomaticMode: Error - Calibration failed. Aborting.")
+            return False
+
+        # The joint limits are where homing found the references, the route has to stay inside them
+        homes = {}
+        for part in (base_part, shoulder_part, elbow_part):
+            homes[part.name.lower()] = part.home_angle / part.ratio
+        move_system.joint_limits = JointLimits.from_homes(JOINT_TRAVEL, homes)
+        print("AutomaticMode: Measured", move_system.joint_limits)
+        if not self.route.check(move_system):
+            print("AutomaticMode: Error - Route leaves the measured joint limits. Aborting.")
+            return False
 
-        # Calibrate parts.
-        base_part.calibrate()
-        elbow_part.calibrate()
-        shoulder_part.calibrate()
-        gripper_part.calibrate()
+        # The park angles are stale from here on, until the arm is parked at the end of the run
+        if self.calibration_store is not None:
+            for part in self.parts:
+                self.calibration_store.update(part)
+            self.calibration_store.save(clean=False)
 
         # Initialize supporting systems.
-        color_detection_system = ColorDetectionSystem(self.color_sensor)
-        move_system = MoveSystem(base_part, shoulder_part, elbow_part)
+        self.color_detection_system = ColorDetectionSystem(self.color_sensor)
+        if self.color_model_path is not None:
+            self.color_detection_system.load_model(self.color_model_path)
+        return True
+
+    def build_tower(self, sequence: list, tower=()) -> list:
+        """
+        Build one tower of the given colors (bottom first) on the stack, continuing a tower that is already partly
+        built. Cubes left in the storage bins by an earlier tower are used before new ones. Returns the tower, which is
+        shorter than the sequence if it was given up: the main bin ran empty before the next cube was found, or
+        MAX_FAILED_CYCLES cycles failed in a row.
+
+        Raises:
+            ValueError: If the tower would be higher than the stack has positions for (MAX_TOWER_HEIGHT).
+        """
+        if len(sequence) > MAX_TOWER_HEIGHT:
+            raise ValueError("A tower has at most " + str(MAX_TOWER_HEIGHT) + " cubes, got " + str(len(sequence)))
+
+        move_system = self.move_system
+        gripper_part = self.gripper_part
+        color_detection_system = self.color_detection_system
+
+        self.cube_sequence = list(sequence)
+        self.current_tower = list(tower)
+        self.planner = TowerPlanner(self.cube_sequence, self.storage.keys(), self.travel_model, BIN_CAPACITY)
+
+        # Parts that have to be settled before the next cycle starts
+        settle_parts = self.parts
 
         # Main loop: always aim to complete the full tower.
+        failed_cycles = 0
         while len(self.current_tower) < len(self.cube_sequence):
             next_expected = self.cube_sequence[len(self.current_tower)]
             print("\nAutomaticMode: Next expected cube color:", next_expected)
             # First, check if the needed cube is already stored.
             if self.has_cube_in_storage(next_expected):
                 print("AutomaticMode: Found stored cube matching", next_expected, ". Initiating retrieval.")
-                if not self.retrieve_cube_from_storage(next_expected, move_system, gripper_part):
-                    print("AutomaticMode: Error retrieving cube from storage. Retrying...")
-                    wait(500)
-                    continue
+                succeeded = self.retrieve_cube_from_storage(next_expected, move_system, gripper_part)
+            elif self.cube_pickup_count >= len(PICKUP_POSITIONS):
+                print("AutomaticMode: Error - The main bin is empty and no", next_expected,
+                      "cube is stored. Giving up the tower at", self.current_tower)
+                break
             else:
                 # If not, process a new cube from the main bin.
-                if not self.handle_cube_from_main_bin(move_system, gripper_part, color_detection_system):
-                    print("AutomaticMode: Error handling new cube. Retrying...")
-                    wait(500)
-                    continue
-            wait(500)  # Optional delay between cycles
+                succeeded = self.handle_cube_from_main_bin(move_system, gripper_part, color_detection_system)
 
-        print("AutomaticMode: Tower complete! Final tower:", self.current_tower)
-        return True
+            if not succeeded:
+                failed_cycles += 1
+                if failed_cycles >= MAX_FAILED_CYCLES:
+                    print("AutomaticMode: Error -", failed_cycles, "cycles failed in a row. Giving up the tower at",
+                          self.current_tower)
+                    break
+                print("AutomaticMode: Error handling the cube. Retrying...")
+                self.mark_phase("retry_delay")
+                move_system.wait_until_settled(settle_parts)
+                continue
+            failed_cycles = 0
+            self.mark_phase("cycle_delay")
+            move_system.wait_until_settled(settle_parts)  # Let the arm and gripper settle between cycles
+
+        if len(self.current_tower) == len(self.cube_sequence):
+            print("AutomaticMode: Tower complete! Final tower:", self.current_tower)
+        return self.current_tower
+
+    def finish(self):
+        """Park the arm, store the calibration for the next warm start and export the motion profile."""
+        if self.calibration_store is not None:
+            # Next to the home references, the next warm start only has a short way to go (ArmPart.PARK_MARGIN)
+            base_part, shoulder_part, elbow_part = self.parts[:3]
+            self.move_system.move_to_raw_angle(shoulder_part.get_park_raw(), elbow_part.get_park_raw(),
+                                               base_part.get_park_raw())
+            for part in self.parts:
+                self.calibration_store.update(part)
+            self.calibration_store.save(clean=True)
+        if self.profiler is not None and self.profile_path is not None:
+            self.profiler.export_csv(self.profile_path)
+            print("AutomaticMode: Motion profile written to", self.profile_path)
+
+    def run(self):
+        print("Running Automatic Mode with full tower completion logic...")
+        if not self.start():
+            return False
+
+        tower = self.build_tower(self.cube_sequence, self.resume())
+        self.mark_phase("done")
+        complete = len(tower) == len(self.cube_sequence)
+        if not complete:
+            # The journal keeps the tower and the storage bins, the next run continues once the cell is sorted out
+            print("AutomaticMode: Error - Tower not completed:", tower)
+        elif self.journal is not None:
+            self.journal.clear()
+        self.finish()
+        return complete
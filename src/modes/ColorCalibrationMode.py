@@ -1,33 +1,90 @@
 from pybricks.ev3devices import ColorSensor
 from pybricks.hubs import EV3Brick
+from pybricks.parameters import Button
 from pybricks.tools import wait
 
 from modes.Mode import Mode
-from systems.ColorDetectionSystem import ColorDetectionSystem
+from systems.ColorDetectionSystem import ColorDetectionSystem, COLOR_MODEL_PATH
+from utils.color_model import ColorModel
+from utils.input import get_input, wait_for_release
+from utils.log import log
+
+# Readings taken per color, move the cube around a little in front of the sensor while they are taken
+SAMPLE_COUNT = 50
+SAMPLE_INTERVAL = 20  # ms
 
 
 class ColorCalibrationMethod(Mode):
+    """
+    Fits the color model (utils.color_model) from labeled samples. For every cube color and the background, hold it in
+    front of the sensor and press CENTER to sample it (DOWN skips it, LEFT stops). The fitted model is saved to
+    model_path, which the automatic mode loads at startup, and then the live classification is shown.
+    """
+
     def __init__(self, ev3: EV3Brick, color_sensor: ColorSensor):
         super().__init__("Color Calibration")
         self.ev3 = ev3
         self.color_sensor = color_sensor
+        self.model_path = COLOR_MODEL_PATH
+
+    def collect_samples(self) -> list:
+        samples = []
+        for _ in range(SAMPLE_COUNT):
+            samples.append(self.color_sensor.rgb())
+            wait(SAMPLE_INTERVAL)
+        return samples
+
+    def calibrate(self, color_detection_system: ColorDetectionSystem) -> bool:
+        """Sample every class the user doesn't skip, returns True if the model was updated."""
+        # Start from the saved model, so classes that are skipped keep their last fit
+        model = ColorModel.load(self.model_path) or ColorModel()
+        fitted = 0
+
+        for name in color_detection_system.class_names:
+            self.ev3.screen.clear()
+            self.ev3.screen.print("Place " + name + "\n\nCENTER: sample\nDOWN: skip\nLEFT: done")
+            print("[Color Calibration] Place " + name + " in front of the sensor (CENTER: sample, DOWN: skip, "
+                  "LEFT: done)")
+            given_input = get_input(self.ev3)
+            wait_for_release(self.ev3)
+            if given_input == Button.LEFT:
+                break
+            if given_input != Button.CENTER:
+                continue
+
+            self.ev3.screen.print("Sampling...")
+            if model.fit_class(name, self.collect_samples()):
+                fitted += 1
+                self.ev3.speaker.beep(800, 100)
+            else:
+                self.ev3.speaker.beep(100, 500)
+
+        if fitted == 0:
+            return False
+
+        model.save(self.model_path)
+        color_detection_system.set_model(model)
+        log.info("Color Calibration", "Fitted {} classes, saved to {}", fitted, self.model_path)
+        return True
 
     def run(self):
         print("Running Color Calibration Mode")
+        color_detection_system = ColorDetectionSystem(self.color_sensor)
+        color_detection_system.load_model(self.model_path)
+        self.calibrate(color_detection_system)
+
         self.ev3.screen.clear()
         self.ev3.screen.print("Press any\n button to\n exit")
 
-        # We will use this to compare our results against the default settings
-        color_detection_system = ColorDetectionSystem(self.color_sensor)
-
         # Safety wait so the brick has time to update the list accordingly
         wait(1000)
         while True:
             if self.ev3.buttons.pressed():
                 break
 
+            color, confidence = color_detection_system.classify_burst()
             print("Currently measured color: ", self.color_sensor.rgb())
-            print("Currently detected color: ", color_detection_system.detect_color())
+            print("Currently detected color: ", color, "confidence:", confidence)
             print("|----------|")
             wait(250)
 
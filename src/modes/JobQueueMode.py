@@ -0,0 +1,93 @@
+from pybricks.parameters import Button
+from pybricks.tools import StopWatch
+
+from modes.AutomaticMode import AutomaticMode
+from utils.input import get_input, wait_for_release
+from utils.log import log
+
+# Orders read by the job file source (see utils.job_queue)
+JOBS_PATH = "jobs.txt"
+
+
+class JobQueueMode(AutomaticMode):
+    """
+    Builds towers back to back from a stream of orders (utils.job_queue), homing once for all of them. Cubes left in
+    the storage bins by one tower are used by the next ones. Before every tower after the first, the finished tower
+    has to be taken off the stack and the main bin refilled, which is confirmed with CENTER.
+    """
+
+    def __init__(self, ev3, base_motor, shoulder_motor, elbow_motor, gripper_motor, base_touch_sensor,
+                 shoulder_touch_sensor, color_sensor, ratios, job_source):
+        super().__init__(ev3, base_motor, shoulder_motor, elbow_motor, gripper_motor, base_touch_sensor,
+                         shoulder_touch_sensor, color_sensor, ratios)
+        self.name = "Job Queue"
+        self.job_source = job_source
+
+        # A restart can't tell which order of the queue it was building, so nothing is resumed
+        self.journal_path = None
+
+        # Optional callback replacing the operator prompt between towers, called with the next order
+        self.before_job = None
+
+        self.towers = []  # Finished towers
+
+    def prepare_job(self, order: list):
+        if self.before_job is not None:
+            self.before_job(order)
+            return
+
+        self.ev3.screen.clear()
+        self.ev3.screen.print("Clear the stack,\nrefill the bin\n\nCENTER: build\n" + ",".join(order))
+        print("[Job Queue] Clear the stack and refill the main bin, then press CENTER to build", order)
+        while get_input(self.ev3) != Button.CENTER:
+            wait_for_release(self.ev3)
+        wait_for_release(self.ev3)
+
+    def get_throughput(self, time: int) -> float:
+        """Towers per hour over time ms."""
+        if time <= 0:
+            return 0
+        return len(self.towers) * 3600000 / time
+
+    def run(self):
+        print("Running Job Queue Mode")
+        stopwatch = StopWatch()
+        if not self.start():
+            return False
+        homing_time = stopwatch.time()
+
+        stopwatch.reset()
+        failed = False
+        while True:
+            order = self.job_source.next_order()
+            if order is None:
+                break
+
+            if self.towers:
+                # The operator's time between towers doesn't count as building time
+                stopwatch.pause()
+                self.prepare_job(order)
+                stopwatch.resume()
+            # The main bin was refilled
+            self.cube_pickup_count = 0
+
+            job_stopwatch = StopWatch()
+            self.mark_phase("job")
+            tower = self.build_tower(order)
+            if len(tower) < len(order):
+                log.error("Job Queue", "Gave up order {} at {}, stopping the queue", ",".join(order), ",".join(tower))
+                failed = True
+                break
+            self.towers.append(tower)
+            log.info("Job Queue", "Tower {} ({}) built in {} s, {} towers/hour so far", len(self.towers),
+                     ",".join(tower), round(job_stopwatch.time() / 1000, 1),
+                     round(self.get_throughput(stopwatch.time()), 1))
+
+        self.mark_phase("done")
+        self.job_source.close()
+        self.finish()
+
+        build_time = stopwatch.time()
+        print("[Job Queue] Built", len(self.towers), "towers in", round(build_time / 1000, 1), "s (homing",
+              round(homing_time / 1000, 1), "s):", round(self.get_throughput(build_time), 1), "towers/hour")
+        return not failed
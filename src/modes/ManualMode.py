@@ -10,7 +10,8 @@ from parts.ElbowPart import ElbowPart
 from parts.GripperPart import GripperPart
 from parts.ShoulderPart import ShoulderPart
 from systems.MoveSystem import MoveSystem
-from utils.input import get_input
+from utils.calibration_store import CalibrationStore, CALIBRATION_PATH
+from utils.input import get_input, wait_for_release
 from utils.kinematics import get_coordinates
 
 
@@ -38,6 +39,9 @@ class ManualMode(Mode):
 
         self.move_system = MoveSystem(self.base_part, self.shoulder_part, self.elbow_part, )
 
+        # Jogging and recalibrating the joints here invalidates the park angles AutomaticMode stored for a warm start
+        self.calibration_path = CALIBRATION_PATH
+
         self.pages = {
             0: {
                 "instructions": "Manual Mode\n\nUP/DOWN: Elbow\nLEFT/RIGHT: Shoulder\nCENTER: Switch page",
@@ -62,45 +66,46 @@ class ManualMode(Mode):
             while Button.LEFT in self.ev3.buttons.pressed():
                 self.shoulder_motor.run(-self.speed)
                 wait(10)
-            self.shoulder_motor.hold()
+            self.shoulder_part.hold()
         elif pressed_button == Button.RIGHT:
             while Button.RIGHT in self.ev3.buttons.pressed():
                 self.shoulder_motor.run(self.speed)
                 wait(10)
-            self.shoulder_motor.hold()
+            self.shoulder_part.hold()
         elif pressed_button == Button.UP:
             while Button.UP in self.ev3.buttons.pressed():
                 self.elbow_motor.run(-self.speed)
                 wait(10)
-            self.elbow_motor.hold()
+            self.elbow_part.hold()
         elif pressed_button == Button.DOWN:
             while Button.DOWN in self.ev3.buttons.pressed():
                 self.elbow_motor.run(self.speed)
                 wait(10)
-            self.elbow_motor.hold()
+            self.elbow_part.hold()
 
     def page_1_actions(self, pressed_button):
         if pressed_button == Button.LEFT:
             while Button.LEFT in self.ev3.buttons.pressed():
                 self.base_motor.run(-self.speed)
                 wait(10)
-            self.base_motor.hold()
+            self.base_part.hold()
         elif pressed_button == Button.RIGHT:
             while Button.RIGHT in self.ev3.buttons.pressed():
                 self.base_motor.run(self.speed)
                 wait(10)
-            self.base_motor.hold()
+            self.base_part.hold()
 
         # Calibrate the robot
         elif pressed_button == Button.UP:
             self.base_part.calibrate()
             self.elbow_part.calibrate()
 
-            # Safety wait so the motors have time to debounce
-            wait(250)
+            # Let the motors settle before the shoulder sweeps
+            self.move_system.wait_until_settled((self.base_part, self.elbow_part))
             self.shoulder_part.calibrate()
-            # Safety wait so the brick has time to update the list accordingly & motors to debounce
-            wait(500)
+            # Let the motors settle and wait for the button to be released
+            self.move_system.wait_until_settled()
+            wait_for_release(self.ev3)
 
         # Get part angles
         elif pressed_button == Button.DOWN:
@@ -121,12 +126,14 @@ class ManualMode(Mode):
     def page_2_actions(self, pressed_button):
         if pressed_button == Button.LEFT:
             self.gripper_part.release()
-            # Safety wait
-            wait(350)
+            # Wait until the motors settled and the button is released
+            self.move_system.wait_until_settled((self.gripper_part,))
+            wait_for_release(self.ev3)
         elif pressed_button == Button.RIGHT:
             self.gripper_part.grab()
-            # Safety wait
-            wait(350)
+            # Wait until the motors settled and the button is released
+            self.move_system.wait_until_settled((self.gripper_part,))
+            wait_for_release(self.ev3)
         elif pressed_button == Button.UP:
             shoulder_angle = self.shoulder_part.get_angle() + OFFSETS["shoulder"]
             elbow_angle = self.elbow_part.get_angle() + OFFSETS["elbow"]
@@ -137,11 +144,12 @@ class ManualMode(Mode):
             print("|--------------|")
             self.ev3.screen.clear()
             self.ev3.screen.print("X: " + str(x) + "\nY: " + str(y))
-            # Safety wait
-            wait(500)
+            # Wait for the button to be released
+            wait_for_release(self.ev3)
         elif pressed_button == Button.DOWN:
             self.gripper_part.calibrate()
-            wait(350)
+            self.move_system.wait_until_settled((self.gripper_part,))
+            wait_for_release(self.ev3)
 
     def page_3_actions(self, pressed_button):
         if pressed_button == Button.LEFT:
@@ -178,8 +186,9 @@ class ManualMode(Mode):
                 self.ev3.screen.print("Invalid numbers\nin file")
                 self.ev3.speaker.beep(frequency=200, duration=500)  # Error tone
 
-            # Safety wait
-            wait(500)
+            # Wait until the motors settled and the button is released
+            self.move_system.wait_until_settled()
+            wait_for_release(self.ev3)
 
         elif pressed_button == Button.RIGHT:
             try:
@@ -220,8 +229,9 @@ class ManualMode(Mode):
                 self.ev3.screen.print("Invalid numbers\nin file")
                 self.ev3.speaker.beep(frequency=200, duration=500)  # Error tone
 
-            # Safety wait
-            wait(500)
+            # Wait until the motors settled and the button is released
+            self.move_system.wait_until_settled()
+            wait_for_release(self.ev3)
         elif pressed_button == Button.UP:
             print("Angles:")
             print("Shoulder: " + str(self.shoulder_part.get_angle()))
@@ -234,6 +244,8 @@ class ManualMode(Mode):
 
     def run(self):
         print("Running Manual Mode")
+        if self.calibration_path is not None:
+            CalibrationStore.invalidate(self.calibration_path)
         self.ev3.screen.clear()
         self.ev3.screen.print(self.pages[0]["instructions"])
         self.ev3.speaker.beep()
@@ -254,12 +266,12 @@ class ManualMode(Mode):
                 self.ev3.screen.print(self.pages[current_page]["instructions"])
                 self.ev3.speaker.beep()
 
-                # Safety wait so the brick has time to update the list accordingly
-                wait(250)
+                # Wait for the button to be released so the new page doesn't get the same press
+                wait_for_release(self.ev3)
 
             # Hold all motors when no buttons pressed
-            self.shoulder_motor.hold()
-            self.elbow_motor.hold()
-            self.base_motor.hold()
+            self.shoulder_part.hold()
+            self.elbow_part.hold()
+            self.base_part.hold()
 
             wait(10)  # Small delay to prevent excessive CPU usage
@@ -1,33 +1,188 @@
 from pybricks.ev3devices import Motor
+from pybricks.tools import wait, StopWatch
+
+from utils.log import log
+from utils.sensor_sampler import unwrap
+
+# Time (ms) a motor is held after homing before its angle is reset
+DEBOUNCE_TIME = 250
+
+# Warm start (see start_warm_calibration): the joint moves at APPROACH_SPEED to APPROACH_MARGIN motor degrees short
+# of its stored home angle, the home found from there has to be within HOME_TOLERANCE of the stored one
+APPROACH_SPEED = 800
+APPROACH_MARGIN = 10
+HOME_TOLERANCE = 20
+
+# AutomaticMode parks the arm PARK_MARGIN motor degrees short of every joint's home reference (see get_park_raw), so the
+# next warm start only approaches from there. Wider than APPROACH_MARGIN, the approach still runs towards the reference
+PARK_MARGIN = 40
+
+# Warm start of a joint that doesn't stay where it was parked (see holds_park): the park angle is only a guess, so the
+# approach runs no faster than the elbow seeks its end-stop in a full homing, hitting a stop early does no harm
+DRIFTING_APPROACH_SPEED = 400
 
 
 class ArmPart:
     def __init__(self, name, motor: Motor, ratio=1):
         self.name = name
         self.motor = motor
+        self.direct_motor = unwrap(motor)  # Never sampled, for reads that decide something on the spot
         self.ratio = ratio
+        self.profiler = None  # Optional utils.profiling.MotionProfiler, see MoveSystem.set_profiler
+        self.command_time = 0  # Profiler time of the last move command
+        self.target_raw = None  # Motor angle of the last move command, None if unknown (used for settle detection)
+        self.left_running = False  # The last move was left running for the next one to take over, see leave_move
+
+        # Calibration state machine, see start_calibration and step_calibration
+        self.calibration_state = None
+        self.calibration_stopwatch = StopWatch()
+        self.home_angle = 0  # Calibrated angle of the home reference (touch sensor or end-stop), measured by homing
+        self.home_raw = 0  # Motor angle the home reference was found at during the current calibration
+        self.expected_home = None  # Stored home angle checked by a warm start
+        self.is_calibrated = False  # The motor angle is in the calibrated frame
+        self.holds_park = True  # The joint stays at its park angle after the program exits and its motor floats
         self.motor.hold()
-        print("[ArmPart] created: " + name)
+        log.info("ArmPart", "created: {}", name)
 
     def __str__(self):
         return 'ArmPart: ' + self.name
 
     def move_motor_to_angle(self, angle, speed=100, wait=True):
-        self.motor.run_target(speed, angle * self.ratio, wait=wait)
-        print("[{}] moved to angle: {}".format(self.name, angle))
+        return self.move_motor_to_raw_angle(angle * self.ratio, speed, wait)
+
+    def move_motor_to_raw_angle(self, raw_angle, speed=100, wait=True):
+        # The raw angle is in motor degrees, the gear ratio is already applied
+        if self.profiler is not None:
+            self.command_time = self.profiler.time()
+        self.target_raw = raw_angle
+        self.left_running = False
+        self.motor.run_target(speed, raw_angle, wait=wait)
+        if self.profiler is not None and wait:
+            self.record_move(raw_angle)
+        log.debug(self.name, "moved to angle: {}", raw_angle / self.ratio)
         return True
 
+    def record_move(self, raw_angle):
+        # Report a finished move to the profiler: commanded vs. achieved angle and the time since the command
+        self.profiler.record_joint(self.name, raw_angle / self.ratio, self.get_angle(),
+                                   self.profiler.time() - self.command_time)
+
+    def leave_move(self):
+        # The move keeps running until the next one takes over, report how far from its target and when it was left
+        if self.profiler is not None and self.target_raw is not None:
+            self.profiler.record_left(self.name, self.target_raw / self.ratio, self.get_angle(),
+                                      self.profiler.time() - self.command_time)
+        self.left_running = True
+
+    def hold(self):
+        # Stop and hold where the motor is, after it was run directly (manual jogging) there is no target to settle at
+        self.motor.hold()
+        self.target_raw = None
+        self.left_running = False
+
     def get_angle(self):
         return self.motor.angle() / self.ratio
 
     def get_raw_angle(self):
         return self.motor.angle()
 
+    def get_raw_travel(self, raw_angle):
+        # Distance in motor degrees between the current position and the given raw angle
+        return abs(raw_angle - self.motor.angle())
+
     def calibrate(self):
+        # Blocking calibration, systems.HomingSystem runs the same state machine for several parts at once
+        self.start_calibration()
+        while not self.step_calibration():
+            wait(10)
+        return True
+
+    def is_settled(self, speed_threshold, position_threshold) -> bool:
+        # Not moving, and at the last commanded target if it is known. A move left running doesn't have to settle,
+        # the next move takes over from wherever it is
+        if self.left_running:
+            return True
+        if abs(self.direct_motor.speed()) > speed_threshold:
+            return False
+        return self.target_raw is None or abs(self.direct_motor.angle() - self.target_raw) <= position_threshold
+
+    def start_calibration(self):
         raise NotImplementedError()
 
+    def step_calibration(self) -> bool:
+        # Advance the calibration by one tick (called about every 10 ms), returns True once it is complete
+        raise NotImplementedError()
+
+    def start_warm_calibration(self, home_angle, park_angle):
+        """
+        Calibrate using the angles stored after the last run (utils.calibration_store), assuming the joint did not move
+        since it was parked. The joint moves quickly to just short of the stored home, then homes normally from there.
+        If the home is not where it is expected, the normal homing simply continues, so the result is always a full
+        calibration; only the time to get there changes. Joints that don't hold their park angle approach at
+        DRIFTING_APPROACH_SPEED instead of APPROACH_SPEED.
+        """
+        self.motor.reset_angle(park_angle)
+        self.start_approach(home_angle, APPROACH_SPEED if self.holds_park else DRIFTING_APPROACH_SPEED)
+
+    def start_approach(self, home_angle, speed=APPROACH_SPEED):
+        # Move to just short of where the home is expected, the motor angle has to be calibrated already
+        self.expected_home = home_angle
+        self.motor.run_target(speed, home_angle - APPROACH_MARGIN, wait=False)
+        self.calibration_state = "approach"
+
+    def get_park_raw(self):
+        # Motor angle the joint is parked at when a run ends, see PARK_MARGIN
+        return self.home_angle - PARK_MARGIN
+
+    def mark_home(self):
+        # The home reference was found, check it against the stored one on a warm start
+        self.home_raw = self.direct_motor.angle()
+        if self.expected_home is None:
+            return
+
+        difference = self.home_raw - self.expected_home
+        if abs(difference) <= HOME_TOLERANCE:
+            log.info(self.name, "Warm start verified, home off by {}°", difference)
+        else:
+            log.warning(self.name, "Warm start failed, home off by {}°", difference)
+        self.expected_home = None
+
+    def is_past_expected_home(self) -> bool:
+        # True once a warm start moved further than the stored home allows, homing then continues as a full one
+        if self.expected_home is None or self.direct_motor.angle() <= self.expected_home + HOME_TOLERANCE:
+            return False
+
+        log.warning(self.name, "Home not found near the stored angle, falling back to full homing")
+        self.expected_home = None
+        return True
+
+    def finish_calibration(self):
+        # Zero the motor, the home reference ends up at home_angle
+        self.home_angle = self.home_raw - self.direct_motor.angle()
+        self.motor.reset_angle(0)
+        self.target_raw = None
+        self.left_running = False
+        self.is_calibrated = True
+        self.calibration_state = "done"
+
+    def has_found_home(self) -> bool:
+        # The calibration reached its reference (touch sensor or end-stop), the part only settles from here on
+        return self.calibration_state not in (None, "approach", "seek")
+
+    def start_debounce(self):
+        # Hold the motor and let it settle before the angle is reset
+        self.motor.hold()
+        self.calibration_stopwatch.reset()
+        self.calibration_state = "debounce"
+
+    def is_debounced(self) -> bool:
+        return self.calibration_stopwatch.time() >= DEBOUNCE_TIME
+
     def move_to_angle(self, angle, speed=100, wait=True):
         return self.move_motor_to_angle(angle, speed, wait)
 
+    def move_to_raw_angle(self, raw_angle, speed=100, wait=True):
+        return self.move_motor_to_raw_angle(raw_angle, speed, wait)
+
     def is_done(self):
         return self.motor.control.done()
@@ -1,47 +1,57 @@
 from pybricks.ev3devices import Motor
-from pybricks.tools import wait
 
-from parts.ArmPart import ArmPart
+from parts.ArmPart import ArmPart, APPROACH_SPEED
+from utils.log import log
+from utils.stall_detector import StallDetector
+
+# Calibration parameters
+SPEED = 400
+TENSION_ANGLE = -400
 
 
 class ElbowPart(ArmPart):
     def __init__(self, motor: Motor, ratio: float, length: float):
         super().__init__('Elbow', motor, ratio)
         self.length = length
-
-    def calibrate(self):
-        # Calibration parameters
-        SPEED = 400
-        ANGLE_THRESHOLD = 6
-        TARGET_TICKS = 25
-        TENSION_ANGLE = -400
-
-        tick_count = 0
-        last_angle = self.motor.angle()
-
-        while tick_count < TARGET_TICKS:
-            self.motor.run(SPEED)
-            wait(10)
-
-            current_angle = self.motor.angle()
-            angle_difference = abs(current_angle - last_angle)
-
-            if angle_difference < ANGLE_THRESHOLD:
-                tick_count += 1
+        self.holds_park = False  # Sags under gravity once the motor floats
+        self.stall_detector = StallDetector(motor, SPEED)
+
+    def start_calibration(self):
+        self.motor.run(SPEED)
+        self.stall_detector.start()
+        self.calibration_state = "seek"
+
+    def step_calibration(self) -> bool:
+        if self.calibration_state == "approach":
+            if self.is_done() or self.motor.control.stalled():
+                self.start_calibration()
+            return False
+
+        if self.calibration_state == "seek":
+            if self.stall_detector.update():
+                self.motor.hold()
+                self.mark_home()
+                log.info("Elbow", "End-stop found in {} ms", self.stall_detector.detection_time)
+
+                # Remove tension from the motor, the zero is TENSION_ANGLE away from the end-stop
+                self.motor.run_angle(APPROACH_SPEED, TENSION_ANGLE, wait=False)
+                self.calibration_state = "release"
             else:
-                tick_count = 0
-
-            last_angle = current_angle
-
-        self.motor.hold()
+                self.is_past_expected_home()
+            return False
 
-        # Remove tension from the motor
-        self.motor.run_angle(SPEED, TENSION_ANGLE)
+        if self.calibration_state == "release":
+            if self.is_done():
+                # Wait for the motor to debounce
+                self.start_debounce()
+            return False
 
-        # Wait for the motor to debounce
-        wait(250)
+        if self.calibration_state == "debounce":
+            if not self.is_debounced():
+                return False
 
-        # Reset angle to 0
-        self.motor.reset_angle(0)
+            # Reset angle to 0
+            self.finish_calibration()
+            log.info("Elbow", "Calibration complete")
 
-        print("[Elbow] Calibration complete")
+        return self.calibration_state == "done"
@@ -1,93 +1,117 @@
-import time
-
 from pybricks.ev3devices import Motor
-from pybricks.tools import wait
+from pybricks.tools import wait, StopWatch
 
 from parts.ArmPart import ArmPart
+from utils.log import log
+from utils.stall_detector import StallDetector
+
+# Calibration parameters
+CALIBRATION_SPEED = 400
+
+# Grab parameters
+GRAB_SPEED = 400
+GRAB_TIMEOUT = 750  # ms, the jaws stall long before this with or without a cube
+EMPTY_JAW_ANGLE = -10  # Jaws that closed further than this caught nothing (a cube stops them around -40)
+
+# Release parameters
+RELEASE_ANGLE = -97
+RELEASE_SPEED = 400
+RELEASE_TOLERANCE = 5  # degrees
+RELEASE_TIMEOUT = 3000  # ms
 
 
 class GripperPart(ArmPart):
     def __init__(self, motor: Motor):
         super().__init__("Gripper", motor)
         self.motor = motor
+        self.stall_detector = StallDetector(motor, CALIBRATION_SPEED)  # Also used by grab (same speed)
+        self.release_stopwatch = StopWatch()
+
+    def grab(self) -> bool:
+        """
+        Close the jaws until they stall, on a cube or fully closed. Returns True if a cube was caught, judged by how
+        far the jaws got.
+        """
+        stopwatch = StopWatch()
+        self.motor.run(GRAB_SPEED)
+        self.stall_detector.start()
+        while not self.stall_detector.update():
+            if stopwatch.time() > GRAB_TIMEOUT:
+                log.warning("Gripper", "Grab timed out after {} ms", GRAB_TIMEOUT)
+                break
+            wait(10)
 
-    def grab(self):
-        self.motor.run_time(400, 750)
+        # Keep squeezing the cube
         self.motor.hold()
-        print("[Gripper] grabbed")
-        return True
 
-    def release(self):
-
-        target_angle = -97
-        timeout_seconds = 3  # Set a reasonable timeout
-        start_time = time.time()
-        speed = 400
-
-        # Start the motor moving toward the target
-        direction = -speed if self.motor.angle() > target_angle else speed
-        self.motor.run(direction)
-
-        # Wait until the motor reaches the target or timeout occurs
-        while True:
-            current_angle = self.motor.angle()
-            angle_diff = abs(current_angle - target_angle)
+        angle = self.direct_motor.angle()
+        if angle > EMPTY_JAW_ANGLE:
+            log.warning("Gripper", "Grab missed, jaws closed at {}", angle)
+            return False
 
-            if angle_diff <= 5:  # 5 degrees tolerance
-                print("[Gripper] Target reached: {}".format(current_angle))
-                break
-
-            if time.time() - start_time > timeout_seconds:
-                print("[Gripper] Warning: Release timed out after {} seconds, diff: {}".format(timeout_seconds,
-                                                                                               angle_diff))
-                break
+        log.debug("Gripper", "grabbed at {} after {} ms", angle, stopwatch.time())
+        return True
 
+    def release(self):
+        self.start_release()
+        while not self.step_release():
             wait(10)  # Check every 10ms
+        return True
 
-        # Make sure to hold the motor regardless of how the loop exited
+    def start_release(self):
+        # Start the motor moving toward the target, step_release tells when it got there
+        self.release_stopwatch.reset()
+        self.motor.run_target(RELEASE_SPEED, RELEASE_ANGLE, wait=False)
+
+    def step_release(self) -> bool:
+        current_angle = self.direct_motor.angle()
+        angle_diff = abs(current_angle - RELEASE_ANGLE)
+
+        if angle_diff <= RELEASE_TOLERANCE or self.is_done():
+            log.debug("Gripper", "Target reached: {}", current_angle)
+        elif self.motor.control.stalled():
+            log.warning("Gripper", "Release blocked at {}", current_angle)
+        elif self.release_stopwatch.time() > RELEASE_TIMEOUT:
+            log.warning("Gripper", "Release timed out after {} ms, diff: {}", RELEASE_TIMEOUT, angle_diff)
+        else:
+            return False
+
+        # Make sure to hold the motor regardless of how the release ended
         self.motor.hold()
-        print("[Gripper] finished running target")
-        print("[Gripper] released")
+        log.debug("Gripper", "released")
         return True
 
     def open(self):
         return self.release()
 
-    def calibrate(self):
-        # Calibration parameters
-        SPEED = 400
-        ANGLE_THRESHOLD = 6  # Minimum angle change to detect stalling
-        TARGET_TICKS = 10  # Number of consecutive readings with minimal movement
-        TENSION_ANGLE = -2  # Small reverse to release tension
-
-        tick_count = 0
-        last_angle = self.motor.angle()
-
-        while tick_count < TARGET_TICKS:
-            self.motor.run(SPEED)  # Run in the grab direction
-            wait(10)
-
-            current_angle = self.motor.angle()
-            angle_difference = abs(current_angle - last_angle)
-
-            print("[Gripper] Current angle: {}, Difference: {}".format(current_angle, angle_difference))
-
-            if angle_difference < ANGLE_THRESHOLD:
-                tick_count += 1
-                print("[Gripper] Stall detected: {} of {}".format(tick_count, TARGET_TICKS))
+    def start_calibration(self):
+        self.motor.run(CALIBRATION_SPEED)  # Run in the grab direction
+        self.stall_detector.start()
+        self.calibration_state = "seek"
+
+    def step_calibration(self) -> bool:
+        if self.calibration_state == "approach":
+            if self.is_done() or self.motor.control.stalled():
+                self.start_calibration()
+            return False
+
+        if self.calibration_state == "seek":
+            if self.stall_detector.update():
+                self.mark_home()
+                log.info("Gripper", "Jaws closed in {} ms", self.stall_detector.detection_time)
+                # Wait for the motor to debounce
+                self.start_debounce()
             else:
-                tick_count = 0
+                self.is_past_expected_home()
+            return False
 
-            last_angle = current_angle
-
-        self.motor.hold()
+        if self.calibration_state == "debounce":
+            if not self.is_debounced():
+                return False
 
-        # Wait for the motor to debounce
-        wait(250)
+            # Reset angle to 0
+            self.finish_calibration()
+            self.motor.hold()
+            log.info("Gripper", "calibrated")
 
-        # Reset angle to 0
-        self.motor.reset_angle(0)
-        self.motor.hold()
-
-        print("[Gripper] calibrated")
-        return True
+        return self.calibration_state == "done"
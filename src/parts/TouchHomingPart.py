@@ -0,0 +1,81 @@
+from pybricks.ev3devices import Motor, TouchSensor
+
+from parts.ArmPart import ArmPart, APPROACH_SPEED
+from utils.log import log
+from utils.sensor_sampler import unwrap
+
+# Speed (motor deg/s) of the final touch, the zero is only as repeatable as this is slow
+CALIBRATION_SPEED = 100
+
+# Distance (motor degrees) moved away from the touch sensor after touching it at approach speed
+BACKOFF_ANGLE = 30
+
+
+class TouchHomingPart(ArmPart):
+    """
+    Joint that is zeroed on a touch sensor, pressed by running the motor forward.
+
+    Homing is done in two speeds. The joint approaches at APPROACH_SPEED, backs off on the first contact and touches
+    the sensor again at CALIBRATION_SPEED, where the zero is taken. When the angle is already known (the part was
+    calibrated before, or a warm start restored it) the fast approach stops just short of the sensor instead, so the
+    sensor is only ever touched slowly.
+    """
+
+    def __init__(self, name, motor: Motor, touch_sensor: TouchSensor, ratio):
+        super().__init__(name, motor, ratio)
+        self.touch_sensor = touch_sensor
+        self.direct_touch_sensor = unwrap(touch_sensor)  # The slow touch takes the zero, it can't be late
+
+    def start_calibration(self):
+        if self.is_calibrated:
+            self.start_approach(self.home_angle)
+        else:
+            self.motor.run(APPROACH_SPEED)
+            self.calibration_state = "fast"
+
+    def start_backoff(self):
+        self.motor.run_angle(APPROACH_SPEED, -BACKOFF_ANGLE, wait=False)
+        self.calibration_state = "backoff"
+
+    def start_seek(self):
+        self.motor.run(CALIBRATION_SPEED)
+        self.calibration_state = "seek"
+
+    def step_calibration(self) -> bool:
+        if self.calibration_state in ("fast", "approach"):
+            if self.touch_sensor.pressed():
+                # Touched at speed, back off and touch again slowly
+                self.start_backoff()
+            elif self.calibration_state == "approach" and self.is_done():
+                self.start_seek()
+            return False
+
+        if self.calibration_state == "backoff":
+            if self.is_done():
+                if self.touch_sensor.pressed():
+                    self.start_backoff()
+                else:
+                    self.start_seek()
+            return False
+
+        if self.calibration_state == "seek":
+            if self.direct_touch_sensor.pressed():
+                self.mark_home()
+                # Wait for the motor to debounce
+                self.start_debounce()
+            elif self.is_past_expected_home():
+                # The stored angle was wrong, so is the slow approach distance
+                self.motor.run(APPROACH_SPEED)
+                self.calibration_state = "fast"
+            return False
+
+        if self.calibration_state == "debounce":
+            if not self.is_debounced():
+                return False
+            self.finish_calibration()
+            log.info(self.name, "Calibration complete")
+
+        return self.calibration_state == "done"
+
+    def has_found_home(self) -> bool:
+        return self.calibration_state not in (None, "fast", "backoff", "approach", "seek")
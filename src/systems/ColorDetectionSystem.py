@@ -1,9 +1,30 @@
 from pybricks.ev3devices import ColorSensor
 
+from utils.color_lut import ColorLUT
+from utils.color_model import ColorModel
+from utils.log import log
+
+# Written by the color calibration mode, loaded at startup if present
+COLOR_MODEL_PATH = "color_model.txt"
+
+# Confidence is the share of the votes a color got, while sampling (see start_sampling) and in bursts (see
+# classify_burst). A color is only reported once it has MIN_VOTES votes and at least MIN_CONFIDENCE of them
+MIN_VOTES = 3
+MIN_CONFIDENCE = 0.75
+
+# Readings whose best class scores less than this much better than the second best (a log-likelihood ratio, see
+# utils.color_model) are too ambiguous to vote
+MIN_SAMPLE_MARGIN = 2
+
+# Bursts (see classify_burst): readings per burst, readings further than OUTLIER_DISTANCE (sum over the channels) from
+# the median are dropped, and how often a burst is read again while the votes aren't confident
+BURST_SIZE = 5
+OUTLIER_DISTANCE = 6
+MAX_REREADS = 2
+
 
 class ColorDetectionSystem:
-    # The colors are really messed up coming from the sensor. It is basically guessing between yellow and red
-    # Use the color calibration mode to adjust the values
+    # Default centroids, used for every class the color calibration mode hasn't fitted yet
     COLORS = {
         "yellow": (14, 9, 0),
         "red": (18, 0, 0),
@@ -11,20 +32,176 @@ class ColorDetectionSystem:
         "green": (2, 8, 3),
     }
 
-    def __init__(self, color_sensor: ColorSensor):
-        print("[ColorDetectionSystem] Initializing")
+    # Reading without a cube in front of the sensor, samples closest to it are ignored
+    BACKGROUND = (1, 1, 2)
+    BACKGROUND_NAME = "background"
+
+    def __init__(self, color_sensor: ColorSensor, model: ColorModel = None):
+        log.info("ColorDetectionSystem", "Initializing")
         self.color_sensor = color_sensor
+        self.lut = ColorLUT(self.classify_rgb)
+        self.set_model(model)
+        self.votes = {}  # color -> number of samples classified as it
+        self.sample_count = 0  # Samples that saw a cube
 
     def detect_color(self) -> str:
-        color = self.color_sensor.rgb()
-        return self.get_closest_color(color)
+        color, confidence = self.classify_burst()
+        if color is None:
+            # Only background seen, report the closest cube color like a single reading would
+            return self.get_closest_color(self.color_sensor.rgb())
+        return color
+
+    def get_default_model(self) -> ColorModel:
+        centroids = dict(self.COLORS)
+        centroids[self.BACKGROUND_NAME] = self.BACKGROUND
+        return ColorModel.from_centroids(centroids)
+
+    def set_model(self, model: ColorModel = None):
+        """Classify with a fitted model, classes it doesn't have keep their default centroid."""
+        merged = self.get_default_model()
+        if model is not None:
+            for name in model.names:
+                if name in merged.means:
+                    merged.set_class(name, model.means[name], model.inverse_covariances[name],
+                                     model.sample_counts[name])
+                else:
+                    log.warning("ColorDetectionSystem", "Ignoring unknown color {} in the model", name)
+        self.model = merged
+
+        # Class indices of the lookup table, the background comes last
+        self.classes = list(self.COLORS)
+        self.class_names = self.classes + [self.BACKGROUND_NAME]
+        if self.lut.filled:
+            self.lut.clear()
+
+    def load_model(self, path: str = COLOR_MODEL_PATH) -> bool:
+        model = ColorModel.load(path)
+        if model is None:
+            return False
+        self.set_model(model)
+        return True
 
     def get_closest_color(self, color: tuple) -> str:
         closest_color = None
-        closest_distance = float("inf")
-        for known_color, known_rgb in self.COLORS.items():
-            distance = sum((color[i] - known_rgb[i]) ** 2 for i in range(3))
-            if distance < closest_distance:
+        closest_score = float("inf")
+        for known_color in self.classes:
+            score = self.model.score(known_color, color)
+            if score < closest_score:
                 closest_color = known_color
-                closest_distance = distance
+                closest_score = score
         return closest_color
+
+    def classify_rgb(self, rgb):
+        """Best scoring class of the model, returns (class index, margin), used to fill the lookup table."""
+        best_index = None
+        best_score = float("inf")
+        second_score = float("inf")
+        for index, name in enumerate(self.class_names):
+            score = self.model.score(name, rgb)
+            if score < best_score:
+                second_score = best_score
+                best_index = index
+                best_score = score
+            elif score < second_score:
+                second_score = score
+        return best_index, second_score - best_score
+
+    def classify(self, rgb):
+        """
+        Classify one reading through the lookup table.
+
+        Returns:
+            tuple: (color, margin), color is None if the reading is background.
+        """
+        index, margin = self.lut.lookup(rgb)
+        if index >= len(self.classes):
+            return None, margin
+        return self.classes[index], margin
+
+    def read_burst(self, count: int = BURST_SIZE) -> list:
+        """count readings taken from now on, from the sampler's buffer if the sensor is sampled (utils.sensor_sampler)"""
+        read_new = getattr(self.color_sensor, "read_new", None)
+        if read_new is not None:
+            return read_new(count)
+        return [self.color_sensor.rgb() for _ in range(count)]
+
+    @staticmethod
+    def reject_outliers(samples: list) -> list:
+        """Drop readings far from the per-channel median (a reflection, the cube edge), keeps at least the median."""
+        middle = len(samples) // 2
+        median = [sorted(sample[i] for sample in samples)[middle] for i in range(3)]
+        kept = [sample for sample in samples
+                if sum(abs(sample[i] - median[i]) for i in range(3)) <= OUTLIER_DISTANCE]
+        return kept or [tuple(median)]
+
+    def classify_burst(self):
+        """
+        Read a burst, drop the outliers and let every remaining reading vote like a sample (background votes too).
+        Bursts are read again (up to MAX_REREADS times) while the votes aren't confident.
+
+        Returns:
+            tuple: (color, confidence) of the color with the most votes over all bursts, color is None for background
+            and if the votes still weren't confident after the rereads. (None, 0) if no reading was clear enough to
+            vote.
+        """
+        votes = {}
+        total = 0
+        best_color = None
+        best_votes = 0
+        for attempt in range(MAX_REREADS + 1):
+            for reading in self.reject_outliers(self.read_burst()):
+                color, margin = self.classify(reading)
+                if margin < MIN_SAMPLE_MARGIN:
+                    continue
+                votes[color] = votes.get(color, 0) + 1
+                total += 1
+                if votes[color] > best_votes:
+                    best_color = color
+                    best_votes = votes[color]
+
+            if best_votes >= MIN_VOTES and best_votes / total >= MIN_CONFIDENCE:
+                break
+            log.debug("ColorDetectionSystem", "Votes not confident: {}, reading again", votes)
+
+        if total == 0:
+            return None, 0
+        if best_votes < MIN_VOTES or best_votes / total < MIN_CONFIDENCE:
+            return None, best_votes / total
+        return best_color, best_votes / total
+
+    # Sampling while the cube moves over the sensor
+
+    def start_sampling(self):
+        self.votes = {}
+        self.sample_count = 0
+
+    def sample(self):
+        """Take one reading and add it as a vote, returns the color it was classified as (None for background)."""
+        color, margin = self.classify(self.read_burst(1)[0])
+        if color is None or margin < MIN_SAMPLE_MARGIN:
+            return None
+
+        self.votes[color] = self.votes.get(color, 0) + 1
+        self.sample_count += 1
+        return color
+
+    def get_result(self):
+        """
+        Returns:
+            tuple: (color, confidence) of the color with the most votes, confidence being its share of the samples
+            that saw a cube. (None, 0) if no sample saw a cube.
+        """
+        best_color = None
+        best_votes = 0
+        for color, votes in self.votes.items():
+            if votes > best_votes:
+                best_color = color
+                best_votes = votes
+
+        if best_color is None:
+            return None, 0
+        return best_color, best_votes / self.sample_count
+
+    def is_confident(self) -> bool:
+        color, confidence = self.get_result()
+        return color is not None and self.votes[color] >= MIN_VOTES and confidence >= MIN_CONFIDENCE
@@ -0,0 +1,65 @@
+from pybricks.tools import wait, StopWatch
+
+from utils.log import log
+
+# Homing is aborted (and the motors held) if it takes longer than this (ms)
+HOMING_TIMEOUT = 60000
+
+
+class HomingSystem:
+    """
+    Calibrates several parts at the same time. Every part's calibration state machine (ArmPart.start_calibration and
+    step_calibration) is advanced from a single 10 ms loop. A part can be made to wait until others have found their
+    home position, for example when it can only sweep safely once another joint is out of the way.
+    """
+
+    def __init__(self, timeout: int = HOMING_TIMEOUT):
+        self.timeout = timeout
+        self.parts = []
+        self.dependencies = {}  # part name -> parts that have to find their home position first
+
+    def add(self, part, after=()):
+        self.parts.append(part)
+        self.dependencies[part.name] = list(after)
+
+    def run(self, calibration_store=None) -> bool:
+        """
+        Calibrate every part. Parts with usable angles in the calibration store (utils.calibration_store) get a warm
+        start. Returns False if homing timed out.
+        """
+        stopwatch = StopWatch()
+        pending = list(self.parts)
+        active = []
+
+        while pending or active:
+            # Start every part whose dependencies have found their home position
+            for part in list(pending):
+                if all(dependency.has_found_home() for dependency in self.dependencies[part.name]):
+                    stored = calibration_store.get(part.name) if calibration_store is not None else None
+                    if stored is not None:
+                        log.debug("Homing System", "Warm starting {}", part.name)
+                        part.start_warm_calibration(*stored)
+                    else:
+                        log.debug("Homing System", "Starting {}", part.name)
+                        part.start_calibration()
+                    pending.remove(part)
+                    active.append(part)
+
+            for part in list(active):
+                if part.step_calibration():
+                    log.debug("Homing System", "{} calibrated after {} ms", part.name, stopwatch.time())
+                    active.remove(part)
+
+            if not (pending or active):
+                break
+
+            if stopwatch.time() > self.timeout:
+                for part in active:
+                    part.motor.hold()
+                log.error("Homing System", "Timed out, still calibrating: {}", [part.name for part in active])
+                return False
+
+            wait(10)
+
+        log.info("Homing System", "All parts calibrated in {} ms", stopwatch.time())
+        return True
@@ -1,68 +1,402 @@
 # Wait for both movements to complete
-from pybricks.tools import wait
+from pybricks.tools import wait, StopWatch
 
 from constants import OFFSETS
+from model.JointLimits import JointLimits
 from model.Location import Location
 from parts.BasePart import BasePart
 from parts.ElbowPart import ElbowPart
 from parts.ShoulderPart import ShoulderPart
-from utils.kinematics import calculate_angles
+from utils.kinematics import calculate_angles, get_coordinates
+from utils.log import log
+
+# Slowest speed (motor deg/s) a joint is given in a coordinated move, so short moves still finish
+MIN_COORDINATED_SPEED = 20
+
+# Settle detection (see wait_until_settled): speed (motor deg/s) and position error (motor degrees) below which a joint
+# counts as settled, consecutive settled readings needed, and the longest wait (ms)
+SETTLE_SPEED = 10
+SETTLE_ERROR = 3
+SETTLE_SAMPLES = 2
+SETTLE_TIMEOUT = 1000
 
 
 class MoveSystem:
     def __init__(self, base_part: BasePart, shoulder_part: ShoulderPart, elbow_part: ElbowPart,
-                 shoulder_offset: float = OFFSETS["shoulder"], elbow_offset: float = OFFSETS["elbow"]):
+                 shoulder_offset: float = OFFSETS["shoulder"], elbow_offset: float = OFFSETS["elbow"],
+                 coordinated: bool = False, ik_table=None, joint_limits: JointLimits = None, reachability=None):
         self.base_part = base_part
         self.shoulder_part = shoulder_part
         self.elbow_part = elbow_part
         self.shoulder_offset = shoulder_offset  # Offset for shoulder calibration
         self.elbow_offset = elbow_offset  # Offset for elbow calibration
+        self.coordinated = coordinated  # Move all joints together so they arrive at the same moment
+
+        # Precomputed IK table (utils.ik_table.IKTable), only used when it was built for this arm. Every (x, y) solve
+        # goes through it (see get_joint_angles), points it doesn't cover are solved analytically
+        self.ik_table = None
+        if ik_table is not None:
+            if ik_table.matches(shoulder_part.length, elbow_part.length, shoulder_offset, elbow_offset,
+                                shoulder_part.ratio, elbow_part.ratio):
+                self.ik_table = ik_table
+            else:
+                log.warning("Move System", "IK table was built for a different arm, using the analytic solver")
+
+        # Everything the joint solution of a location depends on, Location memoizes its solution per geometry
+        self.geometry = (shoulder_part.length, elbow_part.length, shoulder_offset, elbow_offset,
+                         shoulder_part.ratio, elbow_part.ratio, base_part.ratio)
+        if self.ik_table is not None:
+            self.geometry += ("ik_table", self.ik_table.step, self.ik_table.max_error)
+
+        # Targets outside the joint limits are rejected before any motor moves
+        self.joint_limits = joint_limits
+
+        # Workspace reachability index (utils.reachability.ReachabilityIndex), only used when it was built for this arm.
+        # It bounds the analytic solution, a margin also has to cover the IK table's error (sampled, so doubled)
+        self.reachability = None
+        self.reachability_tolerance = 0
+        if reachability is not None:
+            if reachability.matches(shoulder_part.length, elbow_part.length, shoulder_offset, elbow_offset):
+                self.reachability = reachability
+                if self.ik_table is not None:
+                    self.reachability_tolerance = 2 * self.ik_table.max_error
+            else:
+                log.warning("Move System", "Reachability index was built for a different arm, not using it")
+
+        # Optional utils.profiling.MotionProfiler, see set_profiler
+        self.profiler = None
+
+        # Optional callback, called with (start, target, duration) of every coordinated move that finish_move waited
+        # for: raw angles when it started, its raw target and the ms from start to done
+        self.move_listener = None
+        self.move_start = None
+        self.move_stopwatch = StopWatch()
+
+        # A coordinated move was started and neither finished nor left yet, see leave_move
+        self.move_pending = False
+
+    def set_profiler(self, profiler):
+        """Attach a MotionProfiler to the move system and its parts (None detaches it)."""
+        self.profiler = profiler
+        for part in (self.base_part, self.shoulder_part, self.elbow_part):
+            part.profiler = profiler
+
+    def get_joint_angles(self, x: float, y: float):
+        """
+        Joint angles (shoulder, elbow) MoveSystem.move would use for (x, y), or None if unreachable. Interpolated from
+        the IK table where it covers the point.
+        """
+        if self.ik_table is not None:
+            raw_angles = self.ik_table.lookup(x, y)
+            if raw_angles is not None:
+                return raw_angles[0] / self.shoulder_part.ratio, raw_angles[1] / self.elbow_part.ratio
+
+        try:
+            shoulder_angle, elbow_angle = calculate_angles(x, y, self.shoulder_part.length, self.elbow_part.length)
+        except ValueError:
+            return None
+        return -(shoulder_angle - self.shoulder_offset), elbow_angle - self.elbow_offset
+
+    def get_location_angles(self, location: Location):
+        """Joint angles (shoulder, elbow) for a location, solved once and memoized by the location."""
+        return location.get_joint_angles(self.geometry, self.get_joint_angles)
+
+    def get_raw_angles(self, location: Location):
+        """Raw motor targets (shoulder, elbow, base) for a location, or None if it is unreachable."""
+        angles = self.get_location_angles(location)
+        if angles is None:
+            return None
+
+        return (angles[0] * self.shoulder_part.ratio, angles[1] * self.elbow_part.ratio,
+                location.base_angle * self.base_part.ratio)
+
+    def get_geometry(self) -> tuple:
+        """Everything get_raw_angles depends on besides the location, used to key cached motion programs."""
+        return self.geometry
+
+    def check_joint_limits(self, shoulder_angle: float, elbow_angle: float, base_angle: float) -> bool:
+        if self.joint_limits is None:
+            return True
+
+        margins = self.joint_limits.margins(shoulder_angle, elbow_angle, base_angle)
+        if min(margins) < 0:
+            log.error("Move System", "Target outside joint limits: shoulder={}°, elbow={}°, base={}°, margins={}",
+                      shoulder_angle, elbow_angle, base_angle, margins)
+            return False
+        return True
+
+    def check_raw_limits(self, shoulder_raw: float, elbow_raw: float, base_raw: float) -> bool:
+        return self.check_joint_limits(shoulder_raw / self.shoulder_part.ratio, elbow_raw / self.elbow_part.ratio,
+                                       base_raw / self.base_part.ratio)
+
+    def can_reach(self, x: float, y: float, base_angle: float) -> bool:
+        """Check if (x, y, base_angle) is reachable within the joint limits, without moving."""
+        if self.joint_limits is not None and self.joint_limits.margin("base", base_angle) < 0:
+            return False
+
+        # The index gives lower bounds, so a positive answer is final, anything else gets an exact check
+        if self.reachability is not None and self.joint_limits is not None:
+            margins = self.reachability.margins(x, y, self.joint_limits)
+            if margins is not None and min(margins) >= self.reachability_tolerance:
+                return True
+
+        angles = self.get_joint_angles(x, y)
+        if angles is None:
+            return False
+        return self.joint_limits is None or self.joint_limits.is_within(angles[0], angles[1], base_angle)
+
+    def can_reach_location(self, location: Location) -> bool:
+        if location.is_cartesian():
+            return self.can_reach(*location.get_cartesian())
+
+        angles = self.get_location_angles(location)
+        if angles is None:
+            return False
+        return self.joint_limits is None or self.joint_limits.is_within(angles[0], angles[1], location.base_angle)
 
     def move(self, x: float, y: float, base_angle: float, speed: int =100, move_sequentially: bool = False) -> bool:
+        if self.profiler is None:
+            return self.move_to_coordinates(x, y, base_angle, speed, move_sequentially)
+
+        start = self.profiler.time()
+        result = self.move_to_coordinates(x, y, base_angle, speed, move_sequentially)
+        self.profiler.record_call("move", self.profiler.time() - start)
+        return result
+
+    def move_to_coordinates(self, x: float, y: float, base_angle: float, speed: int = 100,
+                            move_sequentially: bool = False) -> bool:
+        # Fast path: interpolate the raw motor angles from the IK table
+        if self.ik_table is not None:
+            raw_angles = self.ik_table.lookup(x, y)
+            if raw_angles is not None:
+                return self.move_to_raw_angle(raw_angles[0], raw_angles[1], base_angle * self.base_part.ratio,
+                                              speed, move_sequentially)
+
         # Calculate the angles
         try:
             shoulder_angle, elbow_angle = calculate_angles(x, y, self.shoulder_part.length, self.elbow_part.length)
         except ValueError as e:
-            print("[Move System] Error -", str(e))
+            log.error("Move System", "{}", e)
             return False  # Target is unreachable
 
-        print("[Move System] Calculated angles: shoulder=", shoulder_angle, "°, elbow=", elbow_angle, "°")
+        log.debug("Move System", "Calculated angles: shoulder={}°, elbow={}°", shoulder_angle, elbow_angle)
 
         shoulder_angle -= self.shoulder_offset
-            
+
         elbow_angle -= self.elbow_offset
         shoulder_angle = -shoulder_angle
 
-        print("[Move System] Applying offsets: shoulder=", shoulder_angle, "°, elbow=", elbow_angle, "°")
-        print("[Move System] Moving to x =", x, ", y =", y, ", base_angle =", base_angle)
+        log.debug("Move System", "Applying offsets: shoulder={}°, elbow={}°", shoulder_angle, elbow_angle)
+        log.debug("Move System", "Moving to x={}, y={}, base_angle={}", x, y, base_angle)
 
-        return self.move_to_angle(shoulder_angle, elbow_angle, base_angle, speed, move_sequentially)
+        # Straight to the raw angles, move already reports this motion to the profiler
+        return self.move_to_raw_angle(shoulder_angle * self.shoulder_part.ratio, elbow_angle * self.elbow_part.ratio,
+                                      base_angle * self.base_part.ratio, speed, move_sequentially)
 
     def move_to_angle(self, shoulder_angle: float, elbow_angle: float, base_angle: float, speed: int = 100, move_sequentially: bool = False) -> bool:
         # Offsets are not considered here
 
-        print("[Move System] Moving to angles: shoulder=", shoulder_angle, "°, elbow=", elbow_angle, "°, base=", base_angle)
+        log.debug("Move System", "Moving to angles: shoulder={}°, elbow={}°, base={}°", shoulder_angle, elbow_angle, base_angle)
+
+        if self.profiler is None:
+            return self.move_to_raw_angle(shoulder_angle * self.shoulder_part.ratio,
+                                          elbow_angle * self.elbow_part.ratio, base_angle * self.base_part.ratio,
+                                          speed, move_sequentially)
+
+        start = self.profiler.time()
+        result = self.move_to_raw_angle(shoulder_angle * self.shoulder_part.ratio, elbow_angle * self.elbow_part.ratio,
+                                        base_angle * self.base_part.ratio, speed, move_sequentially)
+        self.profiler.record_call("move_to_angle", self.profiler.time() - start)
+        return result
+
+    def move_to_raw_angle(self, shoulder_raw: float, elbow_raw: float, base_raw: float, speed: int = 100,
+                          move_sequentially: bool = False) -> bool:
+        # Raw angles are motor degrees, gear ratios and offsets are already applied
+
+        if not self.check_raw_limits(shoulder_raw, elbow_raw, base_raw):
+            return False
+
+        return self.run_to_raw_angle(shoulder_raw, elbow_raw, base_raw, speed, move_sequentially)
+
+    def move_to_target(self, target, speed: int = 100, move_sequentially: bool = False) -> bool:
+        """
+        Move to a raw target (shoulder_raw, elbow_raw, base_raw) of a compiled utils.motion_program.MotionProgram.
+        Targets were checked against the joint limits when the program was compiled.
+        """
+        if self.profiler is None:
+            return self.run_to_raw_angle(target[0], target[1], target[2], speed, move_sequentially)
+
+        start = self.profiler.time()
+        result = self.run_to_raw_angle(target[0], target[1], target[2], speed, move_sequentially)
+        self.profiler.record_call("move_to_target", self.profiler.time() - start)
+        return result
+
+    def run_to_raw_angle(self, shoulder_raw: float, elbow_raw: float, base_raw: float, speed: int = 100,
+                         move_sequentially: bool = False) -> bool:
+        # Issues the motor commands without any checks
+        if self.coordinated and not move_sequentially:
+            return self.move_to_raw_angle_coordinated(shoulder_raw, elbow_raw, base_raw, speed)
 
         # Move the shoulder and elbow (non-blocking)
-        self.shoulder_part.move_to_angle(shoulder_angle, speed=speed, wait=move_sequentially)
-        self.elbow_part.move_to_angle(elbow_angle, speed=speed, wait=move_sequentially)
+        self.shoulder_part.move_to_raw_angle(shoulder_raw, speed=speed, wait=move_sequentially)
+        self.elbow_part.move_to_raw_angle(elbow_raw, speed=speed, wait=move_sequentially)
 
-        # Wait for both movements to complete
-        while not (self.shoulder_part.is_done() and self.elbow_part.is_done()):
-            wait(10)
+        # Wait for both movements to complete (blocking moves were already reported to the profiler)
+        if move_sequentially:
+            self.wait_until_done((self.shoulder_part, self.elbow_part))
+        else:
+            self.wait_until_done((self.shoulder_part, self.elbow_part), (shoulder_raw, elbow_raw))
 
         # Hold motors in position
         self.shoulder_part.motor.hold()
         self.elbow_part.motor.hold()
 
         # Move the base first
-        self.base_part.move_to_angle(base_angle)
+        self.base_part.move_to_raw_angle(base_raw)
+
+        log.debug("Move System", "Movement to angles completed")
+        return True
+
+    def move_to_raw_angle_coordinated(self, shoulder_raw: float, elbow_raw: float, base_raw: float,
+                                      speed: int = 100) -> bool:
+        """
+        Move all three joints at once. The joint with the longest travel (in motor degrees) runs at the given speed,
+        the others are slowed down proportionally so every joint arrives at the same moment.
+        """
+        self.start_raw_angle_coordinated(shoulder_raw, elbow_raw, base_raw, speed)
+        return self.finish_move()
+
+    def start_raw_angle_coordinated(self, shoulder_raw: float, elbow_raw: float, base_raw: float, speed: int = 100):
+        # Start a coordinated move without waiting for it, see finish_move. A move still running is redirected
+        parts = (self.shoulder_part, self.elbow_part, self.base_part)
+        raw_angles = (shoulder_raw, elbow_raw, base_raw)
+        if self.move_pending:
+            self.leave_move()
+        self.move_pending = True
+
+        if self.move_listener is not None:
+            self.move_start = tuple(part.get_raw_angle() for part in parts)
+            self.move_stopwatch.reset()
+
+        travels = [part.get_raw_travel(raw_angle) for part, raw_angle in zip(parts, raw_angles)]
+        longest_travel = max(travels)
+
+        for part, raw_angle, travel in zip(parts, raw_angles, travels):
+            part_speed = speed
+            if longest_travel > 0:
+                part_speed = max(MIN_COORDINATED_SPEED, speed * travel / longest_travel)
+            part.move_to_raw_angle(raw_angle, speed=part_speed, wait=False)
 
-        print("[Move System] Movement to angles completed")
+    def start_move_to_target(self, target, speed: int = 100):
+        """
+        Start a coordinated move to a compiled target (see move_to_target) and return right away, so the caller can
+        do something else while the arm moves. Use is_move_done to poll it and finish_move to wait for it, or leave_move
+        to let the next move take over. Starting another move before that simply redirects the joints.
+        """
+        self.start_raw_angle_coordinated(target[0], target[1], target[2], speed)
+
+    def is_move_done(self) -> bool:
+        return self.shoulder_part.is_done() and self.elbow_part.is_done() and self.base_part.is_done()
+
+    def is_near_target(self, target, tolerance: float) -> bool:
+        """Every joint is within tolerance motor degrees of the compiled target, the move may still be running."""
+        return (self.shoulder_part.get_raw_travel(target[0]) <= tolerance
+                and self.elbow_part.get_raw_travel(target[1]) <= tolerance
+                and self.base_part.get_raw_travel(target[2]) <= tolerance)
+
+    def get_coordinates(self) -> tuple:
+        """Current (x, y) of the gripper, from the shoulder and elbow motor angles (read directly, never sampled)."""
+        shoulder_angle = self.shoulder_part.direct_motor.angle() / self.shoulder_part.ratio
+        elbow_angle = self.elbow_part.direct_motor.angle() / self.elbow_part.ratio
+        return get_coordinates(self.shoulder_offset - shoulder_angle, self.shoulder_part.length,
+                               elbow_angle + self.elbow_offset, self.elbow_part.length)
+
+    def finish_move(self) -> bool:
+        """Wait for the started move to complete and hold the joints in position."""
+        parts = (self.shoulder_part, self.elbow_part, self.base_part)
+
+        # Wait for all movements to complete
+        self.wait_until_done(parts, [part.target_raw for part in parts])
+
+        # Hold motors in position
+        for part in parts:
+            part.motor.hold()
+
+        if self.move_listener is not None and self.move_start is not None:
+            self.move_listener(self.move_start, tuple(part.target_raw for part in parts), self.move_stopwatch.time())
+        self.move_start = None
+        self.move_pending = False
+
+        log.debug("Move System", "Coordinated movement to angles completed")
         return True
 
+    def leave_move(self):
+        """
+        Leave the started move running without waiting for it, because the next move takes over from here (it only
+        had to get near its target, or it is redirected). Every joint reports how far from its target it was left.
+        """
+        for part in (self.shoulder_part, self.elbow_part, self.base_part):
+            part.leave_move()
+        self.move_pending = False
+
+    def wait_until_done(self, parts, raw_angles=None):
+        """
+        Poll the parts every 10 ms until all of them are done. With a profiler attached and the commanded raw angles
+        given, every part reports its move and the time it spent in this loop once it is done.
+        """
+        if self.profiler is None or raw_angles is None:
+            while not all(part.is_done() for part in parts):
+                wait(10)
+            return
+
+        start = self.profiler.time()
+        pending = list(zip(parts, raw_angles))
+        while pending:
+            moving = []
+            for part, raw_angle in pending:
+                if part.is_done():
+                    part.record_move(raw_angle)
+                    self.profiler.record_poll(part.name, self.profiler.time() - start)
+                else:
+                    moving.append((part, raw_angle))
+            pending = moving
+            if pending:
+                wait(10)
+
+    def wait_until_settled(self, parts=None, timeout: int = SETTLE_TIMEOUT) -> bool:
+        """
+        Wait until every part (the three joints by default) is settled: its speed and its error to the last commanded
+        target are below SETTLE_SPEED and SETTLE_ERROR for SETTLE_SAMPLES readings in a row. Parts without a known
+        target only have to stop, joints whose move was left running (see leave_move) don't wait for it. Returns False
+        if that didn't happen within the timeout (ms).
+        """
+        if parts is None:
+            parts = (self.shoulder_part, self.elbow_part, self.base_part)
+
+        stopwatch = StopWatch()
+        samples = 0
+        while True:
+            if all(part.is_settled(SETTLE_SPEED, SETTLE_ERROR) for part in parts):
+                samples += 1
+                if samples >= SETTLE_SAMPLES:
+                    log.debug("Move System", "Settled after {} ms", stopwatch.time())
+                    return True
+            else:
+                samples = 0
+
+            if stopwatch.time() > timeout:
+                log.warning("Move System", "Not settled after {} ms", timeout)
+                return False
+            wait(10)
+
     def move_to_location(self, location: Location, speed: int = 100, move_sequentially: bool = False):
         if location.is_cartesian():
-            return self.move(location.x, location.y, location.base_angle, speed=speed, move_sequentially=move_sequentially)
+            # The memoized solution replaces solving (x, y) again in move
+            angles = self.get_location_angles(location)
+            if angles is None:
+                log.error("Move System", "Unreachable location: {}", location)
+                return False
+            return self.move_to_angle(angles[0], angles[1], location.base_angle, speed=speed,
+                                      move_sequentially=move_sequentially)
         else:
             return self.move_to_angle(*location.get_angles(), move_sequentially=move_sequentially)
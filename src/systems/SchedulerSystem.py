@@ -0,0 +1,135 @@
+from pybricks.tools import wait, StopWatch
+
+from utils.log import log
+
+# A schedule is aborted if it takes longer than this (ms)
+SCHEDULE_TIMEOUT = 30000
+
+
+class Operation:
+    """
+    A non-blocking action of a part: start() issues the motor commands, step() is called every 10 ms and returns True
+    once the action is complete. The callables are usually a part's start_/step_ pair (GripperPart.start_release).
+    """
+
+    def __init__(self, name: str, start=None, step=None):
+        self.name = name
+        self.start_callback = start
+        self.step_callback = step
+        self.state = None  # None (pending), "running" or "done"
+
+    def start(self):
+        if self.start_callback is not None:
+            self.start_callback()
+
+    def step(self) -> bool:
+        if self.step_callback is None:
+            return True
+        return self.step_callback()
+
+    def is_done(self) -> bool:
+        return self.state == "done"
+
+
+class MoveOperation(Operation):
+    """
+    Coordinated move to a compiled target (see MoveSystem.start_move_to_target). With a tolerance the operation is
+    complete as soon as every joint is that close to the target (motor degrees) and the joints aren't held, so the
+    next move takes over while this one is still running. Used for waypoints that only have to be passed near. A
+    clearance (arm units) also completes it once the gripper is that much higher than where the move started.
+    """
+
+    def __init__(self, name: str, move_system, target, speed: int = 100, tolerance: float = 0, clearance: float = 0):
+        super().__init__(name)
+        self.move_system = move_system
+        self.target = target
+        self.speed = speed
+        self.tolerance = tolerance
+        self.clearance = clearance
+        self.clear_height = None  # Gripper height that completes the operation, set when it starts
+
+    def start(self):
+        if self.clearance > 0:
+            self.clear_height = self.move_system.get_coordinates()[1] + self.clearance
+        self.move_system.start_move_to_target(self.target, self.speed)
+
+    def is_clear(self) -> bool:
+        return self.clear_height is not None and self.move_system.get_coordinates()[1] >= self.clear_height
+
+    def step(self) -> bool:
+        if self.tolerance > 0:
+            if not (self.is_clear() or self.move_system.is_near_target(self.target, self.tolerance)):
+                return False
+            self.move_system.leave_move()
+            return True
+        if not self.move_system.is_move_done():
+            return False
+        self.move_system.finish_move()
+        return True
+
+
+class SchedulerSystem:
+    """
+    Runs operations of different parts at the same time, like HomingSystem does for calibration. An operation starts
+    once every operation it comes after is complete, all of them advance from a single 10 ms loop.
+
+    Usage:
+        scheduler = SchedulerSystem()
+        travel = scheduler.add(MoveOperation("travel", move_system, route.get("pre_pickup@main"), tolerance=20))
+        scheduler.add(Operation("open", gripper_part.start_release, gripper_part.step_release))
+        scheduler.add(MoveOperation("descend", move_system, route.get("pickup/0")), after=(travel,))
+        scheduler.run()
+    """
+
+    def __init__(self, timeout: int = SCHEDULE_TIMEOUT):
+        self.timeout = timeout
+        self.operations = []
+        self.dependencies = {}  # operation name -> operations that have to be complete first
+
+    def add(self, operation: Operation, after=()) -> Operation:
+        if operation.name in self.dependencies:
+            raise ValueError("Operation scheduled twice: " + operation.name)
+        self.operations.append(operation)
+        self.dependencies[operation.name] = list(after)
+        return operation
+
+    def run(self) -> bool:
+        """Run every operation, returns False if the schedule timed out."""
+        stopwatch = StopWatch()
+        pending = list(self.operations)
+        active = []
+
+        while pending or active:
+            for operation in list(pending):
+                if all(dependency.is_done() for dependency in self.dependencies[operation.name]):
+                    log.debug("Scheduler", "Starting {} at {} ms", operation.name, stopwatch.time())
+                    operation.state = "running"
+                    operation.start()
+                    pending.remove(operation)
+                    active.append(operation)
+
+            if not active:
+                # Nothing runs and nothing can start, a dependency was never added
+                log.error("Scheduler", "Unsatisfiable dependencies: {}", [operation.name for operation in pending])
+                return False
+
+            finished = False
+            for operation in list(active):
+                if operation.step():
+                    operation.state = "done"
+                    active.remove(operation)
+                    finished = True
+
+            if not (pending or active):
+                break
+
+            if stopwatch.time() > self.timeout:
+                log.error("Scheduler", "Timed out, still running: {}", [operation.name for operation in active])
+                return False
+
+            # No wait after an operation finished, the ones waiting for it start right away
+            if not finished:
+                wait(10)
+
+        log.debug("Scheduler", "{} operations done in {} ms", len(self.operations), stopwatch.time())
+        return True
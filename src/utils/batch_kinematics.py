@@ -0,0 +1,102 @@
+"""
+Vectorized versions of the functions in utils.kinematics for use off the brick.
+
+These work on NumPy arrays and are meant for workspace sweeps, calibration fitting and offline planning. NumPy is not
+available on the EV3, so nothing that runs on the brick may import this module.
+"""
+import numpy as np
+
+from constants import OFFSETS
+
+
+def get_coordinates_batch(shoulder_angles, shoulder_length: float, elbow_angles, elbow_length: float):
+    """
+    Forward kinematics for many arm poses at once, same convention as kinematics.get_coordinates.
+
+    Parameters:
+        shoulder_angles (array_like): Shoulder angles in degrees.
+        shoulder_length (float): Length of the first link (shoulder segment).
+        elbow_angles (array_like): Elbow angles in degrees, relative to the shoulder segment.
+        elbow_length (float): Length of the second link (elbow segment).
+
+    Returns:
+        tuple: (x, y) arrays of the end effector coordinates.
+    """
+    shoulder_rad = np.radians(np.asarray(shoulder_angles, dtype=np.float64))
+    elbow_rad = np.radians(np.asarray(elbow_angles, dtype=np.float64))
+    global_elbow_rad = shoulder_rad + elbow_rad
+
+    x = shoulder_length * np.cos(shoulder_rad) + elbow_length * np.cos(global_elbow_rad)
+    y = shoulder_length * np.sin(shoulder_rad) + elbow_length * np.sin(global_elbow_rad)
+    return x, y
+
+
+def calculate_angles_batch(x, y, l1: float, l2: float):
+    """
+    Inverse kinematics for many target points at once, same convention as kinematics.calculate_angles.
+
+    Instead of raising ValueError, unreachable points are reported through a mask and their angles are set to NaN.
+
+    Parameters:
+        x (array_like): x-coordinates of the target points.
+        y (array_like): y-coordinates of the target points.
+        l1 (float): Length of the first link (shoulder segment).
+        l2 (float): Length of the second link (elbow segment).
+
+    Returns:
+        tuple: (shoulder_angles, elbow_angles, reachable) where the angles are in degrees for the "elbow up"
+        configuration and reachable is a boolean array.
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+
+    distance_squared = x ** 2 + y ** 2
+    distance = np.sqrt(distance_squared)
+    reachable = (distance <= (l1 + l2)) & (distance >= abs(l1 - l2))
+
+    # Cosine law for the elbow angle, clamped to avoid numerical issues
+    cos_angle2 = np.clip((distance_squared - l1 ** 2 - l2 ** 2) / (2 * l1 * l2), -1.0, 1.0)
+    theta2 = np.arccos(cos_angle2)  # Elbow up configuration
+
+    k1 = l1 + l2 * np.cos(theta2)
+    k2 = l2 * np.sin(theta2)
+    theta1 = np.arctan2(y, x) - np.arctan2(k2, k1)
+
+    shoulder_deg = np.degrees(theta1)
+    elbow_deg = np.degrees(theta2)
+
+    # Same wrap as the scalar version for targets below the shoulder
+    shoulder_deg = np.where(y < 0, shoulder_deg + 360, shoulder_deg)
+
+    shoulder_deg = np.where(reachable, shoulder_deg, np.nan)
+    elbow_deg = np.where(reachable, elbow_deg, np.nan)
+    return shoulder_deg, elbow_deg, reachable
+
+
+def move_angles_batch(x, y, l1: float, l2: float, shoulder_offset: float = OFFSETS["shoulder"],
+                      elbow_offset: float = OFFSETS["elbow"]):
+    """
+    Joint angles that MoveSystem.move would command for the given target points.
+
+    Applies the same offsets and shoulder sign flip as MoveSystem.move on top of calculate_angles_batch.
+
+    Returns:
+        tuple: (shoulder_angles, elbow_angles, reachable) with the angles in joint degrees (before gear ratios).
+    """
+    shoulder_deg, elbow_deg, reachable = calculate_angles_batch(x, y, l1, l2)
+    shoulder_angles = -(shoulder_deg - shoulder_offset)
+    elbow_angles = elbow_deg - elbow_offset
+    return shoulder_angles, elbow_angles, reachable
+
+
+def coordinates_from_move_angles_batch(shoulder_angles, elbow_angles, l1: float, l2: float,
+                                       shoulder_offset: float = OFFSETS["shoulder"],
+                                       elbow_offset: float = OFFSETS["elbow"]):
+    """
+    Inverse of move_angles_batch: the (x, y) reached when MoveSystem.move_to_angle is given these joint angles.
+
+    Returns:
+        tuple: (x, y) arrays of the end effector coordinates.
+    """
+    shoulder_deg = shoulder_offset - np.asarray(shoulder_angles, dtype=np.float64)
+    elbow_deg = np.asarray(elbow_angles, dtype=np.float64) + elbow_offset
+    return get_coordinates_batch(shoulder_deg, l1, elbow_deg, l2)
@@ -0,0 +1,85 @@
+"""
+Calibration results kept on the brick between runs.
+
+For every part the store keeps the measured home angle (where the touch sensor closes or the end-stop stalls, in
+calibrated motor degrees) and the angle the motor was parked at when the program ended. The EV3 motors forget their
+position when the program exits, so the park angles are only trusted if the previous run ended cleanly: the file is
+marked dirty as soon as a run starts moving the arm (AutomaticMode once it is homed, ManualMode when it starts), and
+clean again once AutomaticMode parked the arm.
+
+File format:
+    CAL1 <clean|dirty>
+    <part name> <home angle> <park angle>
+    ...
+"""
+from utils.log import log
+
+MAGIC = "CAL1"
+
+# Calibration kept between runs for a warm start
+CALIBRATION_PATH = "calibration.txt"
+
+
+class CalibrationStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.clean = False  # The park angles match the arm (the previous run parked it)
+        self.parts = {}  # part name -> (home_angle, park_angle)
+
+    @staticmethod
+    def load(path: str):
+        """Load the store at path. A missing or invalid file gives an empty store."""
+        store = CalibrationStore(path)
+        try:
+            with open(path) as file:
+                header = file.readline().split()
+                if len(header) != 2 or header[0] != MAGIC:
+                    log.warning("CalibrationStore", "Invalid calibration file: {}", path)
+                    return store
+
+                parts = {}
+                for line in file:
+                    fields = line.split()
+                    if len(fields) != 3:
+                        log.warning("CalibrationStore", "Invalid calibration file: {}", path)
+                        return store
+                    parts[fields[0]] = (float(fields[1]), float(fields[2]))
+        except OSError:
+            log.info("CalibrationStore", "No calibration found at {}", path)
+            return store
+        except ValueError:
+            log.warning("CalibrationStore", "Invalid calibration file: {}", path)
+            return store
+
+        store.clean = header[1] == "clean"
+        store.parts = parts
+        log.info("CalibrationStore", "Loaded {} parts ({})", len(parts), header[1])
+        return store
+
+    @staticmethod
+    def invalidate(path: str):
+        """Mark the store at path dirty, for modes that move the arm without keeping track of the park angles."""
+        store = CalibrationStore.load(path)
+        if store.clean:
+            store.save(clean=False)
+
+    def get(self, name: str):
+        """(home_angle, park_angle) of a part, or None if there is nothing usable for a warm start."""
+        if not self.clean:
+            return None
+        return self.parts.get(name)
+
+    def update(self, part):
+        """Store the part's home angle and its current angle as the park angle."""
+        self.parts[part.name] = (part.home_angle, part.get_raw_angle())
+
+    def save(self, clean: bool):
+        self.clean = clean
+        try:
+            with open(self.path, "w") as file:
+                file.write(MAGIC + " " + ("clean" if clean else "dirty") + "\n")
+                for name in sorted(self.parts):
+                    home_angle, park_angle = self.parts[name]
+                    file.write("{} {} {}\n".format(name, home_angle, park_angle))
+        except OSError:
+            log.warning("CalibrationStore", "Could not write calibration to {}", self.path)
@@ -0,0 +1,87 @@
+"""
+Quantized RGB lookup table.
+
+The color sensor reports each channel as an integer 0-100, cube and background readings stay well below RANGE. The
+table splits 0..RANGE-1 into cells of STEP^3 readings and stores one byte per cell: the class index in the low 3 bits
+and the margin (how much closer the best class is than the runner-up, clamped to 0-31) in the high 5 bits. Cells are
+filled lazily: the first lookup in a cell runs the classifier on every integer reading of the cell and stores their
+common class with the smallest margin, so the table never reports a reading as more certain than it is. Cells whose
+readings don't agree on a class, and readings outside the table, go to the classifier on every lookup.
+"""
+STEP = 2
+CELLS_PER_CHANNEL = 32
+RANGE = STEP * CELLS_PER_CHANNEL
+MAX_CLASSES = 7  # Class index 7 marks a cell that isn't classified yet (UNKNOWN) or has no common class (MIXED)
+UNKNOWN = 0xFF
+MIXED = 0x07
+MAX_MARGIN = 31
+
+
+class ColorLUT:
+    def __init__(self, classifier):
+        """
+        Parameters:
+            classifier (callable): Called with an (r, g, b) tuple, returns (class index, margin). Class indices have to
+                be below MAX_CLASSES.
+        """
+        self.classifier = classifier
+        self.cells = bytearray([UNKNOWN] * (CELLS_PER_CHANNEL ** 3))
+        self.filled = 0
+
+    @staticmethod
+    def cell_index(rgb):
+        """Index of the cell holding an RGB reading, None if the reading is outside the table."""
+        r = max(int(rgb[0]), 0) // STEP
+        g = max(int(rgb[1]), 0) // STEP
+        b = max(int(rgb[2]), 0) // STEP
+        if r >= CELLS_PER_CHANNEL or g >= CELLS_PER_CHANNEL or b >= CELLS_PER_CHANNEL:
+            return None
+        return (r * CELLS_PER_CHANNEL + g) * CELLS_PER_CHANNEL + b
+
+    def lookup(self, rgb):
+        """Returns (class index, margin) for an RGB reading."""
+        index = self.cell_index(rgb)
+        if index is None:
+            return self.classifier(rgb)
+
+        cell = self.cells[index]
+        if cell == UNKNOWN:
+            cell = self.fill(index)
+        if cell == MIXED:
+            return self.classifier(rgb)
+        return cell & 0x07, cell >> 3
+
+    def fill(self, index) -> int:
+        b = index % CELLS_PER_CHANNEL * STEP
+        g = (index // CELLS_PER_CHANNEL) % CELLS_PER_CHANNEL * STEP
+        r = index // (CELLS_PER_CHANNEL * CELLS_PER_CHANNEL) * STEP
+
+        cell_class = None
+        cell_margin = MAX_MARGIN
+        for dr in range(STEP):
+            for dg in range(STEP):
+                for db in range(STEP):
+                    class_index, margin = self.classifier((r + dr, g + dg, b + db))
+                    if cell_class is None:
+                        cell_class = class_index
+                    elif class_index != cell_class:
+                        self.cells[index] = MIXED
+                        self.filled += 1
+                        return MIXED
+                    cell_margin = min(cell_margin, margin)
+
+        cell = cell_class | (max(int(cell_margin), 0) << 3)
+        self.cells[index] = cell
+        self.filled += 1
+        return cell
+
+    def clear(self):
+        for i in range(len(self.cells)):
+            self.cells[i] = UNKNOWN
+        self.filled = 0
+
+    def fill_all(self):
+        """Classify every cell up front (slow on the brick, STEP^3 classifications per cell)."""
+        for index in range(len(self.cells)):
+            if self.cells[index] == UNKNOWN:
+                self.fill(index)
@@ -0,0 +1,162 @@
+"""
+Per-color statistics of the color sensor, fitted from labeled samples (see ColorCalibrationMode).
+
+Every class (the cube colors and "background") has the mean of its samples and the inverse of their covariance.
+Readings are scored with the negative log-likelihood of a normal distribution per class: half the squared Mahalanobis
+distance plus half the log-determinant of the covariance. The distance alone would favor wide classes (a reading
+between two classes is fewer standard deviations away from the wider one), the log-determinant charges a class for its
+spread, so a class whose readings spread a lot along one channel (the red/yellow confusion under warm light) only wins
+the readings it explains better than its tighter neighbours. Classes without samples use a fixed centroid with unit
+variance (log-determinant 0), scored on the same scale as fitted ones.
+
+File format:
+    COLOR1
+    <name> <sample count> <mean r> <mean g> <mean b> <9 entries of the inverse covariance, row by row>
+    ...
+"""
+import math
+
+from utils.log import log
+
+MAGIC = "COLOR1"
+
+# Added to the variances, the sensor reports integers so a class never has less spread than that, and a handful of
+# identical readings would otherwise give a singular covariance
+VARIANCE_FLOOR = 0.5
+
+IDENTITY = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0)
+
+
+def determinant_3x3(m):
+    a, b, c, d, e, f, g, h, i = m
+    return a * (e * i - f * h) - b * (d * i - f * g) + c * (d * h - e * g)
+
+
+def invert_3x3(m):
+    """Inverse of a 3x3 matrix given as a flat row-major sequence, None if it is singular."""
+    a, b, c, d, e, f, g, h, i = m
+    cofactors = (e * i - f * h, c * h - b * i, b * f - c * e,
+                 f * g - d * i, a * i - c * g, c * d - a * f,
+                 d * h - e * g, b * g - a * h, a * e - b * d)
+    determinant = a * cofactors[0] + b * cofactors[3] + c * cofactors[6]
+    if abs(determinant) < 1e-9:
+        return None
+    return tuple(value / determinant for value in cofactors)
+
+
+class ColorModel:
+    def __init__(self):
+        self.names = []  # Class names in file order
+        self.means = {}  # name -> (r, g, b)
+        self.inverse_covariances = {}  # name -> flat 3x3 matrix
+        self.sample_counts = {}  # name -> samples the class was fitted from, 0 for a fixed centroid
+        self.log_determinants = {}  # name -> log of the covariance determinant
+
+    @staticmethod
+    def from_centroids(centroids: dict):
+        """Model with unit variance around fixed centroids (name -> (r, g, b))."""
+        model = ColorModel()
+        for name, mean in centroids.items():
+            model.set_class(name, mean, IDENTITY, 0)
+        return model
+
+    def set_class(self, name: str, mean, inverse_covariance, sample_count: int):
+        determinant = determinant_3x3(inverse_covariance)
+        if determinant <= 0:
+            raise ValueError("Covariance of " + name + " is not positive definite")
+
+        if name not in self.means:
+            self.names.append(name)
+        self.means[name] = tuple(mean)
+        self.inverse_covariances[name] = tuple(inverse_covariance)
+        self.sample_counts[name] = sample_count
+        self.log_determinants[name] = -math.log(determinant)
+
+    def fit_class(self, name: str, samples: list) -> bool:
+        """Fit the mean and covariance of a class from a list of (r, g, b) readings. Returns False if that failed."""
+        count = len(samples)
+        if count < 2:
+            return False
+
+        mean = [sum(sample[i] for sample in samples) / count for i in range(3)]
+        covariance = [0.0] * 9
+        for sample in samples:
+            delta = [sample[i] - mean[i] for i in range(3)]
+            for row in range(3):
+                for column in range(3):
+                    covariance[row * 3 + column] += delta[row] * delta[column]
+        for index in range(9):
+            covariance[index] /= count - 1
+        for i in range(3):
+            covariance[i * 4] += VARIANCE_FLOOR
+
+        inverse_covariance = invert_3x3(covariance)
+        if inverse_covariance is None:
+            log.warning("ColorModel", "Singular covariance for {}", name)
+            return False
+
+        self.set_class(name, mean, inverse_covariance, count)
+        log.info("ColorModel", "Fitted {} from {} samples: mean {}, variance {}", name, count,
+                 [round(value, 1) for value in mean], [round(covariance[i * 4], 2) for i in range(3)])
+        return True
+
+    def squared_distance(self, name: str, rgb) -> float:
+        """Squared Mahalanobis distance of a reading from a class."""
+        mean = self.means[name]
+        m = self.inverse_covariances[name]
+        x = rgb[0] - mean[0]
+        y = rgb[1] - mean[1]
+        z = rgb[2] - mean[2]
+        squared = (x * (m[0] * x + m[1] * y + m[2] * z)
+                   + y * (m[3] * x + m[4] * y + m[5] * z)
+                   + z * (m[6] * x + m[7] * y + m[8] * z))
+        return max(squared, 0)
+
+    def distance(self, name: str, rgb) -> float:
+        """Mahalanobis distance of a reading from a class, in standard deviations."""
+        return math.sqrt(self.squared_distance(name, rgb))
+
+    def score(self, name: str, rgb) -> float:
+        """Negative log-likelihood of a reading under a class, up to a constant shared by all classes (lower wins)."""
+        return 0.5 * (self.squared_distance(name, rgb) + self.log_determinants[name])
+
+    @staticmethod
+    def load(path: str):
+        """Load a model from path, None if it is missing or invalid."""
+        model = ColorModel()
+        try:
+            with open(path) as file:
+                if file.readline().strip() != MAGIC:
+                    log.warning("ColorModel", "Invalid color model file: {}", path)
+                    return None
+                for line in file:
+                    fields = line.split()
+                    if not fields:
+                        continue
+                    if len(fields) != 14:
+                        log.warning("ColorModel", "Invalid color model file: {}", path)
+                        return None
+                    values = [float(field) for field in fields[2:]]
+                    model.set_class(fields[0], values[:3], values[3:], int(fields[1]))
+        except OSError:
+            log.info("ColorModel", "No color model found at {}", path)
+            return None
+        except ValueError:
+            log.warning("ColorModel", "Invalid color model file: {}", path)
+            return None
+
+        log.info("ColorModel", "Loaded {} classes from {}", len(model.names), path)
+        return model
+
+    def save(self, path: str) -> bool:
+        try:
+            with open(path, "w") as file:
+                file.write(MAGIC + "\n")
+                for name in self.names:
+                    values = list(self.means[name]) + list(self.inverse_covariances[name])
+                    file.write(name + " " + str(self.sample_counts[name]) + " "
+                               + " ".join("{:.6g}".format(value) for value in values) + "\n")
+        except OSError:
+            log.warning("ColorModel", "Could not write color model to {}", path)
+            return False
+        return True
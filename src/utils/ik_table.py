@@ -0,0 +1,135 @@
+"""
+Precomputed inverse kinematics table.
+
+The table is a regular (x, y) grid with the raw motor degrees (gear ratios and offsets already applied) of the shoulder
+and elbow at every node. A cell is only marked valid when all four corners are reachable and bilinear interpolation
+stays within the allowed error of the analytic solver at every sample point of the cell (a sub-grid, see
+tools/build_ik_table.py). max_error is the largest error found at those sample points. It is an estimate, not a
+bound: between the sample points the error can be slightly larger (about 1% at the default step). Lookups outside the
+grid or in invalid cells return None so the caller can fall back to utils.kinematics.calculate_angles.
+
+The file is written by tools/build_ik_table.py and is loaded on the brick with the array module, so no math beyond a
+few multiplications is needed per lookup.
+"""
+import struct
+from array import array
+
+from utils.log import log
+
+MAGIC = b"IKT1"
+
+# magic, nx, ny, x0, y0, step, max_error, l1, l2, shoulder_offset, elbow_offset, shoulder_ratio, elbow_ratio
+HEADER_FORMAT = "<4sHHffffffffff"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Tolerance used when checking that a table was built for the current arm (values are stored as 32-bit floats)
+GEOMETRY_TOLERANCE = 0.001
+
+
+def _read_floats(file, count):
+    values = array("f", [0.0] * count)
+    file.readinto(values)
+    return values
+
+
+def _read_bytes(file, count):
+    values = bytearray(count)
+    file.readinto(values)
+    return values
+
+
+class IKTable:
+    def __init__(self, nx, ny, x0, y0, step, max_error, l1, l2, shoulder_offset, elbow_offset, shoulder_ratio,
+                 elbow_ratio, shoulder_raw, elbow_raw, valid):
+        self.nx = nx
+        self.ny = ny
+        self.x0 = x0
+        self.y0 = y0
+        self.step = step
+        self.max_error = max_error  # Worst sampled interpolation error (joint degrees) over all valid cells
+        self.l1 = l1
+        self.l2 = l2
+        self.shoulder_offset = shoulder_offset
+        self.elbow_offset = elbow_offset
+        self.shoulder_ratio = shoulder_ratio
+        self.elbow_ratio = elbow_ratio
+        self.shoulder_raw = shoulder_raw  # array("f"), nx * ny nodes, row-major in y
+        self.elbow_raw = elbow_raw  # array("f"), nx * ny nodes, row-major in y
+        self.valid = valid  # bytearray, (nx - 1) * (ny - 1) cells
+
+    @staticmethod
+    def load(path: str):
+        """Load a table from disk. Returns None if the file is missing or is not an IK table."""
+        try:
+            with open(path, "rb") as file:
+                header = file.read(HEADER_SIZE)
+                if len(header) != HEADER_SIZE:
+                    log.warning("IKTable", "Invalid table file: {}", path)
+                    return None
+
+                fields = struct.unpack(HEADER_FORMAT, header)
+                if fields[0] != MAGIC:
+                    log.warning("IKTable", "Invalid table file: {}", path)
+                    return None
+
+                nx, ny = fields[1], fields[2]
+                shoulder_raw = _read_floats(file, nx * ny)
+                elbow_raw = _read_floats(file, nx * ny)
+                valid = _read_bytes(file, (nx - 1) * (ny - 1))
+        except OSError:
+            log.info("IKTable", "No table found at {}", path)
+            return None
+
+        log.info("IKTable", "Loaded {}x{} table, max sampled error: {}°", nx, ny, fields[6])
+        return IKTable(nx, ny, *fields[3:], shoulder_raw=shoulder_raw, elbow_raw=elbow_raw, valid=valid)
+
+    def save(self, path: str):
+        with open(path, "wb") as file:
+            file.write(struct.pack(HEADER_FORMAT, MAGIC, self.nx, self.ny, self.x0, self.y0, self.step,
+                                   self.max_error, self.l1, self.l2, self.shoulder_offset, self.elbow_offset,
+                                   self.shoulder_ratio, self.elbow_ratio))
+            file.write(self.shoulder_raw)
+            file.write(self.elbow_raw)
+            file.write(self.valid)
+
+    def matches(self, l1, l2, shoulder_offset, elbow_offset, shoulder_ratio, elbow_ratio) -> bool:
+        """Check that the table was built for the given arm geometry."""
+        expected = (l1, l2, shoulder_offset, elbow_offset, shoulder_ratio, elbow_ratio)
+        actual = (self.l1, self.l2, self.shoulder_offset, self.elbow_offset, self.shoulder_ratio, self.elbow_ratio)
+        for a, b in zip(expected, actual):
+            if abs(a - b) > GEOMETRY_TOLERANCE:
+                return False
+        return True
+
+    def lookup(self, x: float, y: float):
+        """
+        Bilinear interpolation of the raw motor angles at (x, y).
+
+        Returns:
+            tuple: (shoulder_raw, elbow_raw) in motor degrees, or None if (x, y) is not covered by a valid cell.
+        """
+        fx = (x - self.x0) / self.step
+        fy = (y - self.y0) / self.step
+        if fx < 0 or fy < 0:
+            return None
+
+        i = int(fx)
+        j = int(fy)
+        if i >= self.nx - 1 or j >= self.ny - 1:
+            return None
+        if not self.valid[j * (self.nx - 1) + i]:
+            return None
+
+        tx = fx - i
+        ty = fy - j
+        w00 = (1 - tx) * (1 - ty)
+        w10 = tx * (1 - ty)
+        w01 = (1 - tx) * ty
+        w11 = tx * ty
+
+        k = j * self.nx + i
+        s = self.shoulder_raw
+        e = self.elbow_raw
+        shoulder = w00 * s[k] + w10 * s[k + 1] + w01 * s[k + self.nx] + w11 * s[k + self.nx + 1]
+        elbow = w00 * e[k] + w10 * e[k + 1] + w01 * e[k + self.nx] + w11 * e[k + self.nx + 1]
+        return shoulder, elbow
@@ -10,3 +10,14 @@ def get_input(ev3: EV3Brick) -> Button:
         wait(10)
 
     return pressed_inputs[0]
+
+
+def wait_for_release(ev3: EV3Brick):
+    # Wait until no button is pressed (two readings in a row), so one press doesn't trigger twice
+    released_readings = 0
+    while released_readings < 2:
+        if ev3.buttons.pressed():
+            released_readings = 0
+        else:
+            released_readings += 1
+        wait(10)
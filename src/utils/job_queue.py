@@ -0,0 +1,130 @@
+"""
+Tower orders for the job queue mode.
+
+An order is one line of comma separated colors, bottom of the tower first ("red,blue,green,yellow"). Empty lines and
+lines starting with # are skipped, a line "END" ends the queue. Orders with an unknown color or more cubes than the
+stack has positions for are skipped as well. Orders come from a file (FileJobSource) or from a TCP
+socket (SocketJobSource), for example sent from a laptop with `nc <brick> 5005`.
+"""
+try:
+    import usocket as socket
+except ImportError:
+    import socket
+
+from utils.log import log
+
+END = "END"
+
+# Port SocketJobSource listens on
+JOB_PORT = 5005
+
+
+def parse_order(line: str, colors, max_length: int = None):
+    """
+    Parse one line into a list of colors, at most max_length of them (any number if None).
+
+    Returns:
+        list: The colors, None for a line without an order, END at the end of the queue.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line == END:
+        return END
+
+    order = [color.strip() for color in line.split(",")]
+    for color in order:
+        if color not in colors:
+            log.warning("JobQueue", "Skipping order with unknown color {}: {}", color, line)
+            return None
+    if max_length is not None and len(order) > max_length:
+        log.warning("JobQueue", "Skipping order with {} cubes, towers have at most {}: {}", len(order), max_length,
+                    line)
+        return None
+    return order
+
+
+class FileJobSource:
+    def __init__(self, path: str, colors, max_length: int = None):
+        self.path = path
+        self.colors = colors
+        self.max_length = max_length
+        self.file = None
+
+    def next_order(self):
+        """The next order in the file, None once it is used up."""
+        if self.file is None:
+            try:
+                self.file = open(self.path)
+            except OSError:
+                log.error("JobQueue", "No job file at {}", self.path)
+                return None
+
+        for line in self.file:
+            order = parse_order(line, self.colors, self.max_length)
+            if order == END:
+                break
+            if order is not None:
+                return order
+
+        self.close()
+        return None
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class SocketJobSource:
+    """Accepts one client at a time and reads orders from it, blocking until the next one arrives."""
+
+    def __init__(self, colors, max_length: int = None, host: str = "0.0.0.0", port: int = JOB_PORT):
+        self.colors = colors
+        self.max_length = max_length
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(socket.getaddrinfo(host, port)[0][-1])
+        self.server.listen(1)
+        self.client = None
+        self.buffer = b""
+        log.info("JobQueue", "Waiting for orders on port {}", port)
+
+    def read_line(self):
+        """Next line from the client (accepting a new one once it disconnects), None once the queue ended."""
+        while True:
+            if self.client is None:
+                self.client, address = self.server.accept()
+                self.buffer = b""
+                log.info("JobQueue", "Client connected: {}", address)
+
+            newline = self.buffer.find(b"\n")
+            if newline >= 0:
+                line = self.buffer[:newline]
+                self.buffer = self.buffer[newline + 1:]
+                return line.decode()
+
+            data = self.client.recv(256)
+            if not data:
+                self.client.close()
+                self.client = None
+                if self.buffer:
+                    line = self.buffer.decode()
+                    self.buffer = b""
+                    return line
+                continue
+            self.buffer += data
+
+    def next_order(self):
+        while True:
+            order = parse_order(self.read_line(), self.colors, self.max_length)
+            if order == END:
+                return None
+            if order is not None:
+                if self.client is not None:
+                    self.client.send(("building " + ",".join(order) + "\n").encode())
+                return order
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.server.close()
@@ -0,0 +1,111 @@
+"""
+Append-only journal of the automatic routine's progress.
+
+After every completed step (a cube stacked, stored or moved between bins) the routine appends a snapshot of its state:
+the sequence, the tower so far, how many cubes were taken from the main bin and what every storage bin holds. Each
+line carries a checksum, so a line cut short by a crash or a pulled battery is ignored and the last complete snapshot
+wins. Once the file holds MAX_RECORDS snapshots it is replaced by one with just the latest snapshot.
+
+File format (one snapshot per line):
+    J1 <sequence> <tower> <main bin pickups> <bin>=<colors>;... <checksum>
+Color lists are comma separated, "-" for an empty one. The checksum is the sum of the characters before it, as 4 hex
+digits.
+"""
+try:
+    import uos as os
+except ImportError:
+    import os
+
+from utils.log import log
+
+MAGIC = "J1"
+MAX_RECORDS = 64
+
+
+def format_colors(colors) -> str:
+    return ",".join(colors) if colors else "-"
+
+
+def parse_colors(text: str) -> list:
+    return [] if text == "-" else text.split(",")
+
+
+def checksum(text: str) -> str:
+    return "{:04x}".format(sum(ord(character) for character in text) & 0xFFFF)
+
+
+class Journal:
+    def __init__(self, path: str):
+        self.path = path
+        self.records = None  # Snapshots in the file, counted on the first append
+
+    @staticmethod
+    def format(state: dict) -> str:
+        storage = ";".join(key + "=" + format_colors(state["storage"][key]) for key in sorted(state["storage"]))
+        payload = " ".join((MAGIC, format_colors(state["sequence"]), format_colors(state["tower"]),
+                            str(state["pickups"]), storage or "-"))
+        return payload + " " + checksum(payload)
+
+    @staticmethod
+    def parse(line: str):
+        """The snapshot on a line, None if the line is incomplete or damaged."""
+        line = line.strip()
+        separator = line.rfind(" ")
+        if separator < 0 or checksum(line[:separator]) != line[separator + 1:]:
+            return None
+
+        fields = line[:separator].split(" ")
+        if len(fields) != 5 or fields[0] != MAGIC:
+            return None
+        storage = {}
+        if fields[4] != "-":
+            for entry in fields[4].split(";"):
+                key, colors = entry.split("=")
+                storage[key] = parse_colors(colors)
+        try:
+            pickups = int(fields[3])
+        except ValueError:
+            return None
+        return {"sequence": parse_colors(fields[1]), "tower": parse_colors(fields[2]), "pickups": pickups,
+                "storage": storage}
+
+    def load(self):
+        """The last complete snapshot, None if there is none."""
+        state = None
+        self.records = 0
+        try:
+            with open(self.path) as file:
+                for line in file:
+                    snapshot = self.parse(line)
+                    if snapshot is not None:
+                        state = snapshot
+                        self.records += 1
+        except OSError:
+            pass
+        return state
+
+    def append(self, state: dict):
+        if self.records is None:
+            self.load()
+        line = self.format(state) + "\n"
+        try:
+            if self.records >= MAX_RECORDS:
+                # Compact: the latest snapshot is all a resume needs. Written next to the journal and renamed over it,
+                # so a crash in between still leaves one of the two
+                with open(self.path + ".tmp", "w") as file:
+                    file.write(line)
+                os.rename(self.path + ".tmp", self.path)
+                self.records = 1
+            else:
+                with open(self.path, "a") as file:
+                    file.write(line)
+                self.records += 1
+        except OSError:
+            log.warning("Journal", "Could not write to {}", self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.records = 0
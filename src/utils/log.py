@@ -0,0 +1,112 @@
+"""
+Leveled logger backed by a preallocated ring buffer.
+
+Printing to the EV3 console is slow enough to skew the timing of 10 ms control loops, so log calls only store a small
+tuple (time, level, tag, message, args) in the buffer and the message is formatted when it is printed. Records below
+the logger level are dropped before anything is allocated, records at or above the echo level are also printed right
+away. By default every record is buffered but only INFO and above are printed, so a dump after a fault also has the
+DEBUG records leading up to it.
+
+Usage:
+    from utils.log import log
+    log.debug("Gripper", "angle: {}, difference: {}", angle, difference)
+"""
+try:
+    from pybricks.tools import StopWatch
+except ImportError:
+    # Off the brick (tools/ on the development machine) records are timed with the host clock
+    import time
+
+    class StopWatch:
+        def __init__(self):
+            self.start = time.time()
+
+        def time(self):
+            return int((time.time() - self.start) * 1000)
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {
+    DEBUG: "DEBUG",
+    INFO: "INFO",
+    WARNING: "WARNING",
+    ERROR: "ERROR",
+}
+
+
+class Logger:
+    def __init__(self, capacity: int = 256, level: int = DEBUG, echo_level: int = INFO):
+        self.capacity = capacity
+        self.level = level  # Records below this level are dropped
+        self.echo_level = echo_level  # Records at or above this level are printed immediately
+        self.records = [None] * capacity
+        self.index = 0  # Next slot to write
+        self.count = 0  # Records currently in the buffer
+        self.stopwatch = StopWatch()
+
+    def log(self, level: int, tag: str, message: str, *args):
+        if level < self.level:
+            return
+
+        record = (self.stopwatch.time(), level, tag, message, args)
+        self.records[self.index] = record
+        self.index = (self.index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+        if level >= self.echo_level:
+            print(self.format(record))
+
+    def debug(self, tag: str, message: str, *args):
+        if DEBUG >= self.level:
+            self.log(DEBUG, tag, message, *args)
+
+    def info(self, tag: str, message: str, *args):
+        self.log(INFO, tag, message, *args)
+
+    def warning(self, tag: str, message: str, *args):
+        self.log(WARNING, tag, message, *args)
+
+    def error(self, tag: str, message: str, *args):
+        self.log(ERROR, tag, message, *args)
+
+    @staticmethod
+    def format(record) -> str:
+        time, level, tag, message, args = record
+        if args:
+            message = message.format(*args)
+        return "{:>8} {:<7} [{}] {}".format(time, LEVEL_NAMES.get(level, level), tag, message)
+
+    def get_records(self) -> list:
+        """Buffered records, oldest first."""
+        start = (self.index - self.count) % self.capacity
+        return [self.records[(start + i) % self.capacity] for i in range(self.count)]
+
+    def dump(self, path: str = None):
+        """Print (or write to a file) every buffered record, oldest first. The buffer is kept."""
+        lines = [self.format(record) for record in self.get_records()]
+        if path is None:
+            for line in lines:
+                print(line)
+        else:
+            with open(path, "a") as file:
+                for line in lines:
+                    file.write(line + "\n")
+
+    def flush(self, path: str = None):
+        """Like dump, but empties the buffer afterwards."""
+        self.dump(path)
+        self.clear()
+
+    def clear(self):
+        for i in range(self.capacity):
+            self.records[i] = None
+        self.index = 0
+        self.count = 0
+
+
+# Shared logger for the whole program
+log = Logger()
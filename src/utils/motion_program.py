@@ -0,0 +1,99 @@
+"""
+Compiled motion programs.
+
+A motion program maps the names of a routine's positions to raw motor targets (shoulder, elbow, base in motor degrees,
+gear ratios and offsets already applied), so the routine itself only issues motor commands. Programs are compiled
+once against a MoveSystem and cached in a small text file. The first line holds a key describing everything the
+targets were computed from (positions, arm geometry, joint limits), so a cached program is only used when none of it
+changed.
+
+File format:
+    ROUTE1 <key>
+    <name> <shoulder_raw> <elbow_raw> <base_raw>
+    ...
+"""
+from utils.log import log
+
+MAGIC = "ROUTE1"
+
+
+class MotionProgram:
+    def __init__(self, key: str, targets: dict):
+        self.key = key
+        self.targets = targets  # name -> (shoulder_raw, elbow_raw, base_raw)
+
+    def get(self, name: str):
+        return self.targets[name]
+
+    def names(self) -> list:
+        return sorted(self.targets)
+
+    @staticmethod
+    def compile(key: str, locations: dict, move_system):
+        """
+        Compute the raw motor targets of every location (name -> Location). Returns None if a location can't be
+        reached, after reporting every unreachable one.
+        """
+        targets = {}
+        valid = True
+        for name in sorted(locations):
+            location = locations[name]
+            raw_angles = None
+            if move_system.can_reach_location(location):
+                raw_angles = move_system.get_raw_angles(location)
+            if raw_angles is None:
+                log.error("MotionProgram", "Unreachable position {}: {}", name, location)
+                valid = False
+            else:
+                targets[name] = raw_angles
+
+        if not valid:
+            return None
+        log.info("MotionProgram", "Compiled {} targets", len(targets))
+        return MotionProgram(key, targets)
+
+    def check(self, move_system) -> bool:
+        """
+        Check every target against the move system's current joint limits, e.g. once homing measured them. Returns
+        False after reporting every target outside them.
+        """
+        valid = True
+        for name in self.names():
+            if not move_system.check_raw_limits(*self.targets[name]):
+                log.error("MotionProgram", "Position {} is outside the joint limits", name)
+                valid = False
+        return valid
+
+    @staticmethod
+    def load(path: str, key: str):
+        """Load a cached program. Returns None if the file is missing, invalid or was compiled for another key."""
+        targets = {}
+        try:
+            with open(path) as file:
+                header = file.readline().rstrip("\n")
+                if header != MAGIC + " " + key:
+                    log.info("MotionProgram", "Cached program at {} is out of date", path)
+                    return None
+
+                for line in file:
+                    fields = line.split()
+                    if len(fields) != 4:
+                        log.warning("MotionProgram", "Invalid program file: {}", path)
+                        return None
+                    targets[fields[0]] = (float(fields[1]), float(fields[2]), float(fields[3]))
+        except OSError:
+            log.info("MotionProgram", "No cached program at {}", path)
+            return None
+        except ValueError:
+            log.warning("MotionProgram", "Invalid program file: {}", path)
+            return None
+
+        log.info("MotionProgram", "Loaded {} targets from {}", len(targets), path)
+        return MotionProgram(key, targets)
+
+    def save(self, path: str):
+        with open(path, "w") as file:
+            file.write(MAGIC + " " + self.key + "\n")
+            for name in self.names():
+                shoulder_raw, elbow_raw, base_raw = self.targets[name]
+                file.write("{} {} {} {}\n".format(name, repr(shoulder_raw), repr(elbow_raw), repr(base_raw)))
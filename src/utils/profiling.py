@@ -0,0 +1,152 @@
+"""
+Motion profiling.
+
+MoveSystem and ArmPart report every move to a MotionProfiler when one is attached (see MoveSystem.set_profiler). Per
+joint it keeps fixed-size histograms of:
+    - error: |achieved - commanded| angle in joint degrees, measured when the motor reports the move as done
+    - settle: milliseconds from the move command until the motor reports the move as done
+    - poll: milliseconds the joint spent in MoveSystem's is_done() polling loop
+    - remaining: |target - achieved| angle in joint degrees of a move that was left before it was done, because the
+      next move redirected the joint or it only had to get near its target (see MoveSystem.leave_move)
+    - left: milliseconds from the move command until such a move was left
+and per call ("move", "move_to_angle") a "duration" histogram. The histograms never grow, so a profiler can stay
+attached for a whole run, and are written to a CSV file at the end.
+
+Usage:
+    profiler = MotionProfiler()
+    move_system.set_profiler(profiler)
+    ...
+    profiler.export_csv("motion_profile.csv")
+"""
+from array import array
+
+from pybricks.tools import StopWatch
+
+# (low, high, bin count) of the histograms per metric
+ERROR_BINS = (0, 10, 40)  # Joint degrees
+SETTLE_BINS = (0, 5000, 50)  # Milliseconds
+POLL_BINS = (0, 5000, 50)  # Milliseconds
+DURATION_BINS = (0, 10000, 50)  # Milliseconds
+
+JOINT_METRICS = {
+    "error": ERROR_BINS,
+    "settle": SETTLE_BINS,
+    "poll": POLL_BINS,
+    "remaining": ERROR_BINS,
+    "left": SETTLE_BINS,
+}
+
+CSV_HEADER = "name,metric,bin_low,bin_high,count"
+
+
+class Histogram:
+    def __init__(self, low: float, high: float, bin_count: int):
+        self.low = low
+        self.high = high
+        self.bin_count = bin_count
+        self.bin_width = (high - low) / bin_count
+        self.bins = array("L", [0] * bin_count)
+        self.underflow = 0  # Values below low
+        self.overflow = 0  # Values at or above high
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value: float):
+        if value < self.low:
+            self.underflow += 1
+        elif value >= self.high:
+            self.overflow += 1
+        else:
+            self.bins[int((value - self.low) / self.bin_width)] += 1
+
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def mean(self):
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def percentile(self, fraction: float):
+        """Upper edge of the bin that contains the given fraction of the values (clamped to min and max)."""
+        if self.count == 0:
+            return None
+
+        target = fraction * self.count
+        seen = self.underflow
+        if seen >= target:
+            return self.minimum
+        for i in range(self.bin_count):
+            seen += self.bins[i]
+            if seen >= target:
+                return max(self.minimum, min(self.maximum, self.low + (i + 1) * self.bin_width))
+        return self.maximum
+
+    def rows(self):
+        """(bin_low, bin_high, count) for every bin, including the underflow and overflow bins."""
+        rows = [("", self.low, self.underflow)]
+        for i in range(self.bin_count):
+            rows.append((self.low + i * self.bin_width, self.low + (i + 1) * self.bin_width, self.bins[i]))
+        rows.append((self.high, "", self.overflow))
+        return rows
+
+    def __str__(self):
+        if self.count == 0:
+            return "n=0"
+        return "n={} mean={:.2f} p50={:.2f} p95={:.2f} max={:.2f}".format(
+            self.count, self.mean(), self.percentile(0.5), self.percentile(0.95), self.maximum)
+
+
+class MotionProfiler:
+    def __init__(self):
+        self.stopwatch = StopWatch()
+        self.histograms = {}  # (name, metric) -> Histogram
+
+    def time(self):
+        return self.stopwatch.time()
+
+    def get_histogram(self, name: str, metric: str, bins) -> Histogram:
+        key = (name, metric)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = Histogram(*bins)
+            self.histograms[key] = histogram
+        return histogram
+
+    def record_joint(self, joint: str, commanded: float, achieved: float, settle_time: float):
+        """A joint finished a move: commanded and achieved angle in joint degrees, settle time in ms."""
+        self.get_histogram(joint, "error", ERROR_BINS).add(abs(achieved - commanded))
+        self.get_histogram(joint, "settle", SETTLE_BINS).add(settle_time)
+
+    def record_left(self, joint: str, commanded: float, achieved: float, elapsed: float):
+        """A joint's move was left before it was done: commanded and achieved angle in joint degrees, ms since the
+        command."""
+        self.get_histogram(joint, "remaining", ERROR_BINS).add(abs(achieved - commanded))
+        self.get_histogram(joint, "left", SETTLE_BINS).add(elapsed)
+
+    def record_poll(self, joint: str, poll_time: float):
+        self.get_histogram(joint, "poll", POLL_BINS).add(poll_time)
+
+    def record_call(self, call: str, duration: float):
+        self.get_histogram(call, "duration", DURATION_BINS).add(duration)
+
+    def clear(self):
+        self.histograms = {}
+
+    def summary(self) -> list:
+        """One line per histogram, sorted by name and metric."""
+        return ["{} {}: {}".format(name, metric, self.histograms[(name, metric)])
+                for name, metric in sorted(self.histograms)]
+
+    def export_csv(self, path: str):
+        with open(path, "w") as file:
+            file.write(CSV_HEADER + "\n")
+            for name, metric in sorted(self.histograms):
+                for bin_low, bin_high, count in self.histograms[(name, metric)].rows():
+                    file.write("{},{},{},{},{}\n".format(name, metric, bin_low, bin_high, count))
@@ -0,0 +1,207 @@
+"""
+Workspace reachability index.
+
+A regular (x, y) grid of cells. For every cell the index stores the range of shoulder and elbow angles (joint degrees,
+offsets applied, same convention as MoveSystem) that the arm needs anywhere inside it. The ranges are exact enclosures,
+not samples: the elbow angle only depends on the distance d to the shoulder and shrinks as d grows, the shoulder angle
+is the direction to the point minus the angle between the upper arm and that direction, which is a function of d as
+well. Over a cell both are bounded by their values at the cell's distance and direction extremes.
+
+Query margins against the current joint limits (model.JointLimits, measured by the calibration) are therefore lower
+bounds for every point of the cell, and a query is a single array index. Cells that are not entirely inside the
+reachable annulus, or that straddle the +x axis where the shoulder angle wraps around, have no answer.
+
+The file is written by tools/build_reachability.py and loaded on the brick with the array module, like utils.ik_table.
+"""
+import math
+import struct
+from array import array
+
+from model.JointLimits import JointLimits
+from utils.log import log
+
+MAGIC = b"RCH1"
+
+# magic, nx, ny (cells), x0, y0, step, l1, l2, shoulder_offset, elbow_offset
+HEADER_FORMAT = "<4sHHfffffff"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Tolerance used when checking that an index was built for the current arm (values are stored as 32-bit floats)
+GEOMETRY_TOLERANCE = 0.001
+
+# Joint degrees the stored ranges are widened by, so rounding to 32-bit floats never narrows them
+ROUNDING_MARGIN = 0.001
+
+
+def _read_floats(file, count):
+    values = array("f", [0.0] * count)
+    file.readinto(values)
+    return values
+
+
+def _read_bytes(file, count):
+    values = bytearray(count)
+    file.readinto(values)
+    return values
+
+
+def get_angle_ranges(x0, y0, x1, y1, l1, l2, shoulder_offset, elbow_offset):
+    """
+    Ranges of the joint angles over the cell [x0, x1] x [y0, y1].
+
+    Returns:
+        tuple: ((shoulder_min, shoulder_max), (elbow_min, elbow_max)) in joint degrees, or None if the cell is not
+        entirely reachable or the shoulder angle wraps around inside it.
+    """
+    # The shoulder angle jumps by 360° where y becomes negative on the +x side (see kinematics.calculate_angles)
+    if y0 < 0 <= y1 and x1 > 0:
+        return None
+
+    corners = ((x0, y0), (x1, y0), (x0, y1), (x1, y1))
+    nearest_x = min(max(0, x0), x1)
+    nearest_y = min(max(0, y0), y1)
+    d_min = math.sqrt(nearest_x ** 2 + nearest_y ** 2)
+    d_max = max(math.sqrt(x ** 2 + y ** 2) for x, y in corners)
+    if d_min < abs(l1 - l2) or d_max > l1 + l2:
+        return None
+
+    # Elbow: the cosine law angle shrinks as d grows (180° folded, 0° stretched)
+    def elbow(d):
+        return math.acos(max(-1.0, min(1.0, (d ** 2 - l1 ** 2 - l2 ** 2) / (2 * l1 * l2))))
+
+    # Upper arm to target direction: the cosine law angle at the shoulder, its cosine only turns at sqrt(l1² - l2²)
+    def cos_beta(d):
+        return max(-1.0, min(1.0, (l1 ** 2 + d ** 2 - l2 ** 2) / (2 * l1 * d)))
+
+    distances = [d_min, d_max]
+    if l1 > l2 and d_min < math.sqrt(l1 ** 2 - l2 ** 2) < d_max:
+        distances.append(math.sqrt(l1 ** 2 - l2 ** 2))
+    cosines = [cos_beta(d) for d in distances]
+    beta_min = math.acos(max(cosines))
+    beta_max = math.acos(min(cosines))
+
+    # Direction to the point, in [0, 2π) like calculate_angles, the extremes of a cell are at its corners
+    directions = []
+    for x, y in corners:
+        direction = math.atan2(y, x)
+        if y < 0:
+            direction += 2 * math.pi
+        directions.append(direction)
+
+    theta1_min = math.degrees(min(directions) - beta_max)
+    theta1_max = math.degrees(max(directions) - beta_min)
+    shoulder = (shoulder_offset - theta1_max - ROUNDING_MARGIN, shoulder_offset - theta1_min + ROUNDING_MARGIN)
+    elbow_range = (math.degrees(elbow(d_max)) - elbow_offset - ROUNDING_MARGIN,
+                   math.degrees(elbow(d_min)) - elbow_offset + ROUNDING_MARGIN)
+    return shoulder, elbow_range
+
+
+class ReachabilityIndex:
+    def __init__(self, nx, ny, x0, y0, step, l1, l2, shoulder_offset, elbow_offset, shoulder_min, shoulder_max,
+                 elbow_min, elbow_max, valid):
+        self.nx = nx  # Cells in x
+        self.ny = ny  # Cells in y
+        self.x0 = x0
+        self.y0 = y0
+        self.step = step
+        self.l1 = l1
+        self.l2 = l2
+        self.shoulder_offset = shoulder_offset
+        self.elbow_offset = elbow_offset
+        self.shoulder_min = shoulder_min  # array("f"), nx * ny cells, row-major in y
+        self.shoulder_max = shoulder_max
+        self.elbow_min = elbow_min
+        self.elbow_max = elbow_max
+        self.valid = valid  # bytearray, nx * ny cells
+
+    @staticmethod
+    def build(x_min, x_max, y_min, y_max, step, l1, l2, shoulder_offset, elbow_offset):
+        """Compute the index for the given area and arm (slow on the brick, see tools/build_reachability.py)."""
+        nx = int(round((x_max - x_min) / step))
+        ny = int(round((y_max - y_min) / step))
+        shoulder_min = array("f", [0.0] * (nx * ny))
+        shoulder_max = array("f", [0.0] * (nx * ny))
+        elbow_min = array("f", [0.0] * (nx * ny))
+        elbow_max = array("f", [0.0] * (nx * ny))
+        valid = bytearray(nx * ny)
+        for j in range(ny):
+            for i in range(nx):
+                x0 = x_min + i * step
+                y0 = y_min + j * step
+                ranges = get_angle_ranges(x0, y0, x0 + step, y0 + step, l1, l2, shoulder_offset, elbow_offset)
+                if ranges is None:
+                    continue
+                cell = j * nx + i
+                (shoulder_min[cell], shoulder_max[cell]), (elbow_min[cell], elbow_max[cell]) = ranges
+                valid[cell] = 1
+        return ReachabilityIndex(nx, ny, x_min, y_min, step, l1, l2, shoulder_offset, elbow_offset, shoulder_min,
+                                 shoulder_max, elbow_min, elbow_max, valid)
+
+    @staticmethod
+    def load(path: str):
+        """Load an index from disk. Returns None if the file is missing or is not a reachability index."""
+        try:
+            with open(path, "rb") as file:
+                header = file.read(HEADER_SIZE)
+                if len(header) != HEADER_SIZE:
+                    log.warning("ReachabilityIndex", "Invalid index file: {}", path)
+                    return None
+
+                fields = struct.unpack(HEADER_FORMAT, header)
+                if fields[0] != MAGIC:
+                    log.warning("ReachabilityIndex", "Invalid index file: {}", path)
+                    return None
+
+                count = fields[1] * fields[2]
+                ranges = [_read_floats(file, count) for _ in range(4)]
+                valid = _read_bytes(file, count)
+        except OSError:
+            log.info("ReachabilityIndex", "No index found at {}", path)
+            return None
+
+        log.info("ReachabilityIndex", "Loaded {}x{} cells", fields[1], fields[2])
+        return ReachabilityIndex(*fields[1:], shoulder_min=ranges[0], shoulder_max=ranges[1], elbow_min=ranges[2],
+                                 elbow_max=ranges[3], valid=valid)
+
+    def save(self, path: str):
+        with open(path, "wb") as file:
+            file.write(struct.pack(HEADER_FORMAT, MAGIC, self.nx, self.ny, self.x0, self.y0, self.step, self.l1,
+                                   self.l2, self.shoulder_offset, self.elbow_offset))
+            for values in (self.shoulder_min, self.shoulder_max, self.elbow_min, self.elbow_max):
+                file.write(values)
+            file.write(self.valid)
+
+    def matches(self, l1, l2, shoulder_offset, elbow_offset) -> bool:
+        """Check that the index was built for the given arm geometry."""
+        expected = (l1, l2, shoulder_offset, elbow_offset)
+        actual = (self.l1, self.l2, self.shoulder_offset, self.elbow_offset)
+        for a, b in zip(expected, actual):
+            if abs(a - b) > GEOMETRY_TOLERANCE:
+                return False
+        return True
+
+    def margins(self, x: float, y: float, joint_limits: JointLimits):
+        """
+        Lower bounds of the shoulder and elbow margins (joint degrees) to the joint limits at (x, y).
+
+        Returns:
+            tuple: (shoulder_margin, elbow_margin), or None if the index has no answer for the point.
+        """
+        fx = (x - self.x0) / self.step
+        fy = (y - self.y0) / self.step
+        if fx < 0 or fy < 0:
+            return None
+
+        i = int(fx)
+        j = int(fy)
+        if i >= self.nx or j >= self.ny:
+            return None
+
+        cell = j * self.nx + i
+        if not self.valid[cell]:
+            return None
+
+        shoulder_low, shoulder_high = joint_limits.limits["shoulder"]
+        elbow_low, elbow_high = joint_limits.limits["elbow"]
+        return (min(self.shoulder_min[cell] - shoulder_low, shoulder_high - self.shoulder_max[cell]),
+                min(self.elbow_min[cell] - elbow_low, elbow_high - self.elbow_max[cell]))
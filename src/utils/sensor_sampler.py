@@ -0,0 +1,262 @@
+"""
+Background sensor sampling.
+
+Every read of an EV3 device goes through ev3dev's sysfs and blocks the caller until it returns. SensorSampler polls the
+registered sensors at a fixed interval on a background thread (_thread), writes the readings into preallocated ring
+buffers and publishes the filtered value as one attribute, so reading it costs an attribute lookup. The Sampled*
+wrappers make a sampled device look like the pybricks device to the parts and systems, and fall back to a direct read
+while the sampler has no fresh value (not started, or right after reset_angle). Motor speeds are only sampled where a
+loop reads them every tick (stall detection), everything else reads them directly. Reads that decide something on the
+spot (where a homing reference is, whether a joint or the gripper arrived, whether the jaws caught a cube) can't use a
+value up to MAX_AGE ms old either, they read the device returned by unwrap.
+
+The sampler times its polls and logs the average and the longest one when it is stopped, a poll that takes longer
+than the interval means the brick can't keep up with the streams and the interval has to grow.
+
+Without threads (the simulator), call poll() from the clock instead of start().
+
+Usage:
+    sampler = SensorSampler()
+    color_sensor = SampledColorSensor(ColorSensor(Port.S3), sampler)
+    base_motor = SampledMotor(Motor(Port.D), sampler)
+    sampler.start()
+"""
+from array import array
+
+from pybricks.tools import wait, StopWatch
+
+from utils.log import log
+
+# Polling interval of the background thread (ms), the control loops poll every 10 ms
+SAMPLE_INTERVAL = 10
+
+# A value older than this (ms) isn't used, the wrappers read the device directly instead
+MAX_AGE = 50
+
+# Filters of a stream's published value
+LATEST = 0
+MEAN = 1
+MEDIAN = 2
+
+
+class SensorStream:
+    """Ring buffer of one sensor's readings (one or more channels) and its filtered latest value."""
+
+    def __init__(self, read, channels: int = 1, size: int = 8, window: int = 1, mode: int = LATEST):
+        self.read = read
+        self.channels = channels
+        self.size = size
+        self.window = min(window, size)
+        self.mode = mode
+        self.buffer = array("f", [0] * (size * channels))
+        self.times = array("l", [0] * size)
+        self.index = 0  # Next slot to write
+        self.count = 0  # Readings written since the last clear
+        self.generation = 0  # Incremented by clear, a reading started before that is dropped
+        self.value = None  # Filtered value (a number, or a tuple for several channels), None until the first reading
+        self.time = 0  # Sampler time of the latest reading
+
+    def clear(self):
+        self.generation += 1
+        self.count = 0
+        self.value = None
+
+    def push(self, reading, time: int, generation: int = None):
+        """Add a reading, dropped if it was started (at generation) before the last clear."""
+        if generation is not None and generation != self.generation:
+            return
+        offset = self.index * self.channels
+        if self.channels == 1:
+            self.buffer[offset] = reading
+        else:
+            for channel in range(self.channels):
+                self.buffer[offset + channel] = reading[channel]
+        self.times[self.index] = time
+        self.index = (self.index + 1) % self.size
+        self.count += 1
+
+        if self.mode == LATEST or self.window == 1:
+            value = reading
+        else:
+            value = tuple(self.filter(channel) for channel in range(self.channels))
+            if self.channels == 1:
+                value = value[0]
+        # Published last and in one assignment, readers on the other thread never see a half written value
+        self.time = time
+        self.value = value
+        if generation is not None and generation != self.generation:
+            # A clear ran while this was published
+            self.value = None
+
+    def filter(self, channel: int) -> float:
+        count = min(self.count, self.window)
+        values = [self.buffer[((self.index - 1 - i) % self.size) * self.channels + channel] for i in range(count)]
+        if self.mode == MEDIAN:
+            values.sort()
+            return values[count // 2]
+        return sum(values) / count
+
+    def recent(self, count: int) -> list:
+        """The last count raw readings (fewer if there aren't that many), oldest first."""
+        count = min(count, self.count, self.size)
+        readings = []
+        for i in range(count, 0, -1):
+            offset = ((self.index - i) % self.size) * self.channels
+            if self.channels == 1:
+                readings.append(self.buffer[offset])
+            else:
+                readings.append(tuple(self.buffer[offset:offset + self.channels]))
+        return readings
+
+
+class SensorSampler:
+    def __init__(self, interval: int = SAMPLE_INTERVAL, max_age: int = MAX_AGE):
+        self.interval = interval
+        self.max_age = max_age
+        self.streams = []
+        self.stopwatch = StopWatch()
+        self.running = False
+        self.poll_count = 0
+        self.poll_time = 0  # Total time spent polling (ms)
+        self.max_poll_time = 0
+
+    def add(self, read, channels: int = 1, size: int = 8, window: int = 1, mode: int = LATEST) -> SensorStream:
+        stream = SensorStream(read, channels, size, window, mode)
+        self.streams.append(stream)
+        return stream
+
+    def time(self) -> int:
+        return self.stopwatch.time()
+
+    def poll(self):
+        """Read every stream once."""
+        start = self.stopwatch.time()
+        for stream in self.streams:
+            generation = stream.generation
+            reading = stream.read()
+            stream.push(reading, self.stopwatch.time(), generation)
+
+        duration = self.stopwatch.time() - start
+        self.poll_count += 1
+        self.poll_time += duration
+        if duration > self.max_poll_time:
+            self.max_poll_time = duration
+
+    def is_fresh(self, stream: SensorStream) -> bool:
+        return stream.value is not None and self.stopwatch.time() - stream.time <= self.max_age
+
+    def wait_for_readings(self, stream: SensorStream, count: int) -> list:
+        """Wait until the stream has count readings newer than now and return them."""
+        if count > stream.size:
+            raise ValueError("Cannot wait for more readings than the stream keeps")
+        target = stream.count + count
+        while stream.count < target:
+            if not self.running:
+                # Nobody is polling, read the device here
+                stream.push(stream.read(), self.stopwatch.time())
+            else:
+                wait(1)
+        return stream.recent(count)
+
+    def run(self):
+        log.info("SensorSampler", "Sampling {} streams every {} ms", len(self.streams), self.interval)
+        try:
+            while self.running:
+                self.poll()
+                wait(self.interval)
+        except Exception as e:
+            log.error("SensorSampler", "Sampling stopped: {}", e)
+        self.running = False
+
+    def start(self):
+        import _thread
+
+        self.running = True
+        _thread.start_new_thread(self.run, ())
+
+    def stop(self):
+        self.running = False
+        if self.poll_count:
+            log.info("SensorSampler", "{} polls of {} streams, {} ms on average, {} ms at most", self.poll_count,
+                     len(self.streams), round(self.poll_time / self.poll_count, 2), self.max_poll_time)
+
+
+class SampledMotor:
+    """
+    Motor whose angle() (and speed() with sample_speed) come from the sampler, everything else goes to the motor.
+    """
+
+    def __init__(self, motor, sampler: SensorSampler, sample_speed: bool = False):
+        self.motor = motor
+        self.sampler = sampler
+        self.angle_stream = sampler.add(motor.angle)
+        self.speed_stream = sampler.add(motor.speed) if sample_speed else None
+
+    def angle(self):
+        if self.sampler.is_fresh(self.angle_stream):
+            return self.angle_stream.value
+        return self.motor.angle()
+
+    def speed(self):
+        if self.speed_stream is not None and self.sampler.is_fresh(self.speed_stream):
+            return self.speed_stream.value
+        return self.motor.speed()
+
+    def reset_angle(self, angle=None):
+        # Readings from before the reset are in the old frame. Cleared after the reset, so a poll that read the old
+        # frame before it fails the generation check instead of publishing
+        if angle is None:
+            self.motor.reset_angle()
+        else:
+            self.motor.reset_angle(angle)
+        self.angle_stream.clear()
+
+    def __getattr__(self, name):
+        return getattr(self.motor, name)
+
+
+class SampledTouchSensor:
+    def __init__(self, touch_sensor, sampler: SensorSampler):
+        self.touch_sensor = touch_sensor
+        self.sampler = sampler
+        self.stream = sampler.add(touch_sensor.pressed)
+
+    def pressed(self) -> bool:
+        if self.sampler.is_fresh(self.stream):
+            return bool(self.stream.value)
+        return self.touch_sensor.pressed()
+
+    def __getattr__(self, name):
+        return getattr(self.touch_sensor, name)
+
+
+class SampledColorSensor:
+    """Color sensor whose rgb() is the per-channel median of the last three readings."""
+
+    def __init__(self, color_sensor, sampler: SensorSampler, size: int = 16):
+        self.color_sensor = color_sensor
+        self.sampler = sampler
+        self.stream = sampler.add(color_sensor.rgb, channels=3, size=size, window=3, mode=MEDIAN)
+
+    def rgb(self) -> tuple:
+        if self.sampler.is_fresh(self.stream):
+            return self.stream.value
+        return self.color_sensor.rgb()
+
+    def read_new(self, count: int) -> list:
+        """count raw readings taken from now on (for bursts, rgb() would return the same filtered value)."""
+        return self.sampler.wait_for_readings(self.stream, count)
+
+    def __getattr__(self, name):
+        return getattr(self.color_sensor, name)
+
+
+def unwrap(device):
+    """The device a Sampled* wrapper reads from, or the device itself if it isn't wrapped."""
+    if isinstance(device, SampledMotor):
+        return device.motor
+    if isinstance(device, SampledTouchSensor):
+        return device.touch_sensor
+    if isinstance(device, SampledColorSensor):
+        return device.color_sensor
+    return device
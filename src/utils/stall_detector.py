@@ -0,0 +1,62 @@
+"""
+Stall detection from the motor's speed feedback.
+
+A motor run into an end-stop at a constant speed stops turning while the controller keeps pushing. StallDetector
+counts consecutive readings where the measured speed is below a fraction of the commanded speed, and reports a stall
+once `confidence` readings in a row agree, or as soon as the controller itself reports one (control.stalled()). Speed
+readings only count once the motor has been seen moving, or after arm_time if it never gets going (it was already
+against the end-stop), so the acceleration at the start isn't mistaken for a stall.
+
+Usage:
+    detector = StallDetector(motor, speed=400)
+    motor.run(400)
+    detector.start()
+    while not detector.update():
+        wait(10)
+    print(detector.detection_time)
+"""
+from pybricks.tools import StopWatch
+
+# Defaults, tuned on the elbow and gripper end-stops
+SPEED_FRACTION = 0.25  # A reading below this fraction of the commanded speed counts as stalled
+CONFIDENCE = 3  # Consecutive stalled readings needed
+ARM_TIME = 150  # ms after which readings count even if the motor was never seen moving
+
+
+class StallDetector:
+    def __init__(self, motor, speed: float, speed_fraction: float = SPEED_FRACTION, confidence: int = CONFIDENCE,
+                 arm_time: int = ARM_TIME):
+        self.motor = motor
+        self.speed_threshold = abs(speed) * speed_fraction
+        self.confidence = confidence
+        self.arm_time = arm_time
+        self.stopwatch = StopWatch()
+        self.armed = False
+        self.count = 0  # Consecutive stalled readings
+        self.detection_time = None  # ms from start to detection, None until a stall was detected
+
+    def start(self):
+        # Call right after the motor was started
+        self.stopwatch.reset()
+        self.armed = False
+        self.count = 0
+        self.detection_time = None
+
+    def update(self) -> bool:
+        """Take one reading, returns True once the motor is stalled."""
+        if self.detection_time is not None:
+            return True
+
+        speed = abs(self.motor.speed())
+        if not self.armed:
+            self.armed = speed >= self.speed_threshold or self.stopwatch.time() >= self.arm_time
+
+        if self.armed and speed < self.speed_threshold:
+            self.count += 1
+        else:
+            self.count = 0
+
+        if self.count >= self.confidence or self.motor.control.stalled():
+            self.detection_time = self.stopwatch.time()
+            return True
+        return False
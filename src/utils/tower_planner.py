@@ -0,0 +1,236 @@
+"""
+Storage decisions for the automatic routine.
+
+The routine has one real choice: which storage bin a cube that isn't needed yet goes to (bins are stacks, a cube put
+on top of one that is needed sooner has to be moved off it again). Everything else follows from the sequence (a
+matching cube goes to the stack, a stored cube is fetched as soon as it is next). TowerPlanner makes that choice by
+looking ahead over every order the remaining main bin cubes can come in, each equally likely, and picking the bin with
+the lowest expected time until the tower is complete (expectimax, memoized per state). The search looks LOOKAHEAD
+steps (picks, stores and fetches) ahead and estimates the rest of the tower from there. It is also capped at MAX_STATES
+states per decision, a decision that runs out of them is made greedily instead (see choose_bin_greedy).
+
+Travel times come from TravelModel: the travel of the slowest joint between the compiled route targets at the speed
+of the coordinated moves, plus an overhead per move (accelerating, settling) that is measured from the moves the arm
+makes (see TravelModel.observe).
+
+Places are the route waypoints the arm passes between cubes: "pre_pickup@main", "scan", "pre_pickup@stack" and
+"pre_pickup@<bin>".
+"""
+from utils.log import log
+
+# Motor degrees per second of the coordinated moves (MoveSystem's default speed). The joint with the longest travel
+# runs at it, whichever joint that is
+JOINT_SPEED = 100
+
+# Time every move takes on top of the travel itself (accelerating, settling), ms. Only the starting guess, measured
+# moves replace it; it counts as MOVE_OVERHEAD_WEIGHT of them
+MOVE_OVERHEAD = 150
+MOVE_OVERHEAD_WEIGHT = 3
+
+# Lowering into a bin, grabbing or releasing and lifting again, ms. Only counted for the extra visits of moving a cube
+# off the one that is needed, every other visit happens whatever the plan is
+HANDLING_TIME = 6000
+
+# Steps searched ahead per decision, and the most states one decision may visit
+LOOKAHEAD = 4
+MAX_STATES = 3000
+
+MAIN = "pre_pickup@main"
+SCAN = "scan"
+STACK = "pre_pickup@stack"
+
+
+def bin_place(bin_key: str) -> str:
+    return "pre_pickup@" + bin_key
+
+
+class TravelModel:
+    def __init__(self, route, joint_speeds=(JOINT_SPEED, JOINT_SPEED, JOINT_SPEED), overhead: int = MOVE_OVERHEAD):
+        """
+        Parameters:
+            route (MotionProgram): Compiled route with the raw targets of every place.
+            joint_speeds (tuple): Motor degrees per second of the shoulder, elbow and base.
+        """
+        self.route = route
+        self.joint_speeds = joint_speeds
+        self.overhead = overhead
+        self.weight = MOVE_OVERHEAD_WEIGHT  # Moves the overhead is averaged over, the starting guess included
+
+    def get_travel_time(self, start_target, end_target) -> float:
+        """ms the slowest joint needs between two raw targets, without the overhead."""
+        # Coordinated moves: every joint arrives with the slowest one
+        return max(abs(end_target[i] - start_target[i]) / self.joint_speeds[i] for i in range(3)) * 1000
+
+    def estimate(self, start: str, end: str) -> float:
+        """Expected ms from one place to another."""
+        if start == end:
+            return 0
+        return self.get_travel_time(self.route.get(start), self.route.get(end)) + self.overhead
+
+    def observe(self, start_target, end_target, duration: float):
+        """A move from start_target to end_target (raw angles) took duration ms, averaged into the overhead."""
+        self.weight += 1
+        self.overhead += (duration - self.get_travel_time(start_target, end_target) - self.overhead) / self.weight
+
+
+class TowerPlanner:
+    def __init__(self, sequence: list, bin_keys: list, travel_model: TravelModel, capacity: int = 1,
+                 lookahead: int = LOOKAHEAD, max_states: int = MAX_STATES):
+        self.sequence = list(sequence)
+        self.bin_keys = sorted(bin_keys)
+        self.travel_model = travel_model
+        self.capacity = capacity
+        self.lookahead = lookahead
+        self.max_states = max_states
+        self.memo = {}  # States of the current decision
+        self.exhausted = False  # The current decision ran out of states
+
+    def travel(self, start: str, end: str) -> float:
+        return self.travel_model.estimate(start, end)
+
+    def choose_bin(self, tower: list, stored: dict, color: str, position: str = SCAN, exclude=()):
+        """
+        Storage bin for a cube that isn't needed yet, a scanned one or one moved off a cube that is needed.
+
+        Parameters:
+            tower (list): Colors stacked so far.
+            stored (dict): bin key -> tuple of stored colors (bottom to top), without the cube to store.
+            color (str): Color of the cube to store.
+            position (str): Place the arm is at.
+            exclude (tuple): Bins the cube mustn't go to.
+
+        Returns:
+            str: The bin key, None if every bin is full.
+        """
+        candidates = [key for key in self.bin_keys
+                      if key not in exclude and len(stored.get(key, ())) < self.capacity]
+        if not candidates:
+            return None
+
+        remaining = self.get_remaining(tower, stored, color)
+        if remaining is None:
+            # A color the sequence doesn't account for (a misread or an extra cube), keep it close
+            return min(candidates, key=lambda key: self.travel(position, bin_place(key)))
+
+        # Travel times may have changed since the last decision (see TravelModel.observe), so nothing is reused
+        self.memo = {}
+        self.exhausted = False
+        best_key = None
+        best_cost = float("inf")
+        for key in candidates:
+            after = dict(stored)
+            after[key] = tuple(stored.get(key, ())) + (color,)
+            cost = self.travel(position, bin_place(key)) + self.expected_cost(
+                len(tower), self.get_stored_key(after), remaining, bin_place(key), 1)
+            if best_key is None or cost < best_cost:
+                best_key = key
+                best_cost = cost
+
+        if self.exhausted:
+            best_key = self.choose_bin_greedy(tower, stored, color, position, candidates)
+            log.debug("TowerPlanner", "Search ran out of states, storing {} in {} greedily", color, best_key)
+        else:
+            log.debug("TowerPlanner", "Storing {} in {}, expected {} ms until the tower is done ({} states)", color,
+                      best_key, int(best_cost), len(self.memo))
+        self.memo = {}
+        return best_key
+
+    def choose_bin_greedy(self, tower: list, stored: dict, color: str, position: str, candidates: list) -> str:
+        """The closest bin that doesn't bury a cube needed before this one, the closest bin if every bin does."""
+        needed = self.sequence[len(tower):]
+        sooner = needed[:needed.index(color)] if color in needed else needed
+        clear = [key for key in candidates if not any(stored_color in sooner for stored_color in stored.get(key, ()))]
+        return min(clear or candidates, key=lambda key: self.travel(position, bin_place(key)))
+
+    def get_remaining(self, tower: list, stored: dict, color: str):
+        """
+        Colors still expected from the main bin (sorted tuple), None if the color doesn't fit the sequence. Stored
+        cubes the sequence doesn't need (left over from an earlier tower) are ignored.
+        """
+        remaining = list(self.sequence[len(tower):])
+        for stack in stored.values():
+            for stored_color in stack:
+                if stored_color in remaining:
+                    remaining.remove(stored_color)
+        if color not in remaining:
+            return None
+        remaining.remove(color)
+        return tuple(sorted(remaining))
+
+    def get_stored_key(self, stored: dict) -> tuple:
+        return tuple(tuple(stored.get(key, ())) for key in self.bin_keys)
+
+    def get_horizon_cost(self, height: int, position: str) -> float:
+        """Estimate beyond the lookahead: every cube still missing comes straight from the main bin."""
+        cycle = self.travel(STACK, MAIN) + self.travel(MAIN, SCAN) + self.travel(SCAN, STACK)
+        return self.travel(position, STACK) + (len(self.sequence) - height) * cycle
+
+    def expected_cost(self, height: int, stored: tuple, remaining: tuple, position: str, depth: int) -> float:
+        """Expected ms of travel from position until the tower is complete, depth steps into the search."""
+        if height >= len(self.sequence):
+            return 0
+        if depth > self.lookahead:
+            return self.get_horizon_cost(height, position)
+
+        state = (height, stored, remaining, position, depth)
+        cost = self.memo.get(state)
+        if cost is not None:
+            return cost
+        if len(self.memo) >= self.max_states:
+            self.exhausted = True
+            return self.get_horizon_cost(height, position)
+        # Digging can move cubes back and forth between bins, a state that is being computed counts as a dead end
+        self.memo[state] = float("inf")
+
+        expected = self.sequence[height]
+        cost = float("inf")
+        for index, stack in enumerate(stored):
+            if expected in stack:
+                cost = min(cost, self.get_fetch_cost(height, stored, remaining, position, index, depth))
+
+        if expected in remaining:
+            # Pick the next main bin cube, any of the remaining ones is equally likely to be on top
+            total = 0
+            for i, color in enumerate(remaining):
+                rest = remaining[:i] + remaining[i + 1:]
+                if color == expected:
+                    total += self.travel(SCAN, STACK) + self.expected_cost(height + 1, stored, rest, STACK, depth + 1)
+                else:
+                    total += self.get_store_cost(height, stored, rest, color, SCAN, depth)
+            cost = min(cost, self.travel(position, MAIN) + self.travel(MAIN, SCAN) + total / len(remaining))
+
+        self.memo[state] = cost
+        return cost
+
+    def get_fetch_cost(self, height: int, stored: tuple, remaining: tuple, position: str, index: int,
+                       depth: int) -> float:
+        """Fetch the next cube from a bin, moving the cubes on top of it to other bins first."""
+        stack = stored[index]
+        place = bin_place(self.bin_keys[index])
+        after = stored[:index] + (stack[:-1],) + stored[index + 1:]
+        if stack[-1] == self.sequence[height]:
+            return (self.travel(position, place) + self.travel(place, STACK)
+                    + self.expected_cost(height + 1, after, remaining, STACK, depth + 1))
+
+        # Dig: one extra pick and place
+        best = float("inf")
+        for other, other_stack in enumerate(after):
+            if other == index or len(other_stack) >= self.capacity:
+                continue
+            moved = after[:other] + (other_stack + (stack[-1],),) + after[other + 1:]
+            other_place = bin_place(self.bin_keys[other])
+            best = min(best, self.travel(place, other_place)
+                       + self.expected_cost(height, moved, remaining, other_place, depth + 1))
+        return self.travel(position, place) + HANDLING_TIME + best
+
+    def get_store_cost(self, height: int, stored: tuple, remaining: tuple, color: str, position: str,
+                       depth: int) -> float:
+        best = float("inf")
+        for index, key in enumerate(self.bin_keys):
+            if len(stored[index]) >= self.capacity:
+                continue
+            after = stored[:index] + (stored[index] + (color,),) + stored[index + 1:]
+            place = bin_place(key)
+            best = min(best, self.travel(position, place)
+                       + self.expected_cost(height, after, remaining, place, depth + 1))
+        return best
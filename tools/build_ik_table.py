@@ -0,0 +1,103 @@
+"""
+Build the IK lookup table used by MoveSystem on the brick.
+
+Runs on the development machine (needs NumPy) and writes src/ik_table.bin, which is downloaded to the brick together
+with the rest of src/. Every cell is checked against the analytic solver on a sub-grid; cells whose bilinear
+interpolation error exceeds --max-error at a sample point are marked invalid, so the brick falls back to
+calculate_angles there. The error is only checked at the sample points, the reported maximum is the largest sampled
+error and the true one can be slightly larger.
+
+Usage:
+    python tools/build_ik_table.py --step 0.25 --max-error 0.5
+"""
+import argparse
+import os
+import sys
+from array import array
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from constants import RATIOS, OFFSETS, LENGTHS  # noqa: E402
+from utils.batch_kinematics import move_angles_batch  # noqa: E402
+from utils.ik_table import IKTable  # noqa: E402
+
+
+def bilinear(corners, tx, ty):
+    """Interpolate the four cell corners (c00, c10, c01, c11) at the fractional positions tx, ty."""
+    c00, c10, c01, c11 = corners
+    return (c00 * (1 - tx) * (1 - ty) + c10 * tx * (1 - ty) + c01 * (1 - tx) * ty + c11 * tx * ty)
+
+
+def build_table(x_min, x_max, y_min, y_max, step, max_error, l1, l2, shoulder_offset, elbow_offset, shoulder_ratio,
+                elbow_ratio, samples_per_cell=9):
+    nx = int(round((x_max - x_min) / step)) + 1
+    ny = int(round((y_max - y_min) / step)) + 1
+
+    xs = x_min + step * np.arange(nx)
+    ys = y_min + step * np.arange(ny)
+    grid_x, grid_y = np.meshgrid(xs, ys)  # shape (ny, nx), row-major in y
+    shoulder, elbow, reachable = move_angles_batch(grid_x, grid_y, l1, l2, shoulder_offset, elbow_offset)
+
+    # A cell needs all four corners to be reachable
+    corners_ok = reachable[:-1, :-1] & reachable[1:, :-1] & reachable[:-1, 1:] & reachable[1:, 1:]
+
+    # Compare the interpolation against the analytic solution on a sub-grid of every cell (including the edges)
+    worst = np.zeros((ny - 1, nx - 1))
+    fractions = np.linspace(0.0, 1.0, samples_per_cell)
+    for ty in fractions:
+        for tx in fractions:
+            sample_shoulder, sample_elbow, sample_ok = move_angles_batch(grid_x[:-1, :-1] + tx * step,
+                                                                         grid_y[:-1, :-1] + ty * step,
+                                                                         l1, l2, shoulder_offset, elbow_offset)
+            with np.errstate(invalid="ignore"):
+                shoulder_error = np.abs(bilinear((shoulder[:-1, :-1], shoulder[:-1, 1:], shoulder[1:, :-1],
+                                                  shoulder[1:, 1:]), tx, ty) - sample_shoulder)
+                elbow_error = np.abs(bilinear((elbow[:-1, :-1], elbow[:-1, 1:], elbow[1:, :-1], elbow[1:, 1:]),
+                                              tx, ty) - sample_elbow)
+            error = np.where(sample_ok, np.maximum(shoulder_error, elbow_error), np.inf)
+            worst = np.maximum(worst, np.nan_to_num(error, nan=np.inf))
+
+    valid = corners_ok & (worst <= max_error)
+    measured_error = float(worst[valid].max()) if valid.any() else 0.0
+
+    # Unreachable nodes are never used (their cells are invalid), store zeros instead of NaN
+    shoulder_raw = np.nan_to_num(shoulder * shoulder_ratio).astype(np.float32)
+    elbow_raw = np.nan_to_num(elbow * elbow_ratio).astype(np.float32)
+
+    table = IKTable(nx, ny, x_min, y_min, step, measured_error, l1, l2, shoulder_offset, elbow_offset,
+                    shoulder_ratio, elbow_ratio,
+                    shoulder_raw=array("f", shoulder_raw.ravel().tobytes()),
+                    elbow_raw=array("f", elbow_raw.ravel().tobytes()),
+                    valid=bytearray(valid.astype(np.uint8).ravel().tobytes()))
+    return table, valid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the IK lookup table for the brick.")
+    parser.add_argument("--x-min", type=float, default=-24.0)
+    parser.add_argument("--x-max", type=float, default=24.0)
+    parser.add_argument("--y-min", type=float, default=-24.0)
+    parser.add_argument("--y-max", type=float, default=24.0)
+    parser.add_argument("--step", type=float, default=0.25, help="Grid spacing (same unit as the link lengths)")
+    parser.add_argument("--max-error", type=float, default=0.5, help="Allowed interpolation error in joint degrees")
+    parser.add_argument("--shoulder-length", type=float, default=LENGTHS["shoulder"])
+    parser.add_argument("--elbow-length", type=float, default=LENGTHS["elbow"])
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src",
+                                                         "ik_table.bin"))
+    args = parser.parse_args()
+
+    table, valid = build_table(args.x_min, args.x_max, args.y_min, args.y_max, args.step, args.max_error,
+                               args.shoulder_length, args.elbow_length, OFFSETS["shoulder"], OFFSETS["elbow"],
+                               RATIOS["shoulder"], RATIOS["elbow"])
+    table.save(args.output)
+
+    print("Grid:", table.nx, "x", table.ny, "nodes")
+    print("Valid cells:", int(valid.sum()), "of", valid.size)
+    print("Max sampled interpolation error:", round(table.max_error, 4), "joint degrees")
+    print("Written to", os.path.normpath(args.output), "(" + str(os.path.getsize(args.output)) + " bytes)")
+
+
+if __name__ == "__main__":
+    main()
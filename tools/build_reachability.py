@@ -0,0 +1,48 @@
+"""
+Build the workspace reachability index used by MoveSystem.can_reach on the brick.
+
+Runs on the development machine and writes src/reachability.bin, which is downloaded to the brick together with the
+rest of src/. Every cell stores the exact range of joint angles the arm needs inside it, so the index doesn't depend
+on the joint limits: those are measured by homing on every run and the brick compares them against the ranges.
+
+Usage:
+    python tools/build_reachability.py --step 0.5
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from constants import OFFSETS, LENGTHS  # noqa: E402
+from utils.reachability import ReachabilityIndex  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the workspace reachability index for the brick.")
+    parser.add_argument("--x-min", type=float, default=-24.0)
+    parser.add_argument("--x-max", type=float, default=24.0)
+    parser.add_argument("--y-min", type=float, default=-24.0)
+    parser.add_argument("--y-max", type=float, default=24.0)
+    parser.add_argument("--step", type=float, default=0.5, help="Cell size (same unit as the link lengths)")
+    parser.add_argument("--shoulder-length", type=float, default=LENGTHS["shoulder"])
+    parser.add_argument("--elbow-length", type=float, default=LENGTHS["elbow"])
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src",
+                                                         "reachability.bin"))
+    args = parser.parse_args()
+
+    index = ReachabilityIndex.build(args.x_min, args.x_max, args.y_min, args.y_max, args.step, args.shoulder_length,
+                                    args.elbow_length, OFFSETS["shoulder"], OFFSETS["elbow"])
+    index.save(args.output)
+
+    widths = [max(index.shoulder_max[cell] - index.shoulder_min[cell], index.elbow_max[cell] - index.elbow_min[cell])
+              for cell in range(index.nx * index.ny) if index.valid[cell]]
+    print("Grid:", index.nx, "x", index.ny, "cells")
+    print("Valid cells:", len(widths), "of", index.nx * index.ny)
+    if widths:
+        print("Widest joint range in a cell:", round(max(widths), 2), "joint degrees")
+    print("Written to", os.path.normpath(args.output), "(" + str(os.path.getsize(args.output)) + " bytes)")
+
+
+if __name__ == "__main__":
+    main()